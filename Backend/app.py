@@ -1,17 +1,32 @@
 # backend/app.py (COMPLETE VERSION WITH FIXES)
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any, Literal
 import uvicorn
+import asyncio
 from datetime import datetime
 import json
+import hmac
+import threading
 
 # Import our modules
 from model_manager import DistilBERTManager
 from pinecone_service import PineconeService
+from shared_index import SharedPineconeService
 from knowledge_base import KnowledgeBase
 from llm_manager import SmartLLMManager
+from ollama_manager import OllamaManager
+from config import ContextConfig, ServerConfig, BatchConfig, AdminConfig, ProfilerConfig, TracingConfig, IndexConfig, SearchConfig, DeadlineConfig
+from deadline import Deadline
+from cpu_pool import run_cpu
+from tracing import TraceMiddleware, traced, recent_traces
+from profiler import profiler
+from startup import Startup, ReadinessGate
+from dashboard import DashboardSnapshot
+from metrics import REGISTRY, STAGE_SECONDS, QUEUE_DEPTH, INDEX_DOCUMENTS, INDEX_BYTES, MODEL_MEMORY
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -30,40 +45,111 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[TracingConfig.REQUEST_ID_HEADER],
 )
 
-# Initialize components
-print("🚀 Initializing Jarvis Enterprise Assistant v2.0...")
+# Components load in the background; until they are ready only health,
+# metrics and admin endpoints are served
+startup = Startup(critical=["models", "knowledge_base", "llm"], optional=["ollama"])
+app.add_middleware(ReadinessGate, startup=startup)
 
-# Initialize Pinecone and Knowledge Base
-pinecone_service = PineconeService()
-embedder = DistilBERTManager().embedder
-knowledge_base = KnowledgeBase(pinecone_service, embedder)
-knowledge_base.initialize()
+# Trace spans per request; also feeds the on-demand profiler
+app.add_middleware(TraceMiddleware, profiler=profiler)
 
-# Initialize Smart LLM Manager
-llm_manager = SmartLLMManager(
-    use_ollama=True,
-    ollama_model="mistral"
-)
+# Set by initialize_components()
+pinecone_service: Optional[PineconeService] = None
+knowledge_base: Optional[KnowledgeBase] = None
+llm_manager: Optional[SmartLLMManager] = None
+
+def initialize_components():
+    """Load models, seed the knowledge base and probe Ollama (runs on the startup thread)
+    
+    One DistilBERTManager is shared by the knowledge base and the LLM manager.
+    The service is ready once those are loaded; Ollama is probed alongside
+    and attached when it answers, DistilBERT handling queries until then.
+    """
+    global pinecone_service, knowledge_base, llm_manager
+    print("🚀 Initializing Jarvis Enterprise Assistant v2.0...")
+    llm_created = threading.Event()
+    
+    def probe_ollama():
+        try:
+            with startup.step("ollama"):
+                ollama = OllamaManager(model_name="mistral")
+                startup.note("ollama", available=ollama.available)
+                llm_created.wait()
+                if llm_manager is None:
+                    raise RuntimeError("LLM manager failed to initialize")
+                llm_manager.attach_ollama(ollama)
+        except Exception:
+            return   # Recorded as failed; DistilBERT keeps answering
+        print(f"🎯 Active AI Backend: {llm_manager.llm_choice}")
+    
+    threading.Thread(target=probe_ollama, name="startup-ollama", daemon=True).start()
+    
+    try:
+        with startup.step("models"):
+            models = DistilBERTManager()
+        
+        # Initialize Smart LLM Manager
+        with startup.step("llm"):
+            llm_manager = SmartLLMManager(
+                use_ollama=True,
+                ollama_model="mistral",
+                distilbert=models,
+                defer_ollama=True
+            )
+    finally:
+        llm_created.set()
+    
+    # Initialize Pinecone and Knowledge Base
+    with startup.step("knowledge_base"):
+        if IndexConfig.SHARED_DIR:
+            pinecone_service = SharedPineconeService(IndexConfig.SHARED_DIR)
+        else:
+            pinecone_service = PineconeService()
+        kb = KnowledgeBase(pinecone_service, models.embedder)
+        kb.initialize()
+        knowledge_base = kb
+
+@app.on_event("startup")
+async def start_initialization():
+    # Only starts the thread, so uvicorn binds its port straight away.
+    # Workers forked by serve.py inherit components loaded before the fork.
+    if startup.thread is None:
+        startup.run_in_background(initialize_components)
+    dashboard_snapshot.start()
 
-print(f"🎯 Active AI Backend: {llm_manager.llm_choice}")
+def preload() -> bool:
+    """Initialize every component in this process before forking workers (serve.py)
+    
+    Also loads the text generation model a single process would load on first
+    use: loaded after the fork, each worker would hold its own copy.
+    """
+    startup.run_in_background(initialize_components)
+    startup.wait(optional=True)
+    if startup.ready:
+        llm_manager.distilbert.preload_generator()
+    return startup.ready
 
 # Pydantic models with config to fix warning
 class QueryRequest(BaseModel):
     message: str
     user_id: Optional[str] = "enterprise_user"
-    force_backend: Optional[str] = None
-    
-    model_config = ConfigDict(protected_namespaces=())
-    message: str
-    user_id: Optional[str] = "enterprise_user"
-    force_backend: Optional[str] = None
+    force_backend: Optional[Literal["ollama", "distilbert"]] = None  # This request only
+    model_name: Optional[str] = None   # Largest Ollama model this request may use
+    deadline_ms: Optional[int] = Field(default=None, gt=0, le=DeadlineConfig.MAX_DEADLINE_MS)  # Server default when omitted
+    conversation_id: Optional[str] = Field(default=None, max_length=128)  # Reuse context across turns
     
     model_config = ConfigDict(protected_namespaces=())
-    message: str
+
+class BatchQueryRequest(BaseModel):
+    messages: List[str] = Field(..., min_length=1, max_length=BatchConfig.MAX_MESSAGES)
     user_id: Optional[str] = "enterprise_user"
-    force_backend: Optional[str] = None
+    force_backend: Optional[Literal["ollama", "distilbert"]] = None
+    model_name: Optional[str] = None
+    deadline_ms: Optional[int] = Field(default=None, gt=0, le=DeadlineConfig.MAX_DEADLINE_MS)  # Per message, from when it starts generating
+    concurrency: Optional[int] = Field(default=None, gt=0)
     
     model_config = ConfigDict(protected_namespaces=())
 
@@ -76,7 +162,12 @@ class QueryResponse(BaseModel):
     response_time: float
     fallback_used: bool
     tokens_used: int
+    usage: Dict[str, Any] = {}
     timestamp: str
+    context_stats: Dict[str, Any] = {}
+    hedge: Dict[str, Any] = {}
+    stages: Dict[str, Any] = {}
+    conversation: Dict[str, Any] = {}
     
     model_config = ConfigDict(protected_namespaces=())
 
@@ -86,6 +177,10 @@ class LLMSwitchRequest(BaseModel):
     
     model_config = ConfigDict(protected_namespaces=())
 
+class ProfileRequest(BaseModel):
+    requests: int = Field(default=10, gt=0, le=ProfilerConfig.MAX_REQUESTS)
+    interval_ms: float = Field(default=ProfilerConfig.DEFAULT_INTERVAL_MS, ge=ProfilerConfig.MIN_INTERVAL_MS)
+
 class KnowledgeRequest(BaseModel):
     text: str
     category: str = "general"
@@ -93,6 +188,29 @@ class KnowledgeRequest(BaseModel):
     
     model_config = ConfigDict(protected_namespaces=())
 
+CLIENT_CLOSED_REQUEST = 499  # nginx convention for "client went away"
+
+async def run_until_disconnect(http_request: Request, coro):
+    """Await generation, cancelling it if the client disconnects
+    
+    Returns None when the client went away; cancelling the task closes the
+    Ollama stream and frees its generation slot.
+    """
+    task = asyncio.ensure_future(coro)
+    
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=ServerConfig.DISCONNECT_POLL_S)
+        if done:
+            if await http_request.is_disconnected():
+                llm_manager.record_client_disconnect(cancelled=False)
+            return task.result()
+        
+        if await http_request.is_disconnected():
+            print("🔌 Client disconnected, cancelling generation")
+            task.cancel()
+            llm_manager.record_client_disconnect(cancelled=True)
+            return None
+
 # API Endpoints
 @app.get("/")
 async def root():
@@ -101,25 +219,50 @@ async def root():
         "status": "operational",
         "version": "2.0.0",
         "ai_backends": ["ollama", "distilbert"],
-        "active_backend": llm_manager.llm_choice,
+        "active_backend": llm_manager.llm_choice if llm_manager else None,
+        "startup": startup.get_status()["status"],
         "endpoints": [
             "/query - Ask questions",
+            "/query/batch - Ask many questions (NDJSON stream)",
+            "/conversations/{id} - End a conversation (DELETE)",
             "/llm/status - LLM system status",
             "/llm/switch - Switch AI backend",
             "/knowledge - Add knowledge",
             "/search - Search knowledge base",
             "/stats - System statistics",
-            "/health - Health check"
+            "/dashboard - Health, LLM status and KB stats in one snapshot (ETag)",
+            "/metrics - Prometheus metrics",
+            "/health - Health check",
+            "/health/live - Liveness probe",
+            "/health/ready - Readiness probe (per-component startup progress)"
         ]
     }
 
-@app.get("/health")
-async def health_check():
-    llm_status = llm_manager.get_status()
+@app.on_event("shutdown")
+async def shutdown():
+    await dashboard_snapshot.stop()
+    if llm_manager:
+        await llm_manager.aclose()
+
+@app.get("/health/live")
+async def liveness():
+    """The process is up and the event loop is responding"""
+    return {"status": "alive", "timestamp": datetime.now().isoformat()}
+
+@app.get("/health/ready")
+async def readiness():
+    """200 once every critical component is initialized, 503 (with progress) until then"""
+    status = startup.get_status()
+    return JSONResponse(status, status_code=200 if status["status"] == "ready" else 503)
+
+def health_summary() -> Dict[str, Any]:
+    """Health without timestamps, shared by /health and the dashboard snapshot"""
+    if not startup.ready:
+        return {"status": startup.get_status()["status"], "components": {"llm": "starting"}}
     
+    ollama_available = llm_manager.ollama.available if llm_manager.ollama else False
     return {
         "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
         "components": {
             "llm": f"{llm_manager.llm_choice}",
             "knowledge_base": "ready",
@@ -127,11 +270,49 @@ async def health_check():
         },
         "llm_details": {
             "primary_backend": llm_manager.llm_choice,
-            "ollama_available": llm_status["ollama_available"],
+            "ollama_available": ollama_available,
             "distilbert_available": True
         }
     }
 
+@app.get("/health")
+async def health_check():
+    return {
+        **health_summary(),
+        "timestamp": datetime.now().isoformat(),
+        "startup": startup.get_status()
+    }
+
+def build_dashboard() -> Dict[str, Any]:
+    """Everything the frontend sidebar and stats panel show (runs off the event loop)"""
+    kb_stats = knowledge_base.get_stats()
+    return {
+        "health": health_summary(),
+        "llm": llm_manager.get_status(),
+        "knowledge_base": kb_stats,
+        "categories": {
+            "categories": kb_stats.get("categories", []),
+            "counts": kb_stats.get("documents_per_category", {})
+        }
+    }
+
+dashboard_snapshot = DashboardSnapshot(build_dashboard)
+
+@app.get("/dashboard")
+async def dashboard(if_none_match: Optional[str] = Header(default=None)):
+    """Health, LLM status, knowledge base stats and categories in one snapshot
+    
+    Send the ETag back as If-None-Match: an unchanged snapshot costs a 304.
+    """
+    if not startup.ready:
+        return {"health": {**health_summary(), "startup": startup.get_status()}}
+    
+    body, etag = await dashboard_snapshot.get()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if dashboard_snapshot.matches(if_none_match):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/stats")
 async def get_stats():
     """Get system statistics"""
@@ -140,7 +321,7 @@ async def get_stats():
         kb_stats = knowledge_base.get_stats()
         
         # Get LLM stats
-        llm_status = llm_manager.get_status()
+        llm_status = await run_in_threadpool(llm_manager.get_status)
         
         return {
             "knowledge_base": kb_stats,
@@ -163,10 +344,78 @@ async def get_stats():
             detail=f"Error getting stats: {str(e)}"
         )
 
+def collect_gauges():
+    """Refresh gauges that are only worth reading when /metrics is scraped"""
+    if not startup.ready:
+        return
+    
+    if llm_manager.ollama:
+        queue = llm_manager.ollama.queue.get_status()
+        QUEUE_DEPTH.set(queue["active"], state="active")
+        QUEUE_DEPTH.set(queue["waiting"], state="waiting")
+
+    INDEX_DOCUMENTS.set(len(pinecone_service.vectors))
+    INDEX_BYTES.set(pinecone_service.index_bytes())
+
+    samples = [
+        ({"backend": "distilbert", "model": name}, size)
+        for name, size in llm_manager.distilbert.memory_bytes().items()
+    ]
+    if llm_manager.ollama and llm_manager.ollama.available:
+        samples.extend(
+            ({"backend": "ollama", "model": m.get("name", "")}, m.get("size", 0))
+            for m in llm_manager.ollama.list_loaded_models()
+        )
+    MODEL_MEMORY.replace(samples)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics (text exposition format)"""
+    await run_in_threadpool(collect_gauges)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def require_admin(token: Optional[str]):
+    """Admin endpoints exist only when JARVIS_ADMIN_TOKEN is set, and need that token"""
+    if not AdminConfig.TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    if not token or not hmac.compare_digest(token, AdminConfig.TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.post("/admin/profile")
+async def start_profile(request: ProfileRequest,
+                        x_admin_token: Optional[str] = Header(default=None, alias=AdminConfig.TOKEN_HEADER)):
+    """Sample CPU stacks of every thread while the next N requests run"""
+    require_admin(x_admin_token)
+    profiler.arm(request.requests, request.interval_ms)
+    return profiler.get_status()
+
+@app.get("/admin/profile")
+async def get_profile(format: Literal["folded", "json"] = "folded",
+                      x_admin_token: Optional[str] = Header(default=None, alias=AdminConfig.TOKEN_HEADER)):
+    """Collected stacks: folded text for flamegraph.pl / speedscope, or status as JSON"""
+    require_admin(x_admin_token)
+    if format == "json":
+        return profiler.get_status()
+    
+    status = profiler.get_status()
+    return PlainTextResponse(profiler.folded(), headers={
+        "X-Profile-State": status["state"],
+        "X-Profile-Samples": str(status["samples"])
+    })
+
+@app.get("/admin/traces/{request_id}")
+async def get_trace(request_id: str, x_admin_token: Optional[str] = Header(default=None, alias=AdminConfig.TOKEN_HEADER)):
+    """Spans of a recent request, by its X-Request-ID"""
+    require_admin(x_admin_token)
+    trace = recent_traces.get(request_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found (expired or unknown request id)")
+    return trace.to_dict()
+
 @app.get("/llm/status")
 async def get_llm_status():
     """Get detailed LLM status and statistics"""
-    status = llm_manager.get_status()
+    status = await run_in_threadpool(llm_manager.get_status)
     
     return {
         "status": status,
@@ -179,7 +428,8 @@ async def switch_llm_backend(request: LLMSwitchRequest):
     """Switch between Ollama and DistilBERT backends"""
     
     if request.backend.lower() == "ollama":
-        success = llm_manager.switch_to_ollama(request.model_name)
+        success = await run_in_threadpool(llm_manager.switch_to_ollama, request.model_name)
+        dashboard_snapshot.invalidate()
         
         if success:
             return {
@@ -196,6 +446,7 @@ async def switch_llm_backend(request: LLMSwitchRequest):
     
     elif request.backend.lower() == "distilbert":
         llm_manager.switch_to_distilbert()
+        dashboard_snapshot.invalidate()
         return {
             "success": True,
             "message": "Switched to DistilBERT",
@@ -208,71 +459,188 @@ async def switch_llm_backend(request: LLMSwitchRequest):
             detail="Invalid backend. Use 'ollama' or 'distilbert'"
         )
 
+async def answer_with_context(message: str, classification: Dict[str, Any],
+                              search_results: List[Dict], deadline: Deadline,
+                              http_request: Optional[Request] = None,
+                              force_backend: Optional[str] = None,
+                              model_name: Optional[str] = None,
+                              session_key: Optional[str] = None) -> Optional[QueryResponse]:
+    """Route, pack context and generate the answer for one classified, retrieved query
+    
+    With `http_request`, generation is aborted (and None returned) if that
+    client disconnects. `force_backend` and `model_name` affect this query only.
+    `session_key` continues an earlier conversation (see `conversation_key`).
+    """
+    relevant = [r for r in search_results if r["score"] > ContextConfig.MIN_SCORE]
+    
+    # 3. Route to a model that fits the deadline, then pack context for it
+    with deadline.stage("route_and_pack"):
+        route = llm_manager.route_query(
+            message, classification, deadline=deadline,
+            force_backend=force_backend, model_name=model_name
+        )
+        with STAGE_SECONDS.time(stage="prompt_build"):
+            packer = llm_manager.get_context_packer(route["model"])
+            conversation_tokens = 0
+            if session_key and route["backend"] == "ollama":
+                conversation_tokens = llm_manager.sessions.context_tokens(session_key, route["model"])
+            packed = packer.pack(
+                relevant,
+                question=message,
+                system_prompt=llm_manager.get_system_prompt(classification["primary_category"]),
+                conversation_tokens=conversation_tokens
+            )
+    
+    sources = [f"{c['category']} ({c['score']:.2f})" for c in packed["chunks"]]
+    context = packed["context"] or "General enterprise knowledge."
+    
+    # 4. Generate response using smart LLM manager
+    with deadline.stage("generate"):
+        generation = llm_manager.generate_response(
+            query=message,
+            context=context,
+            category=classification["primary_category"],
+            classification=classification,
+            route=route,
+            deadline=deadline,
+            session_key=session_key
+        )
+        if http_request is not None:
+            llm_result = await run_until_disconnect(http_request, generation)
+        else:
+            llm_result = await generation
+    
+    if llm_result is None:
+        return None
+    
+    # 5. Format sources
+    if not sources:
+        sources = ["General knowledge base"]
+    
+    return QueryResponse(
+        response=llm_result["response"],
+        sources=sources[:3],
+        category=classification["primary_category"],
+        backend=llm_result["backend"],
+        model=llm_result["model"],
+        response_time=llm_result["response_time"],
+        fallback_used=llm_result["fallback_used"],
+        tokens_used=llm_result.get("tokens_used", 0),
+        usage=llm_result.get("usage", {}),
+        timestamp=datetime.now().isoformat(),
+        context_stats=packed["stats"],
+        hedge=llm_result.get("hedge", {}),
+        stages=deadline.breakdown(),
+        conversation=llm_result.get("conversation", {})
+    )
+
+def conversation_key(user_id: Optional[str], conversation_id: Optional[str]) -> Optional[str]:
+    """Session store key; requests without a conversation_id stay stateless"""
+    if not conversation_id:
+        return None
+    return f"{user_id}\0{conversation_id}"
+
 @app.post("/query", response_model=QueryResponse)
-async def query_assistant(request: QueryRequest):
+@traced("query_assistant")
+async def query_assistant(request: QueryRequest, http_request: Request):
     try:
-        # Handle force backend if specified
-        if request.force_backend:
-            if request.force_backend == "ollama":
-                llm_manager.switch_to_ollama()
-            elif request.force_backend == "distilbert":
-                llm_manager.switch_to_distilbert()
-        
-        # 1. Classify the query
-        classification = llm_manager.classify_query(request.message)
-        
-        # 2. Search for relevant context
-        search_results = knowledge_base.search(request.message, top_k=3)
+        deadline = Deadline(request.deadline_ms)
         
-        # 3. Prepare context from search results
-        context_chunks = []
-        sources = []
+        # 1-2. Classify the query and search for context; neither needs the other
+        with deadline.stage("pre_generation"):
+            classification, search_results = await asyncio.gather(
+                deadline.timed("classify", run_cpu(
+                    llm_manager.classify_query, request.message, deadline=deadline
+                )),
+                deadline.timed("retrieve", run_cpu(
+                    knowledge_base.search,
+                    request.message,
+                    top_k=ContextConfig.RETRIEVAL_TOP_K,
+                    deadline=deadline
+                ))
+            )
+        deadline.record_overlap("pre_generation", ["classify", "retrieve"])
         
-        for result in search_results:
-            if result["score"] > 0.3:  # Only use relevant results
-                context_chunks.append(result["text"])
-                sources.append(f"{result['category']} ({result['score']:.2f})")
-        
-        context = "\n\n".join(context_chunks) if context_chunks else "General enterprise knowledge."
-        
-        # 4. Generate response using smart LLM manager
-        llm_result = llm_manager.generate_response(
-            query=request.message,
-            context=context,
-            category=classification["primary_category"]
+        # 3-5. Generate the answer (aborted if the client leaves)
+        response = await answer_with_context(
+            request.message, classification, search_results, deadline, http_request,
+            force_backend=request.force_backend, model_name=request.model_name,
+            session_key=conversation_key(request.user_id, request.conversation_id)
         )
+        if response is None:
+            raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
         
-        # 5. Format sources
-        if not sources:
-            sources = ["General knowledge base"]
-        
-        return QueryResponse(
-            response=llm_result["response"],
-            sources=sources[:3],
-            category=classification["primary_category"],
-            backend=llm_result["backend"],
-            model=llm_result["model"],
-            response_time=llm_result["response_time"],
-            fallback_used=llm_result["fallback_used"],
-            tokens_used=llm_result.get("tokens_used", 0),
-            timestamp=datetime.now().isoformat()
-        )
+        return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error processing query: {str(e)}"
         )
 
+@app.delete("/conversations/{conversation_id}")
+async def end_conversation(conversation_id: str, user_id: str = "enterprise_user"):
+    """Forget the Ollama context kept for a conversation"""
+    dropped = llm_manager.sessions.drop(conversation_key(user_id, conversation_id))
+    return {"conversation_id": conversation_id, "ended": dropped}
+
+@app.post("/query/batch")
+async def query_batch(request: BatchQueryRequest):
+    """Answer many questions; results stream back as NDJSON in completion order"""
+    messages = request.messages
+    concurrency = min(request.concurrency or BatchConfig.DEFAULT_CONCURRENCY, BatchConfig.MAX_CONCURRENCY)
+    
+    # One classification sweep and one embedding pass + similarity matrix product for all messages
+    classify_all = lambda: [llm_manager.classify_query(m) for m in messages]
+    classifications, search_results = await asyncio.gather(
+        run_cpu(classify_all),
+        run_cpu(knowledge_base.search_batch, messages, top_k=ContextConfig.RETRIEVAL_TOP_K)
+    )
+    
+    slots = asyncio.Semaphore(concurrency)
+    
+    async def answer(index: int) -> Dict[str, Any]:
+        async with slots:
+            # The budget starts once the message gets a generation slot
+            deadline = Deadline(request.deadline_ms)
+            try:
+                response = await answer_with_context(
+                    messages[index], classifications[index], search_results[index], deadline,
+                    force_backend=request.force_backend, model_name=request.model_name
+                )
+                return {"index": index, "message": messages[index], **response.model_dump()}
+            except Exception as e:
+                return {"index": index, "message": messages[index], "error": str(e)}
+    
+    async def stream_results():
+        tasks = [asyncio.ensure_future(answer(i)) for i in range(len(messages))]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished) + "\n"
+        finally:
+            # Client went away mid-stream: stop generations nobody will read
+            pending = [t for t in tasks if not t.done()]
+            for task in pending:
+                task.cancel()
+                llm_manager.record_client_disconnect(cancelled=True)
+            if pending:
+                print(f"🔌 Batch client disconnected, cancelled {len(pending)} generations")
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 @app.post("/knowledge")
 async def add_knowledge(request: KnowledgeRequest):
     try:
-        result = knowledge_base.add_knowledge(
+        result = await run_cpu(
+            knowledge_base.add_knowledge,
             text=request.text,
             category=request.category,
             source="api",
             tags=request.tags
         )
+        dashboard_snapshot.invalidate()
         
         return {
             "success": True,
@@ -287,11 +655,44 @@ async def add_knowledge(request: KnowledgeRequest):
             detail=f"Error adding knowledge: {str(e)}"
         )
 
+@app.put("/knowledge/{doc_id}")
+async def upsert_knowledge(doc_id: str, request: KnowledgeRequest):
+    """Insert or replace the document stored under doc_id"""
+    result = await run_cpu(
+        knowledge_base.upsert_knowledge,
+        doc_id,
+        text=request.text,
+        category=request.category,
+        source="api",
+        tags=request.tags
+    )
+    dashboard_snapshot.invalidate()
+    return {**result, "category": request.category}
+
+@app.delete("/knowledge/{doc_id}")
+async def delete_knowledge(doc_id: str):
+    if not await run_cpu(knowledge_base.delete_knowledge, doc_id):
+        raise HTTPException(status_code=404, detail=f"No document with id {doc_id}")
+    dashboard_snapshot.invalidate()
+    return {"success": True, "doc_id": doc_id}
+
+@app.delete("/knowledge")
+async def delete_knowledge_where(category: Optional[str] = None, source: Optional[str] = None):
+    """Delete every document matching all given filters"""
+    if category is None and source is None:
+        raise HTTPException(status_code=400, detail="Give at least one filter (category, source)")
+    deleted = await run_cpu(knowledge_base.delete_where, category=category, source=source)
+    if deleted:
+        dashboard_snapshot.invalidate()
+    return {"success": True, "deleted": len(deleted), "doc_ids": deleted}
+
 @app.get("/search/{query}")
-async def search_knowledge(query: str, limit: int = 5):
-    results = knowledge_base.search(query, top_k=limit)
+async def search_knowledge(query: str, limit: int = 5,
+                           mode: Optional[str] = Query(default=None, pattern="^(vector|lexical|hybrid)$")):
+    results = await run_cpu(knowledge_base.search, query, top_k=limit, mode=mode)
     return {
         "query": query,
+        "mode": mode or SearchConfig.MODE,
         "count": len(results),
         "results": results
     }
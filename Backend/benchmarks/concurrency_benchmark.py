@@ -0,0 +1,122 @@
+# backend/benchmarks/concurrency_benchmark.py
+"""Concurrency benchmark: does a slow generation stall unrelated requests?
+
+Starts a fake Ollama with a slow model and the real API in-process, fires
+concurrent /query requests and probes /health while they are in flight.
+Run it on two commits to compare; results are printed as JSON.
+
+    python benchmarks/concurrency_benchmark.py --queries 8 --first-token-delay 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+
+from fake_ollama import start_fake_ollama, FakeOllamaSettings
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def start_api(port: int):
+    """Serve the app on a background thread; returns once its components are ready
+
+    Exits non-zero when a critical component failed: every query would be a
+    503, which is not a result worth reporting.
+    """
+    import app as api
+
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    api.startup.wait(optional=True)
+    if not api.startup.ready:
+        server.should_exit = True
+        print(f"❌ API failed to start:\n{json.dumps(api.startup.get_status(), indent=2)}")
+        sys.exit(1)
+    return server
+
+
+async def run_load(base_url: str, queries: int, probe_interval: float):
+    health_latencies = []
+    query_latencies = []
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        async def one_query(i):
+            start = time.perf_counter()
+            response = await client.post("/query", json={"message": f"Explain SOX compliance ({i})"})
+            query_latencies.append(time.perf_counter() - start)
+            return response.status_code
+
+        started = time.perf_counter()
+        tasks = [asyncio.ensure_future(one_query(i)) for i in range(queries)]
+
+        while not all(t.done() for t in tasks):
+            start = time.perf_counter()
+            await client.get("/health")
+            health_latencies.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(probe_interval)
+
+        statuses = await asyncio.gather(*tasks)
+        wall = time.perf_counter() - started
+
+    return {
+        "queries": queries,
+        "query_status_codes": sorted(set(statuses)),
+        "wall_time_s": round(wall, 3),
+        "query_p50_s": round(statistics.median(query_latencies), 3),
+        "query_max_s": round(max(query_latencies), 3),
+        "health_probes": len(health_latencies),
+        "health_p50_ms": round(statistics.median(health_latencies), 1),
+        "health_p95_ms": round(_percentile(health_latencies, 95), 1),
+        "health_max_ms": round(max(health_latencies), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure /health latency while slow /query calls run")
+    parser.add_argument("--queries", type=int, default=8)
+    parser.add_argument("--first-token-delay", type=float, default=3.0)
+    parser.add_argument("--tokens-per-second", type=float, default=20.0)
+    parser.add_argument("--ollama-port", type=int, default=11435)
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--probe-interval", type=float, default=0.1)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    start_fake_ollama(args.ollama_port, FakeOllamaSettings(
+        first_token_delay=args.first_token_delay,
+        tokens_per_second=args.tokens_per_second
+    ))
+
+    from config import OllamaConfig
+    OllamaConfig.BASE_URL = f"http://127.0.0.1:{args.ollama_port}"
+
+    server = start_api(args.api_port)
+    try:
+        results = asyncio.run(run_load(f"http://127.0.0.1:{args.api_port}", args.queries, args.probe_interval))
+    finally:
+        server.should_exit = True
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
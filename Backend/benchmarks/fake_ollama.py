@@ -0,0 +1,216 @@
+# backend/benchmarks/fake_ollama.py
+"""Minimal stand-in for the Ollama HTTP API (/api/tags, /api/ps, /api/generate)
+
+Runs on the standard library only so benchmarks work without a GPU box.
+Latency, tokens per second, error rates and model-load delays are configurable:
+
+    python benchmarks/fake_ollama.py --port 11435 --first-token-delay 5
+    python benchmarks/fake_ollama.py --error-rate 0.1 --drop-rate 0.05 --load-delay 8
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllamaSettings:
+    """Behaviour of the fake server"""
+
+    def __init__(self, first_token_delay: float = 1.0, tokens_per_second: float = 20.0,
+                 response_tokens: int = 64, models=None, error_rate: float = 0.0,
+                 drop_rate: float = 0.0, load_delay: float = 0.0, keep_alive: float = 300.0,
+                 jitter: float = 0.0, seed: int = None):
+        self.first_token_delay = first_token_delay    # Prompt processing before the first token
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.models = models or ["mistral:latest", "phi:latest", "tinyllama:latest"]
+        self.error_rate = error_rate                  # Share of generations answered with HTTP 500
+        self.drop_rate = drop_rate                    # Share of streams cut off mid-answer
+        self.load_delay = load_delay                  # Extra delay when a model is not loaded
+        self.keep_alive = keep_alive                  # Seconds an idle model stays loaded
+        self.jitter = jitter                          # +/- share of random variation on delays
+        self.random = random.Random(seed)
+        self.loaded = {}                              # model -> last used (time.time())
+        self.stats = {"generations": 0, "completed": 0, "client_aborted": 0,
+                      "errors": 0, "dropped": 0, "model_loads": 0}
+        self.lock = threading.Lock()
+
+    def vary(self, seconds: float) -> float:
+        if not self.jitter:
+            return seconds
+        with self.lock:
+            return max(seconds * (1 + self.random.uniform(-self.jitter, self.jitter)), 0.0)
+
+    def roll(self, rate: float) -> bool:
+        with self.lock:
+            return self.random.random() < rate
+
+    def drop_point(self, tokens: int) -> int:
+        with self.lock:
+            return self.random.randrange(max(tokens, 1))
+
+    def load_model(self, model: str) -> float:
+        """Seconds spent loading `model` for this request (0 if already loaded)"""
+        now = time.time()
+        with self.lock:
+            last_used = self.loaded.get(model)
+            self.loaded[model] = now
+            if last_used is not None and now - last_used < self.keep_alive:
+                return 0.0
+            self.stats["model_loads"] += 1
+        return self.vary(self.load_delay)
+
+    def model_size(self, name: str) -> int:
+        return 4_000_000_000 // (self.models.index(name) + 1) if name in self.models else 1_000_000_000
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    settings: FakeOllamaSettings = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        settings = self.settings
+        if self.path == "/api/tags":
+            self._send_json({"models": [
+                {"name": name, "size": settings.model_size(name)} for name in settings.models
+            ]})
+        elif self.path == "/api/ps":
+            now = time.time()
+            with settings.lock:
+                loaded = [m for m, last in settings.loaded.items() if now - last < settings.keep_alive]
+            self._send_json({"models": [
+                {"name": name, "size": settings.model_size(name), "size_vram": settings.model_size(name)}
+                for name in loaded
+            ]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        settings = self.settings
+        with settings.lock:
+            settings.stats["generations"] += 1
+
+        num_predict = request.get("options", {}).get("num_predict", settings.response_tokens)
+        tokens = min(settings.response_tokens, num_predict)
+        start = time.time()
+
+        if settings.roll(settings.error_rate):
+            with settings.lock:
+                settings.stats["errors"] += 1
+            self._send_json({"error": "simulated failure"}, 500)
+            return
+
+        load_seconds = settings.load_model(request.get("model", ""))
+        prompt_seconds = settings.vary(settings.first_token_delay)
+        time.sleep(load_seconds + prompt_seconds)
+        timings = {"load": load_seconds, "prompt": prompt_seconds}
+
+        if not request.get("stream", True):
+            time.sleep(tokens / settings.tokens_per_second)
+            self._send_json(self._final(request, tokens, start, "word " * tokens, timings))
+            with settings.lock:
+                settings.stats["completed"] += 1
+            return
+
+        # Streaming: newline-delimited JSON until done, like Ollama
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        drop_at = settings.drop_point(tokens) if settings.roll(settings.drop_rate) else None
+        try:
+            for i in range(tokens):
+                if i == drop_at:
+                    with settings.lock:
+                        settings.stats["dropped"] += 1
+                    self.close_connection = True
+                    return
+                self.wfile.write(json.dumps({"model": request.get("model"), "response": "word ", "done": False}).encode() + b"\n")
+                self.wfile.flush()
+                time.sleep(1 / settings.tokens_per_second)
+            self.wfile.write(json.dumps(self._final(request, tokens, start, "", timings)).encode() + b"\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            with settings.lock:
+                settings.stats["client_aborted"] += 1
+            return
+
+        with settings.lock:
+            settings.stats["completed"] += 1
+
+    def _final(self, request: dict, tokens: int, start: float, text: str, timings: dict) -> dict:
+        eval_ns = int(tokens / self.settings.tokens_per_second * 1e9)
+        prompt_tokens = len(request.get("prompt", "").split())
+        # Like Ollama: the conversation so far, to send back with the next turn
+        context = list(request.get("context") or []) + list(range(prompt_tokens + tokens))
+        return {
+            "model": request.get("model"),
+            "response": text,
+            "done": True,
+            "total_duration": int((time.time() - start) * 1e9),
+            "load_duration": int(timings["load"] * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(timings["prompt"] * 1e9),
+            "eval_count": tokens,
+            "eval_duration": eval_ns,
+            "context": context
+        }
+
+
+def start_fake_ollama(port: int = 11435, settings: FakeOllamaSettings = None):
+    """Start the fake server on a background thread; returns (server, settings)"""
+    settings = settings or FakeOllamaSettings()
+    handler = type("BoundFakeOllamaHandler", (FakeOllamaHandler,), {"settings": settings})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, settings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--first-token-delay", type=float, default=1.0)
+    parser.add_argument("--tokens-per-second", type=float, default=20.0)
+    parser.add_argument("--response-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--load-delay", type=float, default=0.0)
+    parser.add_argument("--keep-alive", type=float, default=300.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server, _ = start_fake_ollama(args.port, FakeOllamaSettings(
+        first_token_delay=args.first_token_delay,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        drop_rate=args.drop_rate,
+        load_delay=args.load_delay,
+        keep_alive=args.keep_alive,
+        jitter=args.jitter,
+        seed=args.seed
+    ))
+    print(f"🦙 Fake Ollama listening on http://127.0.0.1:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,153 @@
+# backend/benchmarks/load_test.py
+"""Open-loop load test: drive /query at a target rate and report latency percentiles
+
+By default starts the fake Ollama and the API in-process, so the fallback,
+timeout and queueing paths can be exercised without a GPU box:
+
+    python benchmarks/load_test.py --rps 5 --duration 30 --error-rate 0.1 --load-delay 5
+    python benchmarks/load_test.py --url http://localhost:8000 --rps 2 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from fake_ollama import start_fake_ollama, FakeOllamaSettings
+from concurrency_benchmark import start_api
+
+QUESTIONS = [
+    "What are board governance best practices?",
+    "How should we run an enterprise risk assessment?",
+    "Which SOX requirements apply to audit trails?",
+    "How does GDPR affect policy management?",
+    "Explain compliance reporting for HIPAA",
+]
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)], 3)
+
+
+async def run_load(base_url: str, rps: float, duration: float, deadline_ms: int = None,
+                   timeout: float = 120.0):
+    """Send requests on a fixed schedule (open loop), whether or not earlier ones finished"""
+    outcomes = []
+    total = int(rps * duration)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout,
+                                 limits=httpx.Limits(max_connections=None)) as client:
+        async def one_query(i):
+            body = {"message": f"{QUESTIONS[i % len(QUESTIONS)]} ({i})"}
+            if deadline_ms:
+                body["deadline_ms"] = deadline_ms
+            start = time.perf_counter()
+            try:
+                response = await client.post("/query", json=body)
+                data = response.json() if response.status_code == 200 else {}
+                status = response.status_code
+            except httpx.HTTPError as e:
+                data, status = {}, type(e).__name__
+            outcomes.append({
+                "latency_s": time.perf_counter() - start,
+                "status": status,
+                "backend": data.get("backend"),
+                "fallback_used": data.get("fallback_used", False)
+            })
+
+        started = time.perf_counter()
+        tasks = []
+        for i in range(total):
+            delay = started + i / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(one_query(i)))
+        send_wall = time.perf_counter() - started
+
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - started
+
+    ok = [o for o in outcomes if o["status"] == 200]
+    latencies = [o["latency_s"] for o in ok]
+    return {
+        "target_rps": rps,
+        "achieved_send_rps": round(total / send_wall, 2) if send_wall else None,
+        "requests": total,
+        "succeeded": len(ok),
+        "error_rate": round(1 - len(ok) / total, 3) if total else None,
+        "status_codes": dict(Counter(str(o["status"]) for o in outcomes)),
+        "throughput_rps": round(len(ok) / wall, 2),
+        "wall_time_s": round(wall, 2),
+        "latency_p50_s": _percentile(latencies, 50),
+        "latency_p95_s": _percentile(latencies, 95),
+        "latency_p99_s": _percentile(latencies, 99),
+        "latency_max_s": round(max(latencies), 3) if latencies else None,
+        "fallback_rate": round(sum(o["fallback_used"] for o in ok) / len(ok), 3) if ok else None,
+        "backends": dict(Counter(o["backend"] for o in ok))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive /query at a target rate; report p50/p95/p99")
+    parser.add_argument("--url", help="Existing API to load (default: start fake Ollama + API in-process)")
+    parser.add_argument("--rps", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--deadline-ms", type=int)
+    parser.add_argument("--api-port", type=int, default=8766)
+    parser.add_argument("--ollama-port", type=int, default=11437)
+    # Fake Ollama behaviour (ignored with --url)
+    parser.add_argument("--first-token-delay", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--response-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--load-delay", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    server = fake = None
+    base_url = args.url
+    if not base_url:
+        _, fake = start_fake_ollama(args.ollama_port, FakeOllamaSettings(
+            first_token_delay=args.first_token_delay,
+            tokens_per_second=args.tokens_per_second,
+            response_tokens=args.response_tokens,
+            error_rate=args.error_rate,
+            drop_rate=args.drop_rate,
+            load_delay=args.load_delay,
+            jitter=args.jitter,
+            seed=args.seed
+        ))
+        from config import OllamaConfig
+        OllamaConfig.BASE_URL = f"http://127.0.0.1:{args.ollama_port}"
+        server = start_api(args.api_port)
+        base_url = f"http://127.0.0.1:{args.api_port}"
+
+    try:
+        results = asyncio.run(run_load(base_url, args.rps, args.duration, args.deadline_ms))
+    finally:
+        if server:
+            server.should_exit = True
+
+    if fake:
+        results["fake_ollama"] = dict(fake.stats)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+# backend/benchmarks/run_benchmarks.py
+"""Latency benchmarks: vector/lexical/hybrid search, knowledge base search, classification, QA and /query
+
+The quantization benchmark also reports vector memory per million vectors
+(heap, measured with tracemalloc, and the memory-mapped rescoring file) and
+recall@k of float16/int8 storage against float32.
+
+Runs offline on CPU. Hugging Face models are loaded from the local cache only
+(HF_HUB_OFFLINE=1); when they are not cached a hashing embedder stands in and
+the model-only benchmarks are skipped. /query runs through the FastAPI test
+client against a fake Ollama that answers instantly, so it measures our
+pipeline rather than generation. Results are JSON so commits can be compared:
+
+    python benchmarks/run_benchmarks.py --output benchmarks/results/$(git rev-parse --short HEAD).json
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/abc1234.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+import zlib
+from datetime import datetime
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import numpy as np
+
+from fake_ollama import start_fake_ollama, FakeOllamaSettings
+
+EMBEDDING_DIM = 384
+
+QUERIES = [
+    "What are board governance best practices?",
+    "How should we run an enterprise risk assessment?",
+    "Which SOX requirements apply to audit trails?",
+    "How does GDPR affect policy management?",
+    "What does Diligent's board portal offer directors?",
+    "How often should the risk appetite be reviewed?",
+    "Explain compliance reporting for HIPAA",
+    "What is the role of the audit committee?",
+]
+
+CONTEXT = (
+    "Board governance includes regular meetings, secure document management, and annual "
+    "evaluations. SOX compliance requires internal controls over financial reporting and "
+    "audit trails. Risk assessment involves identifying, analyzing, and evaluating risks."
+)
+
+
+def summarize(samples_s):
+    """Latency summary in milliseconds"""
+    ordered = sorted(samples_s)
+    pick = lambda pct: ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3),
+        "p50_ms": round(pick(50) * 1000, 3),
+        "p95_ms": round(pick(95) * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3)
+    }
+
+
+def measure(func, repeat, warmup=2):
+    """Call func `warmup` + `repeat` times; summary of the timed calls"""
+    for i in range(warmup):
+        func(i)
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embedder used when MiniLM is not cached"""
+
+    def encode(self, text):
+        if isinstance(text, (list, tuple)):
+            return np.stack([self.encode(t) for t in text])
+        vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode()) % EMBEDDING_DIM] += 1.0
+        return vector
+
+
+class HashingModelManager:
+    """Stand-in for DistilBERTManager without transformer models"""
+
+    def __init__(self):
+        self.embedder = HashingEmbedder()
+
+    def memory_bytes(self):
+        return {}
+
+    def classify_query(self, query):
+        return {"primary_category": "general", "confidence": 0, "all_categories": {}}
+
+    def answer_question(self, context, question):
+        return context[:100]
+
+    def generate_response(self, query, context=None):
+        return (context or "")[:100]
+
+
+def load_models():
+    """Real DistilBERTManager from the local cache, or the hashing stand-in"""
+    try:
+        from model_manager import DistilBERTManager
+        return DistilBERTManager(), "distilbert"
+    except Exception as e:
+        print(f"⚠️ Models unavailable offline ({type(e).__name__}: {e}); using hashing embedder")
+        stub = types.ModuleType("model_manager")
+        stub.DistilBERTManager = HashingModelManager
+        sys.modules["model_manager"] = stub
+        return HashingModelManager(), "hashing-stub"
+
+
+SYNTHETIC_WORDS = (CONTEXT.lower().replace(",", "").replace(".", "").split()
+                   + [f"term{i}" for i in range(5000)])
+
+
+class QueuedEmbedder:
+    """Hands out precomputed vectors in order, so filling an index skips the model"""
+
+    def __init__(self, vectors):
+        self._vectors = iter(vectors)
+
+    def encode(self, text):
+        return next(self._vectors)
+
+
+def synthetic_docs(size, rng):
+    """`size` random vectors and 40-word texts"""
+    vectors = rng.standard_normal((size, EMBEDDING_DIM)).astype(np.float32)
+    words = rng.choice(SYNTHETIC_WORDS, size=(size, 40))
+    return vectors, [" ".join(words[i]) + f" SOX {i % 1000}" for i in range(size)]
+
+
+def fill_index(service, vectors, texts):
+    """Upsert the documents into the mock index with their precomputed vectors"""
+    service.delete_all()
+    embedder = QueuedEmbedder(vectors)
+    for i, text in enumerate(texts):
+        service.upsert(f"doc-{i}", text, {"category": "synthetic"}, embedder)
+
+
+def bench_vector_search(sizes, repeat, rng):
+    from pinecone_service import PineconeService
+
+    service = PineconeService()
+    results = {}
+    for size in sizes:
+        fill_index(service, *synthetic_docs(size, rng))
+        queries = rng.standard_normal((repeat, EMBEDDING_DIM)).astype(np.float32)
+
+        start = time.perf_counter()
+        service.search_similar(queries[0].tolist(), top_k=5)   # Cold caches
+        cold_ms = round((time.perf_counter() - start) * 1000, 3)
+
+        results[str(size)] = {
+            "cold_first_search_ms": cold_ms,
+            "search_similar": measure(lambda i: service.search_similar(queries[i % repeat].tolist(), top_k=5), repeat),
+            "search_similar_batch_32": measure(lambda i: service.search_similar_batch(queries[:32], top_k=5), max(repeat // 4, 3)),
+            "search_lexical": measure(lambda i: service.search_lexical(QUERIES[i % len(QUERIES)] + f" SOX {i}", top_k=5), repeat),
+            "search_hybrid": measure(
+                lambda i: service.search_hybrid(QUERIES[i % len(QUERIES)] + f" SOX {i}", queries[i % repeat].tolist(), top_k=5),
+                repeat
+            )
+        }
+        print(f"  vector search @ {size}: p50 {results[str(size)]['search_similar']['p50_ms']} ms")
+    return results
+
+
+def traced_vector_bytes(snapshot):
+    """Heap still allocated by the dense store: arrays, ids and row map (the only place vectors are kept)"""
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(True, "*dense_store.py")])
+    return sum(stat.size for stat in snapshot.statistics("filename"))
+
+
+def bench_quantization(size, repeat, rng, k=10):
+    """Memory, recall@k against float32 and latency of each vector dtype, with and without rescoring
+
+    Memory is what a full index holds per live vector: the heap the vector
+    code has allocated (tracemalloc, so nothing it keeps goes uncounted), and
+    separately the memory-mapped float32 file rescoring reads from.
+    """
+    from pinecone_service import PineconeService
+
+    vectors, texts = synthetic_docs(size, rng)
+    queries = rng.standard_normal((repeat, EMBEDDING_DIM)).astype(np.float32)
+    mb_per_million = lambda total: round(total / size * 1e6 / 2 ** 20, 1)
+
+    truth, results = None, {}
+    for dtype, rescore_factor in (("float32", 0), ("float16", 0), ("float16", 4), ("int8", 0), ("int8", 4)):
+        service = PineconeService(dtype, rescore_factor)
+        tracemalloc.start()
+        fill_index(service, vectors, texts)
+        heap = traced_vector_bytes(tracemalloc.take_snapshot())
+        tracemalloc.stop()
+
+        found = service.search_similar_batch(queries, top_k=k)
+        if truth is None:
+            truth = [{r["id"] for r in results} for results in found]     # float32 comes first
+        recall = statistics.mean(len(truth[i] & {r["id"] for r in found[i]}) / k for i in range(repeat))
+        storage = service.storage_stats()
+        name = f"{dtype}_rescore{rescore_factor}" if rescore_factor else dtype
+        results[name] = {
+            "bytes_per_vector": storage["bytes_per_vector"],
+            "traced_heap_mb_per_million_vectors": mb_per_million(heap),
+            "rescore_file_mb_per_million_vectors": mb_per_million(storage["rescore_file_bytes"]),
+            f"recall_at_{k}": round(recall, 4),
+            "search_similar": measure(lambda i: service.search_similar(queries[i % repeat], top_k=k), repeat)
+        }
+        print(f"  {name} @ {size}: {results[name]['traced_heap_mb_per_million_vectors']} MB heap + "
+              f"{results[name]['rescore_file_mb_per_million_vectors']} MB mapped per 1M vectors, "
+              f"recall@{k} {results[name][f'recall_at_{k}']}")
+    return results
+
+
+def bench_knowledge_base(models, repeat):
+    from pinecone_service import PineconeService
+    from knowledge_base import KnowledgeBase
+
+    kb = KnowledgeBase(PineconeService(), models.embedder)
+    kb.initialize()
+    return {
+        "search_top5": measure(lambda i: kb.search(QUERIES[i % len(QUERIES)], top_k=5, mode="vector"), repeat),
+        "search_top5_hybrid": measure(lambda i: kb.search(QUERIES[i % len(QUERIES)], top_k=5, mode="hybrid"), repeat),
+        "encode_only": measure(lambda i: models.embedder.encode(QUERIES[i % len(QUERIES)]), repeat)
+    }
+
+
+def bench_models(models, repeat):
+    return {
+        "classify_query": measure(lambda i: models.classify_query(QUERIES[i % len(QUERIES)]), repeat),
+        "answer_question": measure(lambda i: models.answer_question(CONTEXT, QUERIES[i % len(QUERIES)]), repeat)
+    }
+
+
+def bench_query_endpoint(repeat, ollama_port):
+    """Full /query through the test client; generation served instantly by the fake Ollama"""
+    start_fake_ollama(ollama_port, FakeOllamaSettings(first_token_delay=0.0, tokens_per_second=100000, response_tokens=32))
+
+    from config import OllamaConfig
+    OllamaConfig.BASE_URL = f"http://127.0.0.1:{ollama_port}"
+
+    from fastapi.testclient import TestClient
+    import app as api
+
+    results = {}
+    with TestClient(api.app) as client:
+        api.startup.wait(optional=True)
+        for backend in ("ollama", "distilbert"):
+            statuses = set()
+
+            def query(i):
+                response = client.post("/query", json={"message": QUERIES[i % len(QUERIES)], "force_backend": backend})
+                statuses.add(response.status_code)
+
+            results[backend] = {**measure(query, repeat), "status_codes": sorted(statuses)}
+            print(f"  /query ({backend}): p50 {results[backend]['p50_ms']} ms")
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline_path):
+    """Print p50 changes against an earlier result file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    def flatten(node, prefix=""):
+        for key, value in node.items():
+            if isinstance(value, dict) and "p50_ms" in value:
+                yield prefix + key, value["p50_ms"]
+            elif isinstance(value, dict):
+                yield from flatten(value, f"{prefix}{key}.")
+
+    old = dict(flatten(baseline["results"]))
+    print(f"\n📊 p50 vs {baseline.get('commit') or baseline_path}:")
+    for name, p50 in flatten(current["results"]):
+        if name in old and old[name]:
+            change = (p50 - old[name]) / old[name] * 100
+            flag = "🔺" if change > 10 else ("🔻" if change < -10 else "  ")
+            print(f"  {flag} {name}: {old[name]} → {p50} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jarvis latency benchmarks")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Vector index sizes")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--query-repeat", type=int, default=20)
+    parser.add_argument("--quant-size", type=int, default=100000, help="Index size for the quantization benchmark")
+    parser.add_argument("--only", help="Comma-separated subset: vector,quantization,kb,models,query")
+    parser.add_argument("--ollama-port", type=int, default=11436)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    selected = set(args.only.split(",")) if args.only else {"vector", "quantization", "kb", "models", "query"}
+    rng = np.random.default_rng(args.seed)
+    results = {}
+
+    print("⏱️ Running Jarvis benchmarks...")
+    if "vector" in selected:
+        results["vector_search"] = bench_vector_search([int(s) for s in args.sizes.split(",")], args.repeat, rng)
+    if "quantization" in selected:
+        results["quantization"] = bench_quantization(args.quant_size, args.repeat, rng)
+
+    models, models_kind = load_models() if selected & {"kb", "models", "query"} else (None, None)
+    if "kb" in selected:
+        results["knowledge_base"] = bench_knowledge_base(models, args.repeat)
+    if "models" in selected:
+        if models_kind == "distilbert":
+            results["distilbert"] = bench_models(models, args.repeat)
+        else:
+            results["distilbert"] = {"skipped": "models not in the local Hugging Face cache"}
+    if "query" in selected:
+        results["query_endpoint"] = bench_query_endpoint(args.query_repeat, args.ollama_port)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "models": models_kind,
+        "results": results
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Saved to {args.output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
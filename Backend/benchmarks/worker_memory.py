@@ -0,0 +1,103 @@
+# backend/benchmarks/worker_memory.py
+"""Memory per worker under serve.py (Linux: reads /proc/<pid>/smaps_rollup)
+
+Starts `serve.py --workers N`, waits for readiness, sends a few queries so
+each worker has touched the models and the index, then reports each
+process's RSS, PSS, shared and private memory:
+
+    python benchmarks/worker_memory.py --workers 4
+
+PSS charges every shared page to the processes mapping it in equal parts,
+so the PSS total is what the whole server really costs. "private" per
+worker is the price of one more worker. "independent_processes_estimate" is
+N x the preloaded master's RSS: roughly what N separate `python app.py`
+processes would take.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read_memory(pid: int) -> dict:
+    """RSS, PSS, shared and private memory of one process, in MB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1]) / 1024
+    return {
+        "rss_mb": round(fields.get("Rss", 0), 1),
+        "pss_mb": round(fields.get("Pss", 0), 1),
+        "shared_mb": round(fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0), 1),
+        "private_mb": round(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0), 1)
+    }
+
+
+def child_pids(pid: int) -> list:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+
+def wait_ready(base_url: str, timeout: float) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health/ready", timeout=2).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory per serve.py worker")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for readiness")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(args.workers), "--host", "127.0.0.1", "--port", str(args.port)],
+        cwd=BACKEND_DIR
+    )
+    try:
+        if not wait_ready(base_url, args.timeout):
+            print("❌ Server did not become ready")
+            sys.exit(1)
+        for i in range(args.queries):
+            httpx.post(f"{base_url}/query", json={"message": f"Explain SOX compliance ({i})"}, timeout=120)
+
+        master = read_memory(server.pid)
+        workers = [read_memory(pid) for pid in child_pids(server.pid)]
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    results = {
+        "workers": len(workers),
+        "master": master,
+        "per_worker": workers,
+        "private_per_worker_mb": round(sum(w["private_mb"] for w in workers) / max(len(workers), 1), 1),
+        "total_pss_mb": round(master["pss_mb"] + sum(w["pss_mb"] for w in workers), 1),
+        "independent_processes_estimate_mb": round(master["rss_mb"] * len(workers), 1)
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
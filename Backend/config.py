@@ -1,6 +1,6 @@
 # backend/config.py
 import os
-from typing import Optional
+from typing import List, Optional
 
 class OllamaConfig:
     """Ollama configuration with better defaults"""
@@ -8,6 +8,10 @@ class OllamaConfig:
     # Base URL for Ollama
     BASE_URL = "http://localhost:11434"
     
+    # Several hosts, comma-separated (e.g. "http://gpu1:11434,http://gpu2:11434");
+    # BASE_URL is used when this is not set
+    BASE_URLS = os.getenv("OLLAMA_BASE_URLS", "")
+    
     # Model preferences (in order of preference)
     PREFERRED_MODELS = [
         "llama2:7b",          # Smaller, faster
@@ -25,37 +29,36 @@ class OllamaConfig:
     # Generation settings
     DEFAULT_TEMPERATURE = 0.7
     DEFAULT_MAX_TOKENS = 512
+    DEFAULT_NUM_CTX = 2048    # Ollama's own default when num_ctx is not set
+    
+    # Concurrent generations sent to Ollama; further requests queue for a slot
+    MAX_CONCURRENT_GENERATIONS = 2
+    
+    # Installed/loaded model lists are reused for this long before a background refresh
+    CATALOG_TTL_S = 30
     
     @classmethod
-    def get_best_available_model(cls) -> Optional[str]:
-        """Get the best available model"""
-        import requests
+    def get_best_available_model(cls, available_models: List[str]) -> Optional[str]:
+        """Get the best model among the installed ones (names from the model catalogue)"""
+        # Return first preferred model that's available
+        for model in cls.PREFERRED_MODELS:
+            if model in available_models or f"{model}:latest" in available_models:
+                print(f"✅ Selected Ollama model: {model}")
+                return model
+        
+        # If no preferred models, use first available
+        if available_models:
+            print(f"⚠️ Using available model: {available_models[0]}")
+            return available_models[0]
         
-        try:
-            response = requests.get(
-                f"{cls.BASE_URL}/api/tags",
-                timeout=cls.TIMEOUT_CONNECT
-            )
-            
-            if response.status_code == 200:
-                available_models = [m["name"] for m in response.json().get("models", [])]
-                
-                # Return first preferred model that's available
-                for model in cls.PREFERRED_MODELS:
-                    if model in available_models:
-                        print(f"✅ Selected Ollama model: {model}")
-                        return model
-                
-                # If no preferred models, use first available
-                if available_models:
-                    print(f"⚠️ Using available model: {available_models[0]}")
-                    return available_models[0]
-                    
-        except Exception as e:
-            print(f"❌ Cannot check available models: {e}")
-            
         return None
     
+    @classmethod
+    def get_base_urls(cls) -> list:
+        """Ollama hosts to balance generations across"""
+        urls = [url.strip() for url in cls.BASE_URLS.split(",") if url.strip()]
+        return urls or [cls.BASE_URL]
+    
     @classmethod
     def get_generation_params(cls, model: str) -> dict:
         """Get optimal parameters for a model"""
@@ -76,4 +79,249 @@ class OllamaConfig:
         elif "tiny" in model:
             params["options"]["num_predict"] = 256  # Shorter for tiny models
             
-        return params
\ No newline at end of file
+        return params
+    
+    @classmethod
+    def get_context_window(cls, model: str) -> int:
+        """Get the context window (num_ctx) used for a model"""
+        options = cls.get_generation_params(model)["options"]
+        return options.get("num_ctx", cls.DEFAULT_NUM_CTX)
+
+
+class ContextConfig:
+    """Retrieval context packing settings"""
+    
+    # Retrieval
+    RETRIEVAL_TOP_K = 5           # Candidates handed to the packer
+    MIN_SCORE = 0.3               # Only use relevant results
+    
+    # Token estimation (characters per token, by model family)
+    CHARS_PER_TOKEN = {
+        "llama": 3.6,
+        "mistral": 3.6,
+        "phi": 3.9,
+        "distilbert": 4.0,
+    }
+    DEFAULT_CHARS_PER_TOKEN = 3.8
+    PROMPT_TEMPLATE_TOKENS = 32   # "Context information:", "Question:", "Answer:" etc.
+    
+    # DistilBERT QA reads at most this many characters of context
+    DISTILBERT_CONTEXT_CHARS = 2000
+    
+    # Chunks whose word overlap with an already packed chunk exceeds this are dropped
+    REDUNDANCY_THRESHOLD = 0.8
+
+class RoutingConfig:
+    """Latency-aware Ollama model routing settings"""
+    
+    # Predicted latency is multiplied by this before comparing with the deadline
+    SAFETY_FACTOR = 1.2
+    
+    # Rolling statistics
+    STATS_WINDOW = 50             # Samples kept per model
+    DECISION_LOG_SIZE = 20        # Recent routing decisions shown in /llm/status
+    MIN_SAMPLES = 3               # Before failure rate is trusted
+    MAX_FAILURE_RATE = 0.5        # Skip models failing more often than this
+    EXPLORE_EVERY = 20            # Every Nth decision measures the largest unmeasured model (see ModelRouter._route)
+    
+    # Query complexity
+    COMPLEX_QUERY_WORDS = 40
+    REASONING_KEYWORDS = [
+        "explain", "compare", "why", "how", "difference", "analyze",
+        "evaluate", "steps", "framework", "strategy"
+    ]
+    MIN_OUTPUT_SHARE = 0.3        # Share of num_predict expected for trivial queries
+    MIN_NUM_PREDICT = 64          # Never cap generation below this many tokens
+    
+    # Priors used until a model has measured statistics (CPU-class hardware).
+    # They never downgrade the configured model on their own, only cap its
+    # num_predict: at DeadlineConfig.DEFAULT_DEADLINE_MS each still leaves
+    # well over MIN_NUM_PREDICT tokens (mistral: (25 s / 1.2 - 2 s) x 9 = 169)
+    MODEL_PRIORS = {
+        "tinyllama": {"tokens_per_second": 40.0, "overhead_s": 0.5, "size_gb": 0.6},
+        "phi": {"tokens_per_second": 25.0, "overhead_s": 1.0, "size_gb": 1.6},
+        "llama2": {"tokens_per_second": 10.0, "overhead_s": 2.0, "size_gb": 3.8},
+        "mistral": {"tokens_per_second": 9.0, "overhead_s": 2.0, "size_gb": 4.1},
+    }
+    DEFAULT_PRIOR = {"tokens_per_second": 8.0, "overhead_s": 2.0, "size_gb": 4.0}
+    
+    @classmethod
+    def get_prior(cls, model: str) -> dict:
+        """Get the latency prior for a model family"""
+        for family, prior in cls.MODEL_PRIORS.items():
+            if family in model:
+                return prior
+        return cls.DEFAULT_PRIOR
+
+
+class HedgeConfig:
+    """Hedged generation: race the DistilBERT fallback against a slow Ollama"""
+    
+    ENABLED = True
+    
+    # Start the DistilBERT fallback if Ollama has no first token after this long
+    DELAY_S = 2.0
+    
+    # Return the fallback answer if Ollama still has no first token by now
+    FIRST_TOKEN_DEADLINE_S = 8.0
+    
+    # What to do with a losing Ollama generation: "cancel" it, or let it
+    # finish and "cache" the answer for the next identical question
+    LOSER_POLICY = "cancel"
+    CACHE_SIZE = 64
+
+
+class DeadlineConfig:
+    """Per-request time budget for /query (milliseconds)"""
+    
+    # Used when the caller does not send deadline_ms; below the frontend's 30 s timeout
+    DEFAULT_DEADLINE_MS = 25000
+    MAX_DEADLINE_MS = 120000
+    
+    # Stages shrink their work when less than this much budget is left
+    MIN_CLASSIFY_MS = 50          # Skip classification (use "general")
+    MIN_SEARCH_MS = 500           # Skip retrieval entirely
+    REDUCED_SEARCH_MS = 3000      # Retrieve fewer candidates
+    REDUCED_TOP_K = 2
+    
+    # Extra read-timeout slack on top of the remaining budget for Ollama calls
+    TIMEOUT_GRACE_S = 2.0
+
+
+class ServerConfig:
+    """API server settings"""
+    
+    # How often in-flight requests check whether the client is still connected
+    DISCONNECT_POLL_S = 0.5
+    
+    # Threads for blocking CPU work (classification, embedding, DistilBERT QA)
+    CPU_WORKERS = min(4, os.cpu_count() or 1)
+    
+    # Worker processes for serve.py; they share models and the index copy-on-write
+    WORKERS = int(os.getenv("JARVIS_WORKERS", "1"))
+
+
+class BatchConfig:
+    """POST /query/batch settings"""
+    
+    MAX_MESSAGES = 5000
+    DEFAULT_CONCURRENCY = OllamaConfig.MAX_CONCURRENT_GENERATIONS
+    MAX_CONCURRENCY = 8
+
+
+class MetricsConfig:
+    """/metrics settings"""
+    
+    # Histogram buckets (seconds) shared by all pipeline stages
+    LATENCY_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class TracingConfig:
+    """Per-request trace spans"""
+    
+    REQUEST_ID_HEADER = "X-Request-ID"   # Reused when the client sends one
+    MAX_REQUEST_ID_LENGTH = 128
+    RECENT_TRACES = 500                  # Kept for /admin/traces/{request_id}
+    SLOW_REQUEST_MS = 10000              # Slower requests log their slowest spans
+
+
+class ProfilerConfig:
+    """On-demand sampling profiler (/admin/profile)"""
+    
+    DEFAULT_INTERVAL_MS = 5
+    MIN_INTERVAL_MS = 1
+    MAX_REQUESTS = 1000
+    EXCLUDED_PATH_PREFIX = "/admin"      # Fetching the profile is not profiled
+
+
+class AdminConfig:
+    """Admin endpoints are disabled unless a token is configured"""
+    
+    TOKEN = os.getenv("JARVIS_ADMIN_TOKEN")
+    TOKEN_HEADER = "X-Admin-Token"
+
+
+class PoolConfig:
+    """Balancing generations across several Ollama hosts"""
+    
+    # "least_outstanding" (fewest in-flight requests) or "latency" (lowest expected wait)
+    STRATEGY = os.getenv("OLLAMA_BALANCING", "least_outstanding")
+    
+    DEFAULT_LATENCY_S = 5.0        # Assumed per-generation latency before a host is measured
+    MODEL_LOAD_PENALTY_S = 10.0    # Extra expected wait when the model is not loaded on a host
+    LATENCY_EWMA_ALPHA = 0.3
+    
+    # Ejection: after this many consecutive failures a host is skipped, for
+    # EJECT_S doubling per repeated ejection up to MAX_EJECT_S
+    EJECT_AFTER_FAILURES = 3
+    EJECT_S = 15
+    MAX_EJECT_S = 300
+    
+    MAX_ATTEMPTS = 2               # Hosts tried per generation when one fails
+
+
+class SessionConfig:
+    """Multi-turn conversations that reuse Ollama's context tokens"""
+    
+    MAX_SESSIONS = 1000          # Least recently used conversations are dropped beyond this
+    IDLE_TIMEOUT_S = 1800        # Conversations idle this long are dropped
+    MAX_CONTEXT_SHARE = 0.5      # Start over once history fills this share of num_ctx
+
+
+class StartupConfig:
+    """Background initialization and readiness"""
+    
+    # Served while components are still loading; everything else gets a 503
+    UNGATED_PATHS = ("/health", "/dashboard", "/metrics", "/admin", "/docs", "/redoc", "/openapi.json")
+    RETRY_AFTER_S = 5
+
+
+class DashboardConfig:
+    """GET /dashboard snapshot"""
+    
+    REFRESH_S = 5          # Background rebuild interval
+    IDLE_AFTER_S = 60      # Stop rebuilding when nobody has polled for this long
+
+
+class IndexConfig:
+    """Vector index storage"""
+    
+    # Directory for the memory-mapped index shared by all worker processes;
+    # unset keeps the index private to the process
+    SHARED_DIR = os.getenv("JARVIS_INDEX_DIR", "")
+    INITIAL_CAPACITY = 1024      # Rows allocated up front; doubles when full
+    
+    # Precision of the in-process search matrix: "float32", "float16" (half the
+    # memory) or "int8" (a quarter, plus one float32 scale per row). int8 with
+    # rescoring keeps float32's recall; numpy decodes float16 ~10x slower than int8
+    VECTOR_DTYPE = os.getenv("JARVIS_VECTOR_DTYPE", "int8")
+    # A quantized scan picks top_k x RESCORE_FACTOR candidates and ranks them by
+    # their exact float32 cosine; 0 returns the quantized ranking and scores as they are
+    # and keeps no float32 rows at all
+    RESCORE_FACTOR = 4
+    # The float32 rows for rescoring go to a memory-mapped, already-deleted file
+    # here (unset: the system temp dir; avoid a RAM-backed tmpfs, which defeats it)
+    RESCORE_DIR = os.getenv("JARVIS_RESCORE_DIR", "")
+    SCAN_CHUNK_ROWS = 512        # Quantized rows decoded to float32 at a time (fits in L2)
+    
+    # Deleted documents are tombstoned; storage is rebuilt without them in the
+    # background once this share of the rows (and at least COMPACT_MIN_DEAD) is dead
+    COMPACT_DEAD_RATIO = 0.25
+    COMPACT_MIN_DEAD = 64
+
+
+class SearchConfig:
+    """Knowledge base retrieval: dense (embeddings), lexical (BM25) or hybrid"""
+    
+    # "hybrid" adds a BM25 bonus to the cosine score, so exact identifiers
+    # ("SOX 404", "72 hours") win without raising top_k; "vector" or "lexical" use one side
+    MODE = os.getenv("JARVIS_SEARCH_MODE", "hybrid")
+    
+    # Hybrid score = cosine + LEXICAL_WEIGHT x normalised BM25 (0..1); a result with
+    # no lexical match keeps its cosine score, so ContextConfig.MIN_SCORE still applies
+    LEXICAL_WEIGHT = 0.3
+    CANDIDATE_FACTOR = 4         # Candidates taken from each side per result wanted
+    
+    # BM25 parameters
+    BM25_K1 = 1.2
+    BM25_B = 0.75
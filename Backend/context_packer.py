@@ -0,0 +1,108 @@
+# backend/context_packer.py
+import math
+import re
+from typing import List, Dict, Any, Optional
+from config import OllamaConfig, ContextConfig
+
+DISTILBERT_MODEL = "distilbert-base-uncased"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class ContextPacker:
+    """Packs retrieved chunks into the prompt budget of the active model"""
+
+    def __init__(self, model: str):
+        self.model = model
+
+        if "distilbert" in model:
+            # Extractive QA: no system prompt, no generated tokens, hard char limit
+            self.chars_per_token = ContextConfig.CHARS_PER_TOKEN["distilbert"]
+            self.num_ctx = int(ContextConfig.DISTILBERT_CONTEXT_CHARS / self.chars_per_token)
+            self.reserved_tokens = 0
+        else:
+            self.chars_per_token = self._chars_per_token(model)
+            self.num_ctx = OllamaConfig.get_context_window(model)
+            options = OllamaConfig.get_generation_params(model)["options"]
+            self.reserved_tokens = options.get("num_predict", OllamaConfig.DEFAULT_MAX_TOKENS)
+
+    @staticmethod
+    def _chars_per_token(model: str) -> float:
+        """Characters per token for the model family"""
+        for family, ratio in ContextConfig.CHARS_PER_TOKEN.items():
+            if family in model:
+                return ratio
+        return ContextConfig.DEFAULT_CHARS_PER_TOKEN
+
+    def estimate_tokens(self, text: str) -> int:
+        """Estimate token count (never fewer tokens than words)"""
+        if not text:
+            return 0
+        by_chars = math.ceil(len(text) / self.chars_per_token)
+        by_words = len(_WORD_RE.findall(text))
+        return max(by_chars, by_words)
+
+    def pack(self, chunks: List[Dict[str, Any]], question: str,
+             system_prompt: Optional[str] = None, conversation_tokens: int = 0) -> Dict[str, Any]:
+        """Greedily fill the context budget with the most relevant, non-redundant chunks
+
+        `conversation_tokens` are the earlier turns a follow-up sends along
+        (see SessionStore); they take their share of num_ctx first.
+        """
+
+        fixed_tokens = self.estimate_tokens(question)
+        if system_prompt and "distilbert" not in self.model:
+            fixed_tokens += self.estimate_tokens(system_prompt) + ContextConfig.PROMPT_TEMPLATE_TOKENS
+
+        budget = max(self.num_ctx - self.reserved_tokens - conversation_tokens - fixed_tokens, 0)
+
+        packed = []
+        packed_words = []
+        packed_tokens = 0
+        dropped = []
+        dropped_tokens = 0
+
+        for chunk in sorted(chunks, key=lambda c: c.get("score", 0), reverse=True):
+            text = chunk.get("text", "")
+            tokens = self.estimate_tokens(text) + (2 if packed else 0)  # "\n\n" separator
+            words = set(_WORD_RE.findall(text.lower()))
+
+            reason = None
+            if any(self._overlap(words, other) >= ContextConfig.REDUNDANCY_THRESHOLD
+                   for other in packed_words):
+                reason = "redundant"
+            elif packed_tokens + tokens > budget:
+                reason = "budget"
+
+            if reason:
+                dropped.append({**chunk, "drop_reason": reason})
+                dropped_tokens += self.estimate_tokens(text)
+                continue
+
+            packed.append(chunk)
+            packed_words.append(words)
+            packed_tokens += tokens
+
+        return {
+            "context": "\n\n".join(c["text"] for c in packed),
+            "chunks": packed,
+            "dropped": dropped,
+            "stats": {
+                "model": self.model,
+                "num_ctx": self.num_ctx,
+                "budget_tokens": budget,
+                "conversation_tokens": conversation_tokens,
+                "prompt_tokens": fixed_tokens + packed_tokens,
+                "packed_tokens": packed_tokens,
+                "dropped_tokens": dropped_tokens,
+                "chunks_packed": len(packed),
+                "chunks_dropped": len(dropped),
+            }
+        }
+
+    @staticmethod
+    def _overlap(a: set, b: set) -> float:
+        """Share of the smaller chunk's words found in the other chunk"""
+        if not a or not b:
+            return 0.0
+        return len(a & b) / min(len(a), len(b))
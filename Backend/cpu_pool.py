@@ -0,0 +1,19 @@
+# backend/cpu_pool.py
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from config import ServerConfig
+
+# Bounded pool so inference never runs on (or starves) the event loop
+_executor = ThreadPoolExecutor(max_workers=ServerConfig.CPU_WORKERS, thread_name_prefix="jarvis-cpu")
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Run blocking CPU work (model inference, embedding) on the bounded CPU pool
+    
+    The caller's context variables (the request trace) carry over to the worker.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, partial(context.run, func, *args, **kwargs))
@@ -0,0 +1,93 @@
+# backend/dashboard.py
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from config import DashboardConfig
+
+
+class DashboardSnapshot:
+    """Dashboard payload rebuilt in the background and served pre-encoded with an ETag
+
+    Polls read the last snapshot instead of querying Ollama and the index on
+    every request. The ETag hashes the content (not the build time), so a poll
+    whose If-None-Match still matches gets a 304. Rebuilding pauses while
+    nobody is polling.
+    """
+
+    def __init__(self, build: Callable[[], Dict[str, Any]],
+                 interval_s: float = DashboardConfig.REFRESH_S,
+                 idle_after_s: float = DashboardConfig.IDLE_AFTER_S):
+        self.build = build
+        self.interval_s = interval_s
+        self.idle_after_s = idle_after_s
+        self.body: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self.built_at = 0.0
+        self.last_requested = 0.0
+        self.builds = 0
+        self._lock: Optional[asyncio.Lock] = None   # Bound to the running loop on first use
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self) -> Tuple[bytes, str]:
+        """Current (body, etag); rebuilt first if missing or stale"""
+        self.last_requested = time.time()
+        if self.body is None or time.time() - self.built_at > self.interval_s * 2:
+            await self.refresh()
+        return self.body, self.etag
+
+    async def refresh(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        started = time.time()
+        async with self._lock:
+            if self.built_at >= started:
+                return   # Another request rebuilt it while we waited
+
+            data = await run_in_threadpool(self.build)
+            content = json.dumps(data, sort_keys=True, default=str)
+            etag = f'W/"{hashlib.sha1(content.encode()).hexdigest()[:20]}"'
+            self.body = json.dumps({
+                **data,
+                "snapshot_at": datetime.now().isoformat(),
+                "etag": etag
+            }, default=str).encode()
+            self.etag = etag
+            self.built_at = time.time()
+            self.builds += 1
+
+    def invalidate(self):
+        """A write changed what the dashboard shows: rebuild on the next poll"""
+        self.built_at = 0.0
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header covers the current snapshot"""
+        if not if_none_match or self.etag is None:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags or self.etag[2:] in tags
+
+    async def run(self):
+        """Background loop: rebuild every interval while someone is polling"""
+        while True:
+            await asyncio.sleep(self.interval_s)
+            if time.time() - self.last_requested > self.idle_after_s:
+                continue
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"⚠️ Dashboard refresh failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,63 @@
+# backend/deadline.py
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Awaitable
+from config import DeadlineConfig
+
+
+class Deadline:
+    """Time budget for one request, shared by every pipeline stage"""
+
+    def __init__(self, budget_ms: Optional[float] = None):
+        budget_ms = budget_ms or DeadlineConfig.DEFAULT_DEADLINE_MS
+        self.budget_ms = min(max(budget_ms, 0), DeadlineConfig.MAX_DEADLINE_MS)
+        self.start = time.monotonic()
+        self.stages: Dict[str, float] = {}
+        self.degraded: Dict[str, str] = {}
+        self.overlap_saved: Dict[str, float] = {}
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.start) * 1000
+
+    def remaining_ms(self) -> float:
+        return max(self.budget_ms - self.elapsed_ms(), 0.0)
+
+    def remaining_s(self) -> float:
+        return self.remaining_ms() / 1000
+
+    def expired(self) -> bool:
+        return self.remaining_ms() <= 0
+
+    def degrade(self, stage: str, how: str):
+        """Note that a stage shrank its work to fit the budget"""
+        self.degraded[stage] = how
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a pipeline stage"""
+        started = time.monotonic()
+        try:
+            yield self
+        finally:
+            self.stages[name] = round((time.monotonic() - started) * 1000, 1)
+
+    async def timed(self, name: str, awaitable: Awaitable):
+        """Await a stage that runs concurrently with others, timing it on its own"""
+        with self.stage(name):
+            return await awaitable
+
+    def record_overlap(self, group: str, parts: List[str]):
+        """Record how much running `parts` concurrently inside stage `group` saved"""
+        sequential = sum(self.stages.get(part, 0.0) for part in parts)
+        self.overlap_saved[group] = round(max(sequential - self.stages.get(group, 0.0), 0.0), 1)
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Per-stage timings for the response"""
+        return {
+            "budget_ms": self.budget_ms,
+            "elapsed_ms": round(self.elapsed_ms(), 1),
+            "remaining_ms": round(self.remaining_ms(), 1),
+            "stages_ms": dict(self.stages),
+            "overlap_saved_ms": dict(self.overlap_saved),
+            "degraded": dict(self.degraded)
+        }
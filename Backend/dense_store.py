@@ -0,0 +1,212 @@
+# backend/dense_store.py
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import IndexConfig
+
+# Storage type of each IndexConfig.VECTOR_DTYPE
+_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+class DenseView:
+    """One search's snapshot of a dense store: the rows written so far, their ids and dead mask"""
+
+    __slots__ = ("matrix", "ids", "dead", "scales", "exact")
+
+    def __init__(self, matrix: np.ndarray, ids: List[str], dead: Optional[np.ndarray] = None,
+                 scales: Optional[np.ndarray] = None, exact: Optional[np.ndarray] = None):
+        self.matrix = matrix        # (rows, dim) float32, float16 or int8 codes
+        self.ids = ids
+        self.dead = dead            # Tombstoned rows, or None
+        self.scales = scales        # int8 only: row = codes x scale
+        self.exact = exact          # float32 memmap of the same rows, when kept for rescoring
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    @property
+    def quantized(self) -> bool:
+        return self.matrix.dtype != np.float32
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """(n_queries, rows) cosine scores of L2-normalised float32 queries
+
+        float32 rows go straight to BLAS. float16 and int8 rows are decoded
+        SCAN_CHUNK_ROWS at a time, so at most one chunk exists as float32.
+        """
+        if not self.quantized:
+            return queries @ self.matrix.T
+        scores = np.empty((len(queries), len(self.matrix)), dtype=np.float32)
+        step = IndexConfig.SCAN_CHUNK_ROWS
+        for start in range(0, len(self.matrix), step):
+            chunk = self.matrix[start:start + step].astype(np.float32)
+            scores[:, start:start + len(chunk)] = queries @ chunk.T
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def exact_scores(self, rows, query: np.ndarray) -> np.ndarray:
+        """Cosine of `rows` with a normalised query, from the float32 rows when kept"""
+        rows = np.asarray(rows, dtype=np.intp)
+        if self.exact is not None:
+            return self.exact[rows] @ query
+        vectors = self.matrix[rows].astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows, None]
+        return vectors @ query
+
+
+class DenseRows:
+    """L2-normalised embeddings in one growable buffer, with tombstones
+
+    The buffer holds float32, float16 or int8 rows (IndexConfig.VECTOR_DTYPE).
+    An int8 row is scaled to its own largest component, so the codes use the
+    full -127..127 range whatever the vector's spread.
+
+    Rows are only ever appended: putting an existing id again writes a new
+    row and tombstones the old one, and deleting one just marks the row dead.
+    A written row never changes, so a search holding an earlier view() stays
+    valid while writes go on. Searches mask
+    the dead rows; compacted() copies the live ones into a fresh store once
+    enough of them are dead.
+
+    With `exact`, a quantized store also writes each row as float32 to a
+    memory-mapped temporary file (IndexConfig.RESCORE_DIR) for rescoring:
+    those rows live in the page cache, not on the heap, and only the few
+    candidates a search rescores are ever read back.
+    """
+
+    def __init__(self, dim: int, capacity: int = IndexConfig.INITIAL_CAPACITY,
+                 dtype: str = IndexConfig.VECTOR_DTYPE, exact: bool = False):
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unknown vector dtype '{dtype}' (expected one of {', '.join(_DTYPES)})")
+        self.dim = dim
+        self.dtype = dtype
+        self.buffer = np.zeros((capacity, dim), dtype=_DTYPES[dtype])
+        self.scales = np.ones(capacity, dtype=np.float32) if dtype == "int8" else None
+        self._exact_file = None
+        self.exact = None                 # float32 (capacity, dim) memmap, or None
+        if exact and dtype != "float32":
+            # Deleted on creation: the space is freed when the store is dropped
+            self._exact_file = tempfile.TemporaryFile(dir=IndexConfig.RESCORE_DIR or None)
+            self.exact = self._map_exact(capacity)
+        self.dead = np.zeros(capacity, dtype=bool)
+        self.ids: List[str] = []          # Row -> doc id (dead rows keep theirs)
+        self.rows: Dict[str, int] = {}    # Live doc id -> row
+        self.dead_count = 0
+
+    def __len__(self) -> int:
+        """Live rows"""
+        return len(self.rows)
+
+    @property
+    def dead_ratio(self) -> float:
+        return self.dead_count / len(self.ids) if self.ids else 0.0
+
+    def put(self, doc_id: str, embedding) -> int:
+        """Insert `doc_id`, or replace it with a new row; returns the row"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.shape != (self.dim,):
+            raise ValueError(f"Embedding dimension {vector.shape} does not match the index ({self.dim})")
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+
+        row = len(self.ids)
+        if row == len(self.buffer):
+            self._grow()
+        self._write(row, vector)
+        self.ids.append(doc_id)     # Only after the row is written: readers never see a partial row
+        self.delete(doc_id)         # The replaced row, if any
+        self.rows[doc_id] = row
+        return row
+
+    def delete(self, doc_id: str) -> bool:
+        """Tombstone the row of `doc_id`; returns whether it was live"""
+        row = self.rows.pop(doc_id, None)
+        if row is None:
+            return False
+        self.dead[row] = True
+        self.dead_count += 1
+        return True
+
+    def _map_exact(self, capacity: int) -> np.memmap:
+        """Size the rescoring file for `capacity` rows and map it (earlier maps stay valid)"""
+        self._exact_file.truncate(capacity * self.dim * 4)
+        return np.memmap(self._exact_file, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _write(self, row: int, vector: np.ndarray):
+        if self.exact is not None:
+            self.exact[row] = vector
+        if self.scales is None:
+            self.buffer[row] = vector
+            return
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        self.scales[row] = scale
+        self.buffer[row] = np.rint(vector / scale)
+
+    def _grow(self):
+        """Double the capacity; readers keep the buffer they already hold"""
+        capacity = len(self.buffer) * 2
+        buffer = np.zeros((capacity, self.dim), dtype=self.buffer.dtype)
+        buffer[:len(self.buffer)] = self.buffer
+        if self.scales is not None:
+            scales = np.ones(capacity, dtype=np.float32)
+            scales[:len(self.scales)] = self.scales
+            self.scales = scales
+        dead = np.zeros(capacity, dtype=bool)
+        dead[:len(self.dead)] = self.dead
+        if self.exact is not None:
+            self.exact = self._map_exact(capacity)
+        self.buffer, self.dead = buffer, dead
+
+    def view(self) -> DenseView:
+        """The rows written so far
+
+        The dead mask is a copy: numpy's boolean indexing must not see it
+        change under a concurrent delete.
+        """
+        n = len(self.ids)
+        scales = self.scales[:n] if self.scales is not None else None
+        exact = self.exact[:n] if self.exact is not None else None
+        return DenseView(self.buffer[:n], self.ids, self.dead[:n].copy() if self.dead_count else None,
+                         scales, exact)
+
+    def exact_scores(self, doc_ids: List[str], query: np.ndarray) -> Dict[str, float]:
+        """Cosine of the live documents among `doc_ids` with a normalised query"""
+        rows = {}
+        for doc_id in doc_ids:
+            row = self.rows.get(doc_id)      # None once deleted
+            if row is not None:
+                rows[doc_id] = row
+        if not rows:
+            return {}
+        view = self.view()          # Taken after the lookup: it holds every row found
+        return dict(zip(rows, view.exact_scores(list(rows.values()), query).tolist()))
+
+    def compacted(self) -> "DenseRows":
+        """A copy holding only the live rows"""
+        live = np.flatnonzero(~self.dead[:len(self.ids)])
+        store = DenseRows(self.dim, max(IndexConfig.INITIAL_CAPACITY, 2 * len(live)), self.dtype,
+                          exact=self.exact is not None)
+        store.buffer[:len(live)] = self.buffer[live]
+        if self.scales is not None:
+            store.scales[:len(live)] = self.scales[live]
+        if self.exact is not None:
+            store.exact[:len(live)] = self.exact[live]
+        store.ids = [self.ids[row] for row in live]
+        store.rows = {doc_id: row for row, doc_id in enumerate(store.ids)}
+        return store
+
+    def nbytes(self) -> int:
+        """Heap bytes: codes, scales, dead flags (all with spare capacity) and the id containers"""
+        scales = self.scales.nbytes if self.scales is not None else 0
+        ids = sys.getsizeof(self.ids) + sys.getsizeof(self.rows)   # The id strings are the documents' own
+        return int(self.buffer.nbytes + scales + self.dead.nbytes + ids)
+
+    def exact_nbytes(self) -> int:
+        """Size of the rescoring file (page cache and disk, not heap)"""
+        return int(self.exact.nbytes) if self.exact is not None else 0
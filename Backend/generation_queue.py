@@ -0,0 +1,40 @@
+# backend/generation_queue.py
+import asyncio
+from typing import Dict, Optional
+
+
+class GenerationQueue:
+    """Bounded pool of Ollama generation slots shared by all requests"""
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self._semaphore: Optional[asyncio.Semaphore] = None  # Bound to the running loop on first use
+        self.active = 0
+        self.waiting = 0
+
+    async def acquire(self, timeout: float) -> bool:
+        """Wait for a free slot; gives up after `timeout` seconds"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.slots)
+
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=max(timeout, 0.001))
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.waiting -= 1
+
+        self.active += 1
+        return True
+
+    def release(self):
+        """Hand the slot back to the next waiting generation"""
+        self.active -= 1
+        self._semaphore.release()
+
+    def get_status(self) -> Dict[str, int]:
+        return {"slots": self.slots, "active": self.active, "waiting": self.waiting}
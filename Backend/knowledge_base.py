@@ -1,7 +1,11 @@
 # backend/knowledge_base.py
 import json
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from config import DeadlineConfig, SearchConfig
+from deadline import Deadline
+from metrics import STAGE_SECONDS
+from tracing import traced, span, annotate
 
 class KnowledgeBase:
     """Manages enterprise knowledge storage and retrieval"""
@@ -94,20 +98,107 @@ class KnowledgeBase:
             "message": "Knowledge added successfully"
         }
     
-    def search(self, query: str, top_k: int = 3) -> List[Dict]:
-        """Search for relevant knowledge"""
-        query_embedding = self.embedder.encode(query).tolist()
-        results = self.pinecone.search_similar(query_embedding, top_k=top_k)
+    def upsert_knowledge(self, doc_id: str, text: str, category: str = "general", source: str = "user",
+                         tags: List[str] = None) -> Dict[str, Any]:
+        """Insert or replace the knowledge stored under `doc_id`"""
+        created = self.pinecone.upsert(
+            doc_id,
+            text,
+            metadata={
+                "category": category,
+                "source": source,
+                "tags": json.dumps(tags or []),
+                "added_at": datetime.now().isoformat()
+            },
+            embedder=self.embedder
+        )
+        
+        return {
+            "success": True,
+            "doc_id": doc_id,
+            "created": created
+        }
+    
+    def delete_knowledge(self, doc_id: str) -> bool:
+        """Delete one document; False when there was none with this id"""
+        return self.pinecone.delete(doc_id)
+    
+    def delete_where(self, **filters) -> List[str]:
+        """Delete every document whose metadata matches all filters (e.g. category, source)"""
+        return self.pinecone.delete_where({key: value for key, value in filters.items() if value is not None})
+    
+    @traced("KnowledgeBase.search")
+    def search(self, query: str, top_k: int = 3, deadline: Optional[Deadline] = None,
+               mode: Optional[str] = None) -> List[Dict]:
+        """Search for relevant knowledge
+        
+        `mode` is "vector", "lexical" (BM25) or "hybrid" (both fused, the
+        default; see SearchConfig). With a `deadline`, retrieval is skipped
+        when almost no budget is left and fewer candidates are fetched when
+        the budget is tight.
+        """
+        mode = mode or SearchConfig.MODE
+        if deadline is not None:
+            remaining = deadline.remaining_ms()
+            if remaining < DeadlineConfig.MIN_SEARCH_MS:
+                deadline.degrade("retrieve", "skipped")
+                return []
+            if remaining < DeadlineConfig.REDUCED_SEARCH_MS and top_k > DeadlineConfig.REDUCED_TOP_K:
+                deadline.degrade("retrieve", f"top_k={DeadlineConfig.REDUCED_TOP_K}")
+                top_k = DeadlineConfig.REDUCED_TOP_K
+        
+        if mode == "lexical":
+            with span("lexical_search", top_k=top_k), STAGE_SECONDS.time(stage="lexical_search"):
+                results = self.pinecone.search_lexical(query, top_k=top_k)
+            annotate(hits=len(results), mode=mode)
+            return self._format_results(results)
         
+        with span("embed"), STAGE_SECONDS.time(stage="embed"):
+            query_embedding = self.embedder.encode(query).tolist()
+        if mode == "hybrid":
+            with span("hybrid_search", top_k=top_k), STAGE_SECONDS.time(stage="hybrid_search"):
+                results = self.pinecone.search_hybrid(query, query_embedding, top_k=top_k)
+        else:
+            with span("vector_search", top_k=top_k), STAGE_SECONDS.time(stage="vector_search"):
+                results = self.pinecone.search_similar(query_embedding, top_k=top_k)
+        annotate(hits=len(results), mode=mode)
+        
+        return self._format_results(results)
+    
+    @traced("KnowledgeBase.search_batch")
+    def search_batch(self, queries: List[str], top_k: int = 3, mode: Optional[str] = None) -> List[List[Dict]]:
+        """Search for many queries: one embedding pass, one similarity matrix product"""
+        mode = mode or SearchConfig.MODE
+        if mode == "lexical":
+            with span("lexical_search", top_k=top_k), STAGE_SECONDS.time(stage="lexical_search"):
+                return [self._format_results(self.pinecone.search_lexical(q, top_k=top_k)) for q in queries]
+        
+        with span("embed", queries=len(queries)), STAGE_SECONDS.time(stage="embed"):
+            query_embeddings = self.embedder.encode(queries)
+        if mode == "hybrid":
+            with span("hybrid_search", top_k=top_k), STAGE_SECONDS.time(stage="hybrid_search"):
+                results = self.pinecone.search_hybrid_batch(queries, query_embeddings, top_k=top_k)
+        else:
+            with span("vector_search", top_k=top_k), STAGE_SECONDS.time(stage="vector_search"):
+                results = self.pinecone.search_similar_batch(query_embeddings, top_k=top_k)
+        
+        return [self._format_results(r) for r in results]
+    
+    def _format_results(self, results: List[Dict]) -> List[Dict]:
+        """Shape raw vector store matches for the API"""
         formatted_results = []
         for result in results:
-            formatted_results.append({
+            formatted = {
                 "text": result.get("text", ""),
                 "category": result.get("metadata", {}).get("category", "unknown"),
                 "source": result.get("metadata", {}).get("source", "unknown"),
                 "score": round(result.get("score", 0), 3),
                 "doc_id": result.get("metadata", {}).get("doc_id", "")
-            })
+            }
+            if "lexical_score" in result:
+                formatted["dense_score"] = round(result["dense_score"], 3)
+                formatted["lexical_score"] = round(result["lexical_score"], 3)
+            formatted_results.append(formatted)
         
         return formatted_results
     
@@ -0,0 +1,169 @@
+# backend/lexical_index.py
+import math
+import re
+import threading
+from array import array
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from config import SearchConfig
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what "
+    "which with within how do does should".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words (stopwords dropped) plus a bigram for every pair involving a number
+
+    "SOX 404", "GDPR Art. 33" and "72 hours" become the terms sox_404,
+    art_33 and 72_hours, so exact identifiers outrank documents that only
+    share the words.
+    """
+    words = [w for w in _TOKEN.findall(text.lower()) if w not in _STOPWORDS]
+    terms = list(words)
+    for first, second in zip(words, words[1:]):
+        if first.isdigit() or second.isdigit():
+            terms.append(f"{first}_{second}")
+    return terms
+
+
+class BM25Index:
+    """Incremental in-process BM25 inverted index
+
+    Postings are two typed arrays per term (document numbers as int32, term
+    frequencies as uint16): 6 bytes per posting instead of a Python tuple.
+    They are scored with numpy views of those arrays, so a lookup is a few
+    vector operations per query term. Deleting or replacing a document only
+    marks its number dead; postings are dropped by building a new index
+    (see PineconeService.compact). A search copies the query terms' postings
+    under a lock (a memcpy per term) and scores the copies outside it, so
+    searches run in parallel with each other and with writers.
+    """
+
+    def __init__(self, k1: float = SearchConfig.BM25_K1, b: float = SearchConfig.BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids: List[str] = []             # Document number -> doc id
+        self._numbers: Dict[str, int] = {}       # Doc id -> document number
+        self.doc_lengths = array("I")
+        self.dead = bytearray()                  # Document number -> 1 if deleted
+        self.dead_count = 0
+        self.total_length = 0
+        self.postings: Dict[str, Tuple[array, array]] = {}   # Term -> (doc numbers, frequencies)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Live documents"""
+        return len(self.doc_ids) - self.dead_count
+
+    def add(self, doc_id: str, text: str):
+        """Index a document, replacing any earlier text indexed under this id"""
+        terms = tokenize(text)
+        with self._lock:
+            self._delete(doc_id)
+            self._add(doc_id, terms)
+
+    def _add(self, doc_id: str, terms: List[str]):
+        number = len(self.doc_ids)
+        self.doc_lengths.append(len(terms))
+        self.dead.append(0)
+        self.total_length += len(terms)
+        self.doc_ids.append(doc_id)
+        self._numbers[doc_id] = number
+
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array("i"), array("H"))
+            posting[0].append(number)
+            posting[1].append(min(count, 65535))
+
+    def delete(self, doc_id: str) -> bool:
+        """Tombstone a document; returns whether it was indexed"""
+        with self._lock:
+            return self._delete(doc_id)
+
+    def _delete(self, doc_id: str) -> bool:
+        number = self._numbers.pop(doc_id, None)
+        if number is None:
+            return False
+        self.dead[number] = 1
+        self.dead_count += 1
+        self.total_length -= self.doc_lengths[number]
+        return True
+
+    def clear(self):
+        self.__init__(self.k1, self.b)
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """(doc id, score) of the best matches, scores normalised to [0, 1)
+
+        Each score is divided by the highest score any document could get for
+        this query (every term matched, infinite frequency). So 0.8 means most
+        of the query's weight is matched, however rare or common its terms are.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            snapshot = self._snapshot(terms)
+        return self._score(snapshot, top_k) if snapshot else []
+
+    def _snapshot(self, terms: List[str]):
+        """Copies of what scoring `terms` reads, or None if nothing can match (lock held)"""
+        n_docs = len(self.doc_ids)
+        n_live = n_docs - self.dead_count
+        postings = [(self.postings[t][0][:], self.postings[t][1][:]) for t in terms if t in self.postings]
+        if not n_live or not postings:
+            return None
+        dead = bytes(self.dead) if self.dead_count else None
+        return self.doc_ids, n_live, self.total_length, self.doc_lengths[:], dead, postings
+
+    def _score(self, snapshot, top_k: int) -> List[Tuple[str, float]]:
+        doc_ids, n_live, total_length, doc_lengths, dead, postings = snapshot
+        n_docs = len(doc_lengths)
+
+        # Document frequencies still count tombstoned postings until compaction
+        lengths = np.frombuffer(doc_lengths, dtype=np.uint32)
+        avg_length = max(total_length / n_live, 1.0)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        best_possible = 0.0
+        for docs, freqs in postings:
+            docs = np.frombuffer(docs, dtype=np.int32)
+            freqs = np.frombuffer(freqs, dtype=np.uint16).astype(np.float32)
+            idf = math.log(1 + (max(n_live - len(docs), 0) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[docs] / avg_length)
+            scores[docs] += idf * freqs * (self.k1 + 1) / (freqs + norm)
+            best_possible += idf * (self.k1 + 1)
+
+        if dead is not None:
+            scores[np.frombuffer(dead, dtype=np.bool_)] = 0
+
+        k = min(top_k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(doc_ids[i], float(scores[i] / best_possible)) for i in top]
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the posting and length arrays"""
+        with self._lock:
+            postings = sum(d.itemsize * len(d) + f.itemsize * len(f) for d, f in self.postings.values())
+        return postings + self.doc_lengths.itemsize * len(self.doc_lengths) + len(self.dead)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            postings = sum(len(d) for d, _ in self.postings.values())
+        return {
+            "documents": len(self),
+            "deleted": self.dead_count,
+            "terms": len(self.postings),
+            "postings": postings,
+            "bytes": self.memory_bytes()
+        }
@@ -1,80 +1,247 @@
 # backend/llm_manager.py
 import logging
-from typing import Dict, Any, Optional
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
 # Import both managers
 from model_manager import DistilBERTManager
 from ollama_manager import OllamaManager
+from context_packer import ContextPacker, DISTILBERT_MODEL
+from model_router import ModelRouter
+from sessions import SessionStore
+from config import HedgeConfig, DeadlineConfig, OllamaConfig, RoutingConfig
+from deadline import Deadline
+from cpu_pool import run_cpu
+from metrics import STAGE_SECONDS, QUERIES, FALLBACKS, CACHE_REQUESTS
+from tracing import traced, span, annotate
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Routing source -> fallback reason when DistilBERT is chosen up front
+_ROUTED_FALLBACK_REASONS = {"forced": "forced", "unavailable": "ollama_unavailable", "router": "deadline"}
+
+# Ollama error -> fallback reason
+_ERROR_FALLBACK_REASONS = {
+    "first token deadline exceeded": "first_token_deadline",
+    "timeout": "timeout",
+    "generation queue full": "queue_full",
+    "Ollama not available": "ollama_unavailable"
+}
+
 class SmartLLMManager:
     """Intelligent LLM manager that tries Ollama first, falls back to DistilBERT"""
     
-    def __init__(self, use_ollama: bool = True, ollama_model: str = "mistral"):
+    def __init__(self, use_ollama: bool = True, ollama_model: str = "mistral",
+                 distilbert: Optional[DistilBERTManager] = None,
+                 defer_ollama: bool = False):
+        """`distilbert` may be shared with other components. With `defer_ollama`
+        DistilBERT answers until attach_ollama() is called (background startup)."""
+        # Defaults for new requests; a request never changes them for the others
         self.use_ollama = use_ollama
         self.ollama_model = ollama_model
-        self.llm_choice = "unknown"
+        self._defaults_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
         self.stats = {
             "total_queries": 0,
             "ollama_success": 0,
             "ollama_failures": 0,
-            "fallback_used": 0
+            "fallback_used": 0,
+            "routed_to_distilbert": 0,
+            "routed_to_smaller_model": 0,  # Router picked a model below the configured one
+            "hedged_requests": 0,
+            "hedge_fallback_wins": 0,
+            "cancelled_generations": 0,   # Aborted in flight after the client left
+            "wasted_generations": 0       # Finished for a client that had already left
         }
+        self.router = ModelRouter()
+        self._probe: Optional[asyncio.Future] = None   # Background measurement of an unmeasured model
+        self._hedge_cache = OrderedDict()
+        self.sessions = SessionStore()
         
         # Initialize managers
         logger.info("🤖 Initializing AI managers...")
         
         # Initialize DistilBERT (always available)
-        self.distilbert = DistilBERTManager()
+        self.distilbert = distilbert or DistilBERTManager()
         logger.info("✅ DistilBERT manager initialized")
         
         # Initialize Ollama (might not be available)
         self.ollama = None
-        if self.use_ollama:
+        if self.use_ollama and not defer_ollama:
             try:
-                self.ollama = OllamaManager(model=ollama_model)
-                if self.ollama.available:
-                    logger.info("✅ Ollama manager initialized")
-                    self.llm_choice = "ollama"
-                else:
-                    logger.warning("⚠️ Ollama not available, using DistilBERT")
-                    self.llm_choice = "distilbert"
+                self.attach_ollama(OllamaManager(model_name=ollama_model))
             except Exception as e:
                 logger.error(f"❌ Failed to initialize Ollama: {e}")
-                self.llm_choice = "distilbert"
-        else:
-            self.llm_choice = "distilbert"
         
         logger.info(f"🎯 Primary LLM: {self.llm_choice}")
     
-    def generate_response(self, query: str, context: str = "", 
-                         category: str = "general") -> Dict[str, Any]:
-        """Generate response with intelligent fallback"""
+    def attach_ollama(self, ollama: OllamaManager):
+        """Start using an initialized OllamaManager"""
+        if ollama.available:
+            self.router.update_models(ollama.list_models())
+            ollama.catalog.on_refresh = self.router.update_models
+            logger.info("✅ Ollama manager initialized")
+        else:
+            logger.warning("⚠️ Ollama not available, using DistilBERT")
+        self.ollama = ollama
+    
+    @property
+    def llm_choice(self) -> str:
+        """Default backend for requests that don't force one"""
+        use_ollama, _ = self._get_defaults()
+        return "ollama" if use_ollama and self.ollama and self.ollama.available else "distilbert"
+    
+    def _get_defaults(self) -> Tuple[bool, str]:
+        """Consistent snapshot of the default backend and model"""
+        with self._defaults_lock:
+            return self.use_ollama, self.ollama_model
+    
+    def _count(self, key: str, n: int = 1):
+        """Atomically bump a stats counter"""
+        with self._stats_lock:
+            self.stats[key] += n
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Copy of the stats counters"""
+        with self._stats_lock:
+            return dict(self.stats)
+    
+    def route_query(self, query: str, classification: Optional[Dict[str, Any]] = None,
+                    deadline: Optional[Deadline] = None,
+                    force_backend: Optional[str] = None,
+                    model_name: Optional[str] = None) -> Dict[str, Any]:
+        """Decide up front which backend and model should answer
+        
+        The result is this request's routing context: `force_backend` and
+        `model_name` apply to this request only.
+        """
+        use_ollama, default_model = self._get_defaults()
+        
+        if force_backend == "distilbert":
+            return {"backend": "distilbert", "model": None, "source": "forced", "reason": "forced by request"}
+        if not (self.ollama and self.ollama.available and (use_ollama or force_backend == "ollama")):
+            return {"backend": "distilbert", "model": None, "source": "unavailable",
+                    "reason": "ollama disabled or unavailable"}
+        
+        max_model = default_model
+        if model_name:
+            if self.router.has_model(model_name):
+                max_model = model_name
+            else:
+                logger.warning(f"⚠️ Requested model not installed, using {default_model}: {model_name}")
         
-        self.stats["total_queries"] += 1
+        deadline = deadline or Deadline()
+        decision = self.router.route(
+            query,
+            classification,
+            deadline_s=deadline.remaining_s(),
+            max_model=max_model
+        )
+        backend = "ollama" if decision["model"] else "distilbert"
+        if not decision["model"]:
+            deadline.degrade("route", "distilbert")   # No Ollama model fits what is left of the budget
+        if decision.get("downgraded_from"):
+            self._count("routed_to_smaller_model")
+            logger.info(f"🧭 Routed to {decision['model']} instead of {max_model}: {decision['reason']}")
+        return {"backend": backend, "source": "forced" if force_backend else "router", **decision}
+    
+    @traced("SmartLLMManager.generate_response")
+    async def generate_response(self, query: str, context: str = "", 
+                                category: str = "general",
+                                classification: Optional[Dict[str, Any]] = None,
+                                route: Optional[Dict[str, Any]] = None,
+                                deadline: Optional[Deadline] = None,
+                                session_key: Optional[str] = None) -> Dict[str, Any]:
+        """Generate response with intelligent fallback
+        
+        Ollama is awaited without blocking the event loop and DistilBERT runs on
+        the CPU pool. Cancelling the calling task (the client went away) aborts
+        the Ollama call and skips the fallback. With a `session_key`, Ollama
+        continues from the context tokens of the conversation's previous turn.
+        """
+        
+        self._count("total_queries")
         start_time = datetime.now()
+        deadline = deadline or Deadline()
+        
+        if route is None:
+            route = self.route_query(query, classification, deadline)
+        if route.get("probe_model"):
+            self._start_probe(route["probe_model"], query)
         
-        # Try Ollama first if available and enabled
-        if self.ollama and self.ollama.available and self.use_ollama:
-            logger.info(f"🔄 Trying Ollama for query: {query[:50]}...")
+        if route["backend"] == "distilbert" and route.get("candidates"):
+            self._count("routed_to_distilbert")
+            logger.info(f"🧭 Routed to DistilBERT: {route['reason']}")
+        
+        hedge = {"enabled": HedgeConfig.ENABLED, "winner": None}
+        conversation_info = {"reused_tokens": 0, "turn": 0}
+        fallback_answer = None
+        fallback_reason = _ROUTED_FALLBACK_REASONS.get(route.get("source"), "deadline")
+        
+        # Try Ollama first if routing picked a model
+        if route["backend"] == "ollama":
+            model = route["model"]
+            logger.info(f"🔄 Trying Ollama ({model}) for query: {query[:50]}...")
+            
+            # Shrink the answer and the wait to what is left of the budget; the
+            # router always sets num_predict, but only a cap below the model's
+            # default is a degradation
+            options = None
+            default_tokens = OllamaConfig.get_generation_params(model)["options"]["num_predict"]
+            if route.get("num_predict") and route["num_predict"] < default_tokens:
+                options = {"num_predict": route["num_predict"]}
+                deadline.degrade("generate", f"num_predict={options['num_predict']}")
+            timeout = deadline.remaining_s() + DeadlineConfig.TIMEOUT_GRACE_S
             
             # Custom system prompt based on category
             system_prompt = self._get_system_prompt(category)
+            conversation = self.sessions.get(session_key, model) if session_key else None
+            # Cached answers come from other conversations: a follow-up never uses one
+            cached = None
+            if HedgeConfig.LOSER_POLICY == "cache" and conversation is None:
+                cached = self._hedge_cache.pop(self._hedge_key(model, query, context), None)
+                CACHE_REQUESTS.inc(cache="hedge", result="hit" if cached else "miss")
             
-            ollama_result = self.ollama.generate_response(
-                query=query,
-                context=context,
-                system_prompt=system_prompt
-            )
+            if cached:
+                logger.info("♻️ Using Ollama answer finished after an earlier hedged request")
+                ollama_result = cached
+                hedge["winner"] = "cache"
+            elif HedgeConfig.ENABLED:
+                ollama_result, fallback_answer, hedge = await self._generate_hedged(
+                    query, context, system_prompt, model, options, deadline, conversation
+                )
+            else:
+                ollama_result = await self.ollama.generate(
+                    prompt=query,
+                    context=context,
+                    system_prompt=system_prompt,
+                    model=model,
+                    options=options,
+                    timeout=timeout,
+                    conversation=conversation
+                )
+                self.router.record_result(model, ollama_result, (datetime.now() - start_time).total_seconds())
             
             if ollama_result.get("success", False):
-                self.stats["ollama_success"] += 1
-                self.llm_choice = "ollama"
+                self._count("ollama_success")
                 
                 response_time = (datetime.now() - start_time).total_seconds()
+                STAGE_SECONDS.observe(response_time, stage="generate")
+                QUERIES.inc(backend="ollama")
+                annotate(backend="ollama", model=ollama_result["model"], hedge_winner=hedge.get("winner"))
+                
+                if session_key and ollama_result.get("context"):
+                    self.sessions.update(session_key, model, ollama_result["context"])
+                conversation_info = {
+                    "reused_tokens": len(conversation or []),
+                    "turn": self.sessions.turns(session_key) if session_key else 0
+                }
                 
                 return {
                     "response": ollama_result["response"],
@@ -82,31 +249,189 @@ class SmartLLMManager:
                     "backend": "ollama",
                     "success": True,
                     "response_time": response_time,
-                    "tokens_used": ollama_result.get("tokens", 0),
-                    "fallback_used": False
+                    "tokens_used": ollama_result.get("tokens_used", 0),
+                    "usage": ollama_result.get("usage", {}),
+                    "fallback_used": False,
+                    "routing": route,
+                    "hedge": hedge,
+                    "conversation": conversation_info
                 }
             else:
-                self.stats["ollama_failures"] += 1
+                self._count("ollama_failures")
+                fallback_reason = _ERROR_FALLBACK_REASONS.get(ollama_result.get("error"), "ollama_error")
                 logger.warning("Ollama failed, falling back to DistilBERT")
         
         # Fallback to DistilBERT
-        self.stats["fallback_used"] += 1
+        self._count("fallback_used")
+        FALLBACKS.inc(reason=fallback_reason)
         logger.info(f"🔄 Using DistilBERT fallback for query: {query[:50]}...")
         
-        distilbert_response = self.distilbert.generate_response(query, context)
+        if fallback_answer is not None:
+            distilbert_response = fallback_answer
+        else:
+            with span("DistilBERTManager.generate_response"):
+                distilbert_response = await run_cpu(self.distilbert.generate_response, query, context)
         
         response_time = (datetime.now() - start_time).total_seconds()
+        STAGE_SECONDS.observe(response_time, stage="generate")
+        QUERIES.inc(backend="distilbert")
+        annotate(backend="distilbert", fallback_reason=fallback_reason, hedge_winner=hedge.get("winner"))
         
         return {
             "response": distilbert_response,
-            "model": "distilbert-base-uncased",
+            "model": DISTILBERT_MODEL,
             "backend": "distilbert",
             "success": True,
             "response_time": response_time,
             "tokens_used": 0,
-            "fallback_used": True
+            "fallback_used": True,
+            "routing": route,
+            "hedge": hedge,
+            "conversation": conversation_info
         }
     
+    async def _generate_hedged(self, query: str, context: str, system_prompt: str, model: str,
+                               options: Optional[Dict[str, Any]], deadline: Deadline,
+                               conversation: Optional[List[int]] = None) -> Tuple[Dict[str, Any], Optional[str], Dict[str, Any]]:
+        """Race Ollama against the DistilBERT fallback
+        
+        Returns the Ollama result, the fallback answer (if the fallback won)
+        and a description of the race.
+        """
+        self._count("hedged_requests")
+        start = time.time()
+        first_token = asyncio.Event()
+        hedge = {"enabled": True, "winner": None, "fallback_started": False, "first_token_s": None}
+        
+        # Never wait for a first token past the request deadline
+        first_token_deadline = min(HedgeConfig.FIRST_TOKEN_DEADLINE_S, deadline.remaining_s())
+        
+        ollama_task = asyncio.ensure_future(self.ollama.generate(
+            prompt=query,
+            context=context,
+            system_prompt=system_prompt,
+            model=model,
+            on_first_token=first_token.set,
+            options=options,
+            timeout=deadline.remaining_s() + DeadlineConfig.TIMEOUT_GRACE_S,
+            conversation=conversation
+        ))
+        fallback_task = None
+        
+        try:
+            # Give Ollama a head start before spending CPU on the fallback
+            if not await self._wait_first_token(first_token, ollama_task, min(HedgeConfig.DELAY_S, first_token_deadline)):
+                hedge["fallback_started"] = True
+                fallback_task = asyncio.ensure_future(self._traced_fallback(query, context))
+                remaining = first_token_deadline - (time.time() - start)
+                await self._wait_first_token(first_token, ollama_task, remaining)
+            
+            if first_token.is_set() or ollama_task.done():
+                # Ollama is streaming (or already finished): let it complete
+                result = await ollama_task
+                self.router.record_result(model, result, time.time() - start)
+                hedge["first_token_s"] = result.get("first_token_time")
+            else:
+                logger.info(f"⏱️ No first token from {model} within {first_token_deadline:.1f}s")
+                self.router.record_first_token_timeout(model, time.time() - start)
+                self._abandon_generation(ollama_task, model, query, context, start,
+                                         cacheable=conversation is None)
+                result = {"error": "first token deadline exceeded", "model": model, "success": False}
+            
+            if result.get("success", False):
+                hedge["winner"] = "ollama"
+                return result, None, hedge
+            
+            if fallback_task is None:
+                return result, None, hedge   # Ollama failed before any hedge started
+            self._count("hedge_fallback_wins")
+            hedge["winner"] = "distilbert"
+            return result, await fallback_task, hedge
+        
+        except asyncio.CancelledError:
+            # The request itself was cancelled: stop both sides of the race
+            ollama_task.cancel()
+            if fallback_task:
+                fallback_task.cancel()
+            raise
+    
+    @traced("DistilBERTManager.generate_response (hedge)")
+    async def _traced_fallback(self, query: str, context: str) -> str:
+        return await run_cpu(self.distilbert.generate_response, query, context)
+    
+    @staticmethod
+    async def _wait_first_token(first_token: asyncio.Event, task: asyncio.Future, timeout: float) -> bool:
+        """Wait until the first token arrives, the generation ends or the timeout passes"""
+        if timeout > 0 and not first_token.is_set() and not task.done():
+            waiter = asyncio.ensure_future(first_token.wait())
+            try:
+                await asyncio.wait({waiter, task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+        return first_token.is_set()
+    
+    def _abandon_generation(self, task: asyncio.Future, model: str,
+                            query: str, context: str, start: float, cacheable: bool = True):
+        """Cancel a losing Ollama generation, or keep its answer for next time"""
+        if HedgeConfig.LOSER_POLICY != "cache" or not cacheable:
+            task.cancel()
+            self.router.record_result(model, {"success": False}, time.time() - start)
+            return
+        
+        key = self._hedge_key(model, query, context)
+        
+        def _store(done: asyncio.Future):
+            if done.cancelled() or done.exception():
+                return
+            result = done.result()
+            self.router.record_result(model, result, time.time() - start)
+            if result.get("success", False):
+                self._hedge_cache[key] = result
+                while len(self._hedge_cache) > HedgeConfig.CACHE_SIZE:
+                    self._hedge_cache.popitem(last=False)
+        
+        task.add_done_callback(_store)
+    
+    def _start_probe(self, model: str, query: str):
+        """Measure `model` on this query in the background, one probe at a time
+        
+        Used when exploring a model would risk the request's deadline: the
+        request keeps its routed model and nobody waits for the probe.
+        """
+        if self._probe is not None and not self._probe.done():
+            return
+        logger.info(f"🔬 Probing unmeasured model in the background: {model}")
+        
+        async def probe():
+            start = time.time()
+            result = await self.ollama.generate(
+                prompt=query, model=model, options={"num_predict": RoutingConfig.MIN_NUM_PREDICT}
+            )
+            self.router.record_result(model, result, time.time() - start)
+        
+        self._probe = asyncio.ensure_future(probe())
+    
+    @staticmethod
+    def _hedge_key(model: str, query: str, context: str) -> str:
+        return hashlib.md5(f"{model}\0{query}\0{context}".encode()).hexdigest()
+    
+    def record_client_disconnect(self, cancelled: bool):
+        """Count a generation whose client left: aborted in flight, or finished for nobody"""
+        self._count("cancelled_generations" if cancelled else "wasted_generations")
+    
+    async def aclose(self):
+        """Release network resources held by the managers"""
+        if self.ollama:
+            await self.ollama.aclose()
+    
+    def get_context_packer(self, model: Optional[str] = None) -> ContextPacker:
+        """Get a context packer sized for the routed model (DistilBERT if none)"""
+        return ContextPacker(model or DISTILBERT_MODEL)
+    
+    def get_system_prompt(self, category: str) -> str:
+        """Get the system prompt used for a category"""
+        return self._get_system_prompt(category)
+    
     def _get_system_prompt(self, category: str) -> str:
         """Get category-specific system prompt"""
         
@@ -131,28 +456,29 @@ class SmartLLMManager:
         return prompts.get(category, prompts["general"])
     
     def switch_to_ollama(self, model_name: str = None) -> bool:
-        """Switch to using Ollama"""
+        """Make Ollama the default backend for new requests"""
         if not self.ollama:
             return False
         
         if model_name:
-            success = self.ollama.change_model(model_name)
-            if success:
-                self.ollama_model = model_name
+            # Refreshes the catalogue (and so the router) when the model is not in it yet
+            success = self.ollama.has_model(model_name)
         else:
             success = self.ollama.available
         
         if success:
-            self.use_ollama = True
-            self.llm_choice = "ollama"
+            with self._defaults_lock:
+                self.use_ollama = True
+                if model_name:
+                    self.ollama_model = model_name
             logger.info(f"✅ Switched to Ollama with model: {self.ollama_model}")
         
         return success
     
     def switch_to_distilbert(self):
-        """Switch to using DistilBERT only"""
-        self.use_ollama = False
-        self.llm_choice = "distilbert"
+        """Make DistilBERT the default backend for new requests"""
+        with self._defaults_lock:
+            self.use_ollama = False
         logger.info("✅ Switched to DistilBERT")
     
     def get_status(self) -> Dict[str, Any]:
@@ -160,19 +486,30 @@ class SmartLLMManager:
         ollama_models = []
         if self.ollama:
             ollama_models = self.ollama.list_models()
+        _, default_model = self._get_defaults()
         
         return {
             "current_backend": self.llm_choice,
             "ollama_available": self.ollama.available if self.ollama else False,
-            "ollama_model": self.ollama_model if self.ollama else None,
+            "ollama_model": default_model if self.ollama else None,
             "distilbert_available": True,
-            "stats": self.stats,
-            "available_ollama_models": [m.get("name") for m in ollama_models[:5]]  # First 5
+            "stats": self.get_stats(),
+            "available_ollama_models": [m.get("name") for m in ollama_models[:5]],  # First 5
+            "routing": self.router.get_status(),
+            "generation_queue": self.ollama.queue.get_status() if self.ollama else None,
+            "ollama_hosts": self.ollama.pool.get_status() if self.ollama else None,
+            "model_catalog": self.ollama.catalog.get_status() if self.ollama else None,
+            "conversations": self.sessions.get_status()
         }
     
-    def classify_query(self, query: str) -> Dict[str, Any]:
+    @traced("classify_query")
+    def classify_query(self, query: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
         """Classify query using DistilBERT (always works)"""
-        return self.distilbert.classify_query(query)
+        if deadline and deadline.remaining_ms() < DeadlineConfig.MIN_CLASSIFY_MS:
+            deadline.degrade("classify", "skipped")
+            return {"primary_category": "general", "confidence": 0, "all_categories": {}}
+        with STAGE_SECONDS.time(stage="classify"):
+            return self.distilbert.classify_query(query)
 
 
 # Test the smart manager
@@ -189,7 +526,7 @@ if __name__ == "__main__":
     
     print(f"\n🧪 Testing with query: {test_query}")
     
-    result = llm.generate_response(test_query, test_context, "governance")
+    result = asyncio.run(llm.generate_response(test_query, test_context, "governance"))
     
     print(f"\n✅ Response from {result['backend']}:")
     print(f"   Model: {result['model']}")
@@ -0,0 +1,193 @@
+# backend/metrics.py
+import abc
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Sequence
+from config import MetricsConfig
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    """Render a Prometheus label set: {a="x",b="y"}"""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return "+Inf" if value == math.inf else repr(float(value))
+
+
+class _Metric(abc.ABC):
+    """Base class: a named family of samples keyed by label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        """Exposition lines for every label set"""
+
+
+class Counter(_Metric):
+    """Monotonic count, e.g. fallbacks by reason"""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in values.items()]
+
+
+class Gauge(_Metric):
+    """Point-in-time value, e.g. index size; usually set when /metrics is scraped"""
+
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def replace(self, samples: List[Tuple[Dict[str, str], float]]):
+        """Swap in a fresh set of samples, dropping label sets that disappeared"""
+        values = {self._key(labels): value for labels, value in samples}
+        with self._lock:
+            self._values = values
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in values.items()]
+
+
+class Histogram(_Metric):
+    """Latency distribution with fixed buckets (cumulative on render only)"""
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = MetricsConfig.LATENCY_BUCKETS_S, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], List] = {}   # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        """Record one observation: a bisect and a few additions under a lock"""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = {k: list(v) for k, v in self._values.items()}
+
+        lines = []
+        for key, entry in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), entry):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(entry[-2])}")
+            lines.append(f"{self.name}_count{labels} {entry[-1]}")
+        return lines
+
+
+class Registry:
+    """All metrics of the process, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Pipeline stages: classify, embed, vector_search, lexical_search,
+# hybrid_search, prompt_build, queue_wait, ollama_first_token, generate
+STAGE_SECONDS = Histogram(
+    "jarvis_stage_duration_seconds", "Time spent in each query pipeline stage", ["stage"]
+)
+QUERIES = Counter(
+    "jarvis_queries_total", "Answered queries by backend", ["backend"]
+)
+FALLBACKS = Counter(
+    "jarvis_fallback_total", "Queries answered by DistilBERT instead of Ollama, by reason", ["reason"]
+)
+CACHE_REQUESTS = Counter(
+    "jarvis_cache_requests_total", "Cache lookups by cache and result (hit/miss)", ["cache", "result"]
+)
+QUEUE_DEPTH = Gauge(
+    "jarvis_generation_queue_depth", "Ollama generations holding a slot (active) or waiting for one", ["state"]
+)
+INDEX_DOCUMENTS = Gauge(
+    "jarvis_index_documents", "Documents in the vector index"
+)
+INDEX_BYTES = Gauge(
+    "jarvis_index_bytes", "Heap held by the vector index (rescoring rows are memory-mapped, not counted)"
+)
+OLLAMA_TOKENS = Counter(
+    "jarvis_ollama_tokens_total", "Tokens Ollama evaluated (prompt) and generated (completion), by model", ["model", "kind"]
+)
+MODEL_MEMORY = Gauge(
+    "jarvis_model_memory_bytes", "Memory held by loaded models", ["backend", "model"]
+)
@@ -0,0 +1,108 @@
+# backend/model_catalog.py
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import OllamaConfig
+
+
+class ModelCatalog:
+    """Installed and loaded Ollama models, cached with a TTL
+
+    Readers always get the last catalogue straight away. Once it is older than
+    ttl_s, the first reader starts a refresh on a background thread (one at a
+    time) and keeps the old entries until it finishes, so status endpoints
+    never wait for Ollama. A failed refresh keeps the previous catalogue.
+    """
+
+    def __init__(self, fetch: Callable[[], Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]],
+                 ttl_s: float = OllamaConfig.CATALOG_TTL_S,
+                 on_refresh: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        self.fetch = fetch              # Returns (/api/tags models, /api/ps models)
+        self.ttl_s = ttl_s
+        self.on_refresh = on_refresh    # Called with the installed models after each refresh
+        # Replaced whole, never mutated in place, so readers need no lock
+        self.installed: List[Dict[str, Any]] = []
+        self.loaded: List[Dict[str, Any]] = []
+        self.refreshed_at = 0.0
+        self.attempted_at = 0.0         # Failed refreshes also wait ttl_s before the next try
+        self.refreshes = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def stale(self) -> bool:
+        return time.time() - self.attempted_at > self.ttl_s
+
+    def refresh(self) -> bool:
+        """Re-read the catalogue now (blocking); returns whether it succeeded"""
+        self.attempted_at = time.time()
+        try:
+            tags, ps = self.fetch()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            print(f"⚠️ Cannot refresh Ollama model catalogue: {e}")
+            return False
+
+        loaded = {m.get("name"): m for m in ps}
+        installed = [
+            {
+                **model,
+                "loaded": model.get("name") in loaded,
+                "size_vram": loaded.get(model.get("name"), {}).get("size_vram", 0)
+            }
+            for model in tags if model.get("name")
+        ]
+        with self._lock:
+            self.installed = installed
+            self.loaded = list(ps)
+            self.refreshed_at = time.time()
+            self.refreshes += 1
+            self.last_error = None
+
+        if self.on_refresh:
+            self.on_refresh(installed)
+        return True
+
+    def refresh_in_background(self):
+        """Start a refresh unless one is already running"""
+        with self._lock:
+            # After a fork the parent's thread is not alive here, so a child never waits on it
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self.refresh, name="model-catalog", daemon=True)
+            self._thread.start()
+
+    def _get(self) -> "ModelCatalog":
+        if self.stale:
+            self.refresh_in_background()
+        return self
+
+    def models(self) -> List[Dict[str, Any]]:
+        """Installed models (cached), each with `loaded` and `size_vram`"""
+        return self._get().installed
+
+    def loaded_models(self) -> List[Dict[str, Any]]:
+        """Models loaded in Ollama memory (cached /api/ps entries)"""
+        return self._get().loaded
+
+    def names(self) -> List[str]:
+        return [m["name"] for m in self.models()]
+
+    def has_model(self, model_name: str) -> bool:
+        names = self.names()
+        return model_name in names or f"{model_name}:latest" in names
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "models": len(self.installed),
+            "loaded": [m.get("name") for m in self.loaded],
+            "age_s": round(time.time() - self.refreshed_at, 1) if self.refreshed_at else None,
+            "ttl_s": self.ttl_s,
+            "refreshing": self._thread is not None and self._thread.is_alive(),
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "last_error": self.last_error
+        }
@@ -1,17 +1,21 @@
 # backend/model_manager.py
-import torch
-from transformers import pipeline, AutoTokenizer, AutoModelForQuestionAnswering
-from sentence_transformers import SentenceTransformer
 import logging
+import threading
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class DistilBERTManager:
-    """Manager for DistilBERT models - Lightweight and fast"""
+    """Manager for DistilBERT models - Lightweight and fast
+    
+    torch and transformers are imported here rather than at module level, so
+    importing the API does not pay for them before the server is listening.
+    """
     
     def __init__(self):
         logger.info("Loading DistilBERT models...")
+        from transformers import pipeline
+        from sentence_transformers import SentenceTransformer
         
         # For text embeddings (384-dimensional)
         self.embedder = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
@@ -26,14 +30,10 @@ class DistilBERTManager:
         )
         logger.info("✓ QA model loaded")
         
-        # For text generation (small GPT-2 for demo)
-        self.generator = pipeline(
-            "text-generation",
-            model="distilgpt2",
-            max_length=200,
-            device=-1
-        )
-        logger.info("✓ Text generation model loaded")
+        # Text generation is only used for questions without context: loaded on
+        # first use, or by serve.py before it forks so the workers share it
+        self._generator = None
+        self._generator_lock = threading.Lock()
         
         # Enterprise knowledge patterns
         self.knowledge_patterns = {
@@ -57,6 +57,42 @@ class DistilBERTManager:
         
         logger.info("✓ Model manager initialized successfully")
     
+    @property
+    def generator(self):
+        """Small GPT-2 for text generation (demo), loaded on first use"""
+        if self._generator is None:
+            with self._generator_lock:
+                if self._generator is None:
+                    from transformers import pipeline
+                    self._generator = pipeline(
+                        "text-generation",
+                        model="distilgpt2",
+                        max_length=200,
+                        device=-1
+                    )
+                    self.__dict__.pop("_memory_bytes", None)
+                    logger.info("✓ Text generation model loaded")
+        return self._generator
+    
+    def preload_generator(self):
+        """Load the text generation model now instead of on first use (serve.py, before forking)"""
+        return self.generator
+    
+    def memory_bytes(self) -> dict:
+        """Parameter memory of each loaded model, in bytes"""
+        if not hasattr(self, "_memory_bytes"):
+            models = {
+                "all-MiniLM-L6-v2": self.embedder,
+                "distilbert-base-uncased-distilled-squad": self.qa_model.model
+            }
+            if self._generator is not None:
+                models["distilgpt2"] = self._generator.model
+            self._memory_bytes = {
+                name: sum(p.numel() * p.element_size() for p in model.parameters())
+                for name, model in models.items()
+            }
+        return self._memory_bytes
+    
     def embed_text(self, text: str):
         """Generate embeddings for text"""
         return self.embedder.encode(text)
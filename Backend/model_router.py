@@ -0,0 +1,313 @@
+# backend/model_router.py
+import statistics
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from config import HedgeConfig, OllamaConfig, RoutingConfig
+
+
+def _normalize(model: str) -> str:
+    """Treat "mistral" and "mistral:latest" as the same model"""
+    return model[:-len(":latest")] if model.endswith(":latest") else model
+
+
+class ModelStats:
+    """Rolling latency and throughput statistics for one Ollama model
+
+    Generation (eval) and prompt processing (prompt eval) speeds are tracked
+    separately; `overheads` is what is left of the latency after both (model
+    load, queueing, network). `first_token_seconds` also holds the wait of
+    each hedge that gave up on a first token, a lower bound of the real one.
+    """
+
+    def __init__(self, window: int = RoutingConfig.STATS_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.tokens_per_second = deque(maxlen=window)
+        self.prompt_tokens_per_second = deque(maxlen=window)
+        self.prompt_tokens = deque(maxlen=window)
+        self.load_seconds = deque(maxlen=window)
+        self.overheads = deque(maxlen=window)
+        self.first_token_seconds = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.total_prompt_tokens = 0
+        self.total_completion_tokens = 0
+
+    def record_success(self, latency: float, usage: Optional[Dict[str, Any]] = None,
+                       first_token_s: Optional[float] = None):
+        """Record a completed generation with its token usage (see ollama_manager.token_usage)"""
+        self.requests += 1
+        self.outcomes.append(True)
+        self.latencies.append(latency)
+        if first_token_s is not None:
+            self.first_token_seconds.append(first_token_s)
+        if not usage:
+            return
+
+        self.total_prompt_tokens += usage["prompt_tokens"]
+        self.total_completion_tokens += usage["completion_tokens"]
+        self.load_seconds.append(usage["load_s"])
+        self.prompt_tokens.append(usage["prompt_tokens"])
+        if usage["prompt_tokens"] and usage["prompt_eval_s"] > 0:
+            self.prompt_tokens_per_second.append(usage["prompt_tokens"] / usage["prompt_eval_s"])
+
+        if usage["completion_tokens"] and usage["eval_s"] > 0:
+            self.tokens_per_second.append(usage["completion_tokens"] / usage["eval_s"])
+            self.overheads.append(max(latency - usage["eval_s"] - usage["prompt_eval_s"], 0.0))
+
+    def record_failure(self):
+        """Record a failed or timed out generation"""
+        self.requests += 1
+        self.failures += 1
+        self.outcomes.append(False)
+
+    def record_first_token_timeout(self, waited_s: float):
+        """Record a hedge that stopped waiting for the first token after `waited_s`"""
+        self.first_token_seconds.append(waited_s)
+
+    @property
+    def measured(self) -> bool:
+        """Whether anything about this model has been observed yet"""
+        return bool(self.outcomes or self.first_token_seconds)
+
+    @property
+    def first_token_s(self) -> Optional[float]:
+        return statistics.median(self.first_token_seconds) if self.first_token_seconds else None
+
+    @property
+    def failure_rate(self) -> float:
+        if len(self.outcomes) < RoutingConfig.MIN_SAMPLES:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def _overhead(self, prior: Dict[str, float], prompt_tokens: Optional[int]) -> float:
+        """Seconds before generation starts: load/queue/network plus prompt processing
+
+        Never less than the typical measured wait for the first token.
+        """
+        if not self.overheads:
+            overhead = prior["overhead_s"]   # The prior already includes prompt processing
+        else:
+            overhead = statistics.median(self.overheads)
+            if self.prompt_tokens_per_second:
+                if prompt_tokens is None:
+                    prompt_tokens = statistics.median(self.prompt_tokens)
+                overhead += prompt_tokens / statistics.median(self.prompt_tokens_per_second)
+        first_token_s = self.first_token_s
+        return max(overhead, first_token_s) if first_token_s is not None else overhead
+
+    def predict_latency(self, tokens: int, prior: Dict[str, float], prompt_tokens: Optional[int] = None) -> float:
+        """Predict seconds to generate `tokens` tokens (after a prompt of `prompt_tokens`, typical if None)"""
+        tps = statistics.median(self.tokens_per_second) if self.tokens_per_second else prior["tokens_per_second"]
+        return self._overhead(prior, prompt_tokens) + tokens / max(tps, 0.1)
+
+    def affordable_tokens(self, seconds: float, prior: Dict[str, float], prompt_tokens: Optional[int] = None) -> int:
+        """How many tokens can be generated within `seconds`"""
+        tps = statistics.median(self.tokens_per_second) if self.tokens_per_second else prior["tokens_per_second"]
+        return max(int((seconds - self._overhead(prior, prompt_tokens)) * tps), 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "failure_rate": round(self.failure_rate, 3),
+            "p50_latency_s": round(statistics.median(self.latencies), 3) if self.latencies else None,
+            "tokens_per_second": round(statistics.median(self.tokens_per_second), 2) if self.tokens_per_second else None,
+            "prompt_tokens_per_second": (round(statistics.median(self.prompt_tokens_per_second), 2)
+                                         if self.prompt_tokens_per_second else None),
+            "p50_load_s": round(statistics.median(self.load_seconds), 3) if self.load_seconds else None,
+            "p50_overhead_s": round(statistics.median(self.overheads), 3) if self.overheads else None,
+            "p50_first_token_s": round(self.first_token_s, 3) if self.first_token_seconds else None,
+            "total_prompt_tokens": self.total_prompt_tokens,
+            "total_completion_tokens": self.total_completion_tokens,
+            "samples": len(self.latencies)
+        }
+
+
+class ModelRouter:
+    """Routes each request to the largest Ollama model expected to meet its deadline"""
+
+    def __init__(self):
+        self.model_sizes: Dict[str, int] = {}    # model name -> size in bytes
+        self.stats: Dict[str, ModelStats] = {}
+        self.decisions = deque(maxlen=RoutingConfig.DECISION_LOG_SIZE)
+        self.total_decisions = 0
+        self._lock = threading.Lock()   # Status is read from worker threads
+
+    def update_models(self, models: List[Dict[str, Any]]):
+        """Refresh the installed model list (entries from Ollama /api/tags)"""
+        # Replaced whole, never mutated in place, so readers need no lock
+        self.model_sizes = {
+            _normalize(m["name"]): m.get("size") or self._prior_size(m["name"])
+            for m in models if m.get("name")
+        }
+
+    def has_model(self, model: str) -> bool:
+        """Whether the model is in the installed catalogue"""
+        return _normalize(model) in self.model_sizes
+
+    @staticmethod
+    def _prior_size(model: str) -> int:
+        return int(RoutingConfig.get_prior(model)["size_gb"] * 1024 ** 3)
+
+    def _get_stats(self, model: str) -> ModelStats:
+        model = _normalize(model)
+        if model not in self.stats:
+            self.stats[model] = ModelStats()
+        return self.stats[model]
+
+    def estimate_complexity(self, query: str, classification: Optional[Dict[str, Any]] = None) -> float:
+        """Score query complexity between 0 (trivial) and 1 (complex)"""
+        query_lower = query.lower()
+
+        length_score = min(len(query.split()) / RoutingConfig.COMPLEX_QUERY_WORDS, 1.0)
+        reasoning_score = 1.0 if any(k in query_lower for k in RoutingConfig.REASONING_KEYWORDS) else 0.0
+
+        matched = 0
+        if classification:
+            matched = sum(1 for score in classification.get("all_categories", {}).values() if score)
+        multi_topic_score = min(max(matched - 1, 0) / 2, 1.0)
+
+        return round(0.5 * length_score + 0.25 * reasoning_score + 0.25 * multi_topic_score, 3)
+
+    def expected_tokens(self, model: str, complexity: float, confidence: float) -> int:
+        """Expected output tokens: longer for complex or ambiguous queries"""
+        num_predict = OllamaConfig.get_generation_params(model)["options"]["num_predict"]
+        share = RoutingConfig.MIN_OUTPUT_SHARE + 0.5 * complexity + 0.2 * (1 - confidence)
+        return int(num_predict * min(share, 1.0))
+
+    def route(self, query: str, classification: Optional[Dict[str, Any]],
+              deadline_s: float, max_model: str) -> Dict[str, Any]:
+        """Pick the largest model no larger than `max_model` that fits the deadline"""
+        with self._lock:
+            self.total_decisions += 1
+            return self._route(query, classification, deadline_s, max_model)
+
+    def _route(self, query: str, classification: Optional[Dict[str, Any]],
+               deadline_s: float, max_model: str) -> Dict[str, Any]:
+        model_sizes = self.model_sizes
+        complexity = self.estimate_complexity(query, classification)
+        confidence = (classification or {}).get("confidence", 0) or 0
+
+        decision = {
+            "timestamp": datetime.now().isoformat(),
+            "deadline_s": round(deadline_s, 3),
+            "complexity": complexity,
+            "confidence": round(confidence, 3),
+            "model": None,
+            "reason": "",
+            "candidates": []
+        }
+
+        if not model_sizes:
+            decision["model"] = max_model
+            decision["reason"] = "no model catalogue, using configured model"
+            decision["num_predict"] = self._num_predict(max_model, deadline_s)
+            self.decisions.append(decision)
+            return decision
+
+        ceiling = model_sizes.get(_normalize(max_model), self._prior_size(max_model))
+        candidates = sorted(
+            (name for name, size in model_sizes.items() if size <= ceiling),
+            key=lambda name: model_sizes[name],
+            reverse=True
+        )
+
+        for model in candidates:
+            stats = self._get_stats(model)
+            tokens = self.expected_tokens(model, complexity, confidence)
+            predicted = stats.predict_latency(tokens, RoutingConfig.get_prior(model))
+            fits = predicted * RoutingConfig.SAFETY_FACTOR <= deadline_s
+            # A hedge would give up on a model this slow to start anyway
+            slow_start = (HedgeConfig.ENABLED and stats.first_token_s is not None
+                          and stats.first_token_s >= HedgeConfig.FIRST_TOKEN_DEADLINE_S)
+            healthy = stats.failure_rate <= RoutingConfig.MAX_FAILURE_RATE and not slow_start
+            # A capped answer (MIN_NUM_PREDICT tokens; _num_predict caps to the deadline)
+            capped_fits = (stats.predict_latency(RoutingConfig.MIN_NUM_PREDICT, RoutingConfig.get_prior(model))
+                           * RoutingConfig.SAFETY_FACTOR <= deadline_s)
+            # Only measurements may move a request off the configured model:
+            # until then it is kept whenever a capped answer fits
+            trusted = model == _normalize(max_model) and not stats.measured and capped_fits
+
+            decision["candidates"].append({
+                "model": model,
+                "predicted_latency_s": round(predicted, 3),
+                "expected_tokens": tokens,
+                "healthy": healthy,
+                "slow_start": slow_start,
+                "capped_fits": capped_fits
+            })
+
+            if (fits or trusted) and healthy:
+                decision["model"] = model
+                decision["predicted_latency_s"] = round(predicted, 3)
+                decision["reason"] = ("largest model within deadline" if fits
+                                      else "configured model, not measured yet")
+                break
+        else:
+            decision["reason"] = "no Ollama model fits the deadline, using DistilBERT"
+
+        # Priors are only a guess: periodically measure a larger model that has
+        # never completed, including one whose first token was too slow before.
+        # It answers this request only if it is healthy and a capped answer
+        # fits the deadline; otherwise the caller probes it in the background
+        # (`probe_model`) and the request keeps its model
+        if self.total_decisions % RoutingConfig.EXPLORE_EVERY == 0:
+            for candidate in decision["candidates"]:
+                if candidate["model"] == decision["model"]:
+                    break
+                if ((candidate["healthy"] or candidate["slow_start"])
+                        and not self._get_stats(candidate["model"]).tokens_per_second):
+                    if candidate["healthy"] and candidate["capped_fits"]:
+                        decision["model"] = candidate["model"]
+                        decision["predicted_latency_s"] = candidate["predicted_latency_s"]
+                        decision["reason"] = "exploring unmeasured model"
+                    else:
+                        decision["probe_model"] = candidate["model"]
+                    break
+
+        if decision["model"]:
+            decision["num_predict"] = self._num_predict(decision["model"], deadline_s)
+            if decision["model"] != _normalize(max_model):
+                decision["downgraded_from"] = max_model
+
+        self.decisions.append(decision)
+        return decision
+
+    def _num_predict(self, model: str, deadline_s: float) -> int:
+        """Cap generated tokens so the answer finishes within the deadline"""
+        default = OllamaConfig.get_generation_params(model)["options"]["num_predict"]
+        affordable = self._get_stats(model).affordable_tokens(
+            deadline_s / RoutingConfig.SAFETY_FACTOR, RoutingConfig.get_prior(model)
+        )
+        return min(default, max(affordable, RoutingConfig.MIN_NUM_PREDICT))
+
+    def record_result(self, model: str, result: Dict[str, Any], latency: float):
+        """Feed a generation outcome back into the model's statistics"""
+        if result.get("cancelled"):
+            return  # Says nothing about the model's speed
+
+        with self._lock:
+            stats = self._get_stats(model)
+
+            if not result.get("success") or result.get("fallback_used"):
+                stats.record_failure()
+                return
+
+            stats.record_success(latency, result.get("usage"), result.get("first_token_time"))
+
+    def record_first_token_timeout(self, model: str, waited_s: float):
+        """A hedge gave up waiting for the model's first token"""
+        with self._lock:
+            self._get_stats(model).record_first_token_timeout(waited_s)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Routing state for /llm/status"""
+        with self._lock:
+            return {
+                # Read without creating entries for models that never ran
+                "models": {name: self.stats.get(name, ModelStats()).to_dict() for name in self.model_sizes},
+                "recent_decisions": list(self.decisions)[-5:]
+            }
@@ -1,137 +1,276 @@
 # backend/ollama_manager.py (updated)
-import requests
+import asyncio
+import httpx
 import json
 import time
-from typing import Optional, Dict, Any
-from config import OllamaConfig
+from typing import Optional, Dict, Any, List, Callable
+from config import OllamaConfig, PoolConfig
+from generation_queue import GenerationQueue
+from ollama_pool import OllamaPool, OllamaEndpoint
+from model_catalog import ModelCatalog
+from metrics import STAGE_SECONDS, OLLAMA_TOKENS
+from tracing import traced, span, annotate
+
+def token_usage(final: Dict[str, Any], model: str) -> Dict[str, Any]:
+    """Token counts and timings from Ollama's final response (durations are in ns)"""
+    usage = {
+        "prompt_tokens": final.get("prompt_eval_count", 0) or 0,
+        "completion_tokens": final.get("eval_count", 0) or 0,
+        "load_s": (final.get("load_duration", 0) or 0) / 1e9,
+        "prompt_eval_s": (final.get("prompt_eval_duration", 0) or 0) / 1e9,
+        "eval_s": (final.get("eval_duration", 0) or 0) / 1e9,
+        "total_s": (final.get("total_duration", 0) or 0) / 1e9
+    }
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    OLLAMA_TOKENS.inc(usage["prompt_tokens"], model=model, kind="prompt")
+    OLLAMA_TOKENS.inc(usage["completion_tokens"], model=model, kind="completion")
+    return usage
+
 
 class OllamaManager:
     """Improved Ollama manager with better error handling"""
     
     def __init__(self, model_name: Optional[str] = None):
-        self.base_url = OllamaConfig.BASE_URL
+        # One or more Ollama hosts; generations go to the least loaded healthy one
+        self.pool = OllamaPool(OllamaConfig.get_base_urls())
+        self.base_url = self.pool.endpoints[0].base_url
+        
+        # Installed and loaded models, cached so status requests never wait for Ollama
+        self.catalog = ModelCatalog(self._fetch_catalog)
+        
+        # Generation slots shared by every request using this manager
+        self.queue = GenerationQueue(OllamaConfig.MAX_CONCURRENT_GENERATIONS * len(self.pool.endpoints))
+        
+        self.is_available = self._check_availability()
         
         # Auto-select best model if not specified
         if model_name:
             self.model = model_name
         else:
-            self.model = OllamaConfig.get_best_available_model() or "llama2:7b"
-        
-        self.is_available = self._check_availability()
+            self.model = OllamaConfig.get_best_available_model(self.catalog.names()) or "llama2:7b"
+        if self.is_available:
+            print(f"✅ Ollama available with model: {self.model}")
+    
+    @property
+    def available(self) -> bool:
+        """Reachable at startup and at least one host not ejected"""
+        return self.is_available and self.pool.available
         
     def _check_availability(self) -> bool:
         """Check if Ollama is available with retries"""
         for attempt in range(3):
-            try:
-                response = requests.get(
-                    f"{self.base_url}/api/tags",
-                    timeout=OllamaConfig.TIMEOUT_CONNECT
-                )
-                
-                if response.status_code == 200:
-                    print(f"✅ Ollama available with model: {self.model}")
-                    return True
-                    
-                time.sleep(1)  # Wait before retry
-                
-            except Exception as e:
-                print(f"⚠️ Ollama check attempt {attempt + 1} failed: {e}")
-                time.sleep(2)
+            reachable = self.pool.refresh()
+            if reachable:
+                print(f"✅ Ollama reachable on {reachable}/{len(self.pool.endpoints)} hosts")
+                self.catalog.refresh()
+                return True
+            
+            print(f"⚠️ Ollama check attempt {attempt + 1} failed")
+            time.sleep(2)
         
         print("❌ Ollama not available after retries")
         return False
     
-    def generate(self, prompt: str, context: str = "", system_prompt: str = None) -> Dict[str, Any]:
-        """Generate response with improved error handling"""
+    def _fetch_catalog(self):
+        """Installed (/api/tags) and loaded (/api/ps) models across all live hosts (and per host, in the pool)"""
+        if not self.pool.available:
+            raise RuntimeError("no Ollama host available")
+        return self.pool.fetch_all("/api/tags"), self.pool.fetch_all("/api/ps")
+    
+    def list_models(self) -> List[Dict[str, Any]]:
+        """List models installed in Ollama (from the cached catalogue)"""
+        return self.catalog.models()
+    
+    def list_loaded_models(self) -> List[Dict[str, Any]]:
+        """Models currently loaded in Ollama memory (from the cached catalogue)"""
+        return self.catalog.loaded_models()
+    
+    def has_model(self, model_name: str) -> bool:
+        """Whether a model is installed; re-reads the catalogue once before saying no"""
+        return self.catalog.has_model(model_name) or (self.catalog.refresh() and self.catalog.has_model(model_name))
+    
+    def change_model(self, model_name: str) -> bool:
+        """Switch the default model if it is installed"""
+        if self.has_model(model_name):
+            self.model = model_name
+            print(f"✅ Ollama model changed to: {model_name}")
+            return True
+        
+        print(f"❌ Model not installed in Ollama: {model_name}")
+        return False
+    
+    async def aclose(self):
+        """Close the async HTTP clients"""
+        await self.pool.aclose()
+    
+    @traced("OllamaManager.generate")
+    async def generate(self, prompt: str, context: str = "", system_prompt: str = None,
+                       model: Optional[str] = None,
+                       on_first_token: Optional[Callable[[], None]] = None,
+                       options: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None,
+                       conversation: Optional[List[int]] = None) -> Dict[str, Any]:
+        """Generate response with improved error handling
+        
+        The generation is streamed so `on_first_token` fires as soon as Ollama
+        starts answering. Cancelling the calling task closes the stream, which
+        stops Ollama and frees the generation slot. `options` override the
+        model's generation options and `timeout` bounds the whole call when
+        the caller has a deadline. `conversation` is the `context` Ollama
+        returned for the previous turn: only the new turn is sent and evaluated.
+        """
         if not self.is_available:
-            return {"error": "Ollama not available"}
+            return {"error": "Ollama not available", "success": False}
+        
+        model = model or self.model
         
-        # Build the full prompt
-        full_prompt = self._build_prompt(prompt, context, system_prompt)
+        # Build the full prompt (a follow-up only needs the new turn)
+        if conversation:
+            full_prompt = self._build_followup_prompt(prompt, context)
+        else:
+            full_prompt = self._build_prompt(prompt, context, system_prompt)
         
         # Get generation parameters
-        params = OllamaConfig.get_generation_params(self.model)
+        params = OllamaConfig.get_generation_params(model)
         params["prompt"] = full_prompt
+        params["stream"] = True
+        if conversation:
+            params["context"] = conversation
+        if options:
+            params["options"].update(options)
+        budget = timeout if timeout is not None else OllamaConfig.TIMEOUT_READ
+        
+        annotate(model=model)
+        start_time = time.time()
+        with span("generation_queue.acquire"):
+            acquired = await self.queue.acquire(budget)
+        STAGE_SECONDS.observe(time.time() - start_time, stage="queue_wait")
+        if not acquired:
+            return {"error": "generation queue full", "model": model, "success": False}
         
         try:
-            start_time = time.time()
-            
-            # First try normal generation
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json=params,
-                timeout=OllamaConfig.TIMEOUT_READ
+            remaining = budget - (time.time() - start_time)
+            return await asyncio.wait_for(
+                self._generate_on_pool(params, model, on_first_token),
+                timeout=max(remaining, 0.001)
             )
+        
+        except asyncio.TimeoutError:
+            print(f"⏰ Ollama generation timeout with {model}")
             
-            elapsed = time.time() - start_time
-            
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    "response": result.get("response", "").strip(),
-                    "model": self.model,
-                    "response_time": elapsed,
-                    "tokens_used": result.get("total_duration", 0),
-                    "success": True
-                }
-            else:
-                print(f"❌ Ollama generation failed: {response.status_code}")
-                
-                # Try streaming as fallback
-                return self._try_streaming_generation(full_prompt)
-                
-        except requests.exceptions.Timeout:
-            print(f"⏰ Ollama generation timeout with {self.model}")
-            
-            # Switch to a smaller model if available
-            return self._try_smaller_model(full_prompt)
-            
+            # The caller's deadline is spent; a retry would only overrun it
+            if timeout is not None:
+                return {"error": "timeout", "model": model, "success": False}
+        
         except Exception as e:
             print(f"❌ Ollama generation error: {e}")
             return {"error": str(e), "success": False}
+        
+        finally:
+            self.queue.release()
+        
+        # Switch to a smaller model if available (slot already released). It
+        # gets no conversation tokens, so it needs the full prompt
+        return await self._try_smaller_model(self._build_prompt(prompt, context, system_prompt), model)
     
-    def _try_streaming_generation(self, prompt: str) -> Dict[str, Any]:
-        """Try streaming generation (more responsive)"""
-        try:
-            params = OllamaConfig.get_generation_params(self.model)
-            params["prompt"] = prompt
-            params["stream"] = True
+    async def _generate_on_pool(self, params: Dict[str, Any], model: str,
+                                on_first_token: Optional[Callable[[], None]]) -> Dict[str, Any]:
+        """Generate on the best host, retrying on another one if that host fails"""
+        tried = set()
+        result = {"error": "Ollama not available", "model": model, "success": False}
+        # The catalogue refresh also updates each host's installed and loaded
+        # models, which host choice relies on: keep it going without status reads
+        if self.catalog.stale:
+            self.catalog.refresh_in_background()
+        
+        for _ in range(min(PoolConfig.MAX_ATTEMPTS, len(self.pool.endpoints))):
+            endpoint = self.pool.acquire(model, exclude=tried)
+            if endpoint is None:
+                break
+            tried.add(endpoint.base_url)
+            annotate(ollama_host=endpoint.base_url)
             
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json=params,
-                stream=True,
-                timeout=OllamaConfig.TIMEOUT_READ
-            )
+            host_ok = None   # True / False (host failure) / None (says nothing about the host)
+            start_time = time.time()
+            try:
+                result = await self._stream_generate(endpoint, params, model, on_first_token)
+                host_ok = True if result["success"] else (False if result.get("host_error") else None)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as e:
+                print(f"❌ Ollama host {endpoint.base_url} failed: {e}")
+                host_ok = False
+                result = {"error": str(e), "model": model, "success": False}
+            finally:
+                self.pool.release(endpoint, model, host_ok, time.time() - start_time)
+            
+            if host_ok is not False:
+                return result
+        
+        return result
+    
+    async def _stream_generate(self, endpoint: OllamaEndpoint, params: Dict[str, Any], model: str,
+                               on_first_token: Optional[Callable[[], None]]) -> Dict[str, Any]:
+        """Stream one generation from an Ollama host and collect the answer"""
+        start_time = time.time()
+        first_token_time = None
+        chunks = []
+        final = {}
+        
+        async with endpoint.get_client().stream("POST", "/api/generate", json=params) as response:
+            if response.status_code != 200:
+                print(f"❌ Ollama generation failed: {response.status_code}")
+                return {"error": f"Ollama returned {response.status_code}", "model": model,
+                        "success": False, "host_error": response.status_code >= 500}
             
-            if response.status_code == 200:
-                full_response = ""
-                for line in response.iter_lines():
-                    if line:
-                        try:
-                            data = json.loads(line)
-                            full_response += data.get("response", "")
-                        except:
-                            continue
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    continue
                 
-                return {
-                    "response": full_response.strip(),
-                    "model": f"{self.model} (stream)",
-                    "response_time": 0,
-                    "success": True
-                }
+                token = data.get("response", "")
+                if token and first_token_time is None:
+                    first_token_time = time.time() - start_time
+                    STAGE_SECONDS.observe(first_token_time, stage="ollama_first_token")
+                    annotate(first_token_ms=round(first_token_time * 1000, 1))
+                    if on_first_token:
+                        on_first_token()
+                chunks.append(token)
                 
-        except Exception as e:
-            print(f"❌ Streaming also failed: {e}")
-            
-        return {"error": "Generation failed", "success": False}
+                if data.get("done"):
+                    final = data
+                    break
+        
+        if not final:
+            print(f"❌ Ollama stream from {endpoint.base_url} ended before completion")
+            return {"error": "stream ended early", "model": model, "success": False, "host_error": True}
+        
+        # Ollama's own breakdown: model load vs prompt processing vs generation
+        annotate(**{
+            f"ollama_{key}_ms": round(final[key] / 1e6, 1)
+            for key in ("load_duration", "prompt_eval_duration", "eval_duration")
+            if key in final
+        }, prompt_eval_count=final.get("prompt_eval_count"), conversation_tokens=len(params.get("context", [])))
+        
+        usage = token_usage(final, model)
+        return {
+            "response": "".join(chunks).strip(),
+            "model": model,
+            "response_time": time.time() - start_time,
+            "first_token_time": first_token_time,
+            "tokens_used": usage["total_tokens"],
+            "usage": usage,
+            "context": final.get("context"),   # Conversation state for the next turn
+            "success": True
+        }
     
-    def _try_smaller_model(self, prompt: str) -> Dict[str, Any]:
+    async def _try_smaller_model(self, prompt: str, failed_model: str) -> Dict[str, Any]:
         """Try a smaller model"""
         smaller_models = ["tinyllama", "phi", "llama2:7b"]
         
         for model in smaller_models:
-            if model == self.model:
+            if model == failed_model:
                 continue
                 
             print(f"🔄 Trying smaller model: {model}")
@@ -141,28 +280,56 @@ class OllamaManager:
                 params["prompt"] = prompt
                 params["options"]["num_predict"] = 128  # Very short
                 
-                response = requests.post(
-                    f"{self.base_url}/api/generate",
-                    json=params,
-                    timeout=30  # Short timeout for small model
-                )
+                start_time = time.time()
+                if not await self.queue.acquire(30):
+                    continue
+                endpoint = self.pool.acquire(model)
+                if endpoint is None:
+                    self.queue.release()
+                    break
+                host_ok = None
+                try:
+                    response = await endpoint.get_client().post(
+                        "/api/generate",
+                        json=params,
+                        timeout=30  # Short timeout for small model
+                    )
+                    host_ok = response.status_code < 500
+                finally:
+                    self.pool.release(endpoint, model, host_ok)
+                    self.queue.release()
                 
                 if response.status_code == 200:
                     result = response.json()
+                    usage = token_usage(result, model)
                     return {
                         "response": result.get("response", "").strip(),
                         "model": f"{model} (fallback)",
-                        "response_time": 0,
-                        "tokens_used": 0,
+                        "response_time": time.time() - start_time,
+                        "tokens_used": usage["total_tokens"],
+                        "usage": usage,
                         "fallback_used": True,
                         "success": True
                     }
                     
-            except:
+            except Exception:
                 continue
         
         return {"error": "All models failed", "success": False}
     
+    def _build_followup_prompt(self, prompt: str, context: str) -> str:
+        """Prompt for a follow-up turn; the system prompt is already in the conversation"""
+        if context:
+            return f"""Additional context information:
+{context}
+
+Question: {prompt}
+
+Answer:"""
+        return f"""Question: {prompt}
+
+Answer:"""
+    
     def _build_prompt(self, prompt: str, context: str, system_prompt: str = None) -> str:
         """Build a well-formatted prompt"""
         if not system_prompt:
@@ -0,0 +1,228 @@
+# backend/ollama_pool.py
+import threading
+import time
+import requests
+import httpx
+from typing import Dict, Any, List, Optional, Set
+from config import OllamaConfig, PoolConfig
+
+
+def _normalize(model: str) -> str:
+    """Treat "mistral" and "mistral:latest" as the same model"""
+    return model[:-len(":latest")] if model.endswith(":latest") else model
+
+
+# Endpoint set each listing refreshes
+_MODEL_SETS = {"/api/tags": "installed", "/api/ps": "loaded"}
+
+
+class OllamaEndpoint:
+    """One Ollama host: its HTTP client, load, latency and health"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.outstanding = 0                  # Generations in flight on this host
+        self.latency_s: Optional[float] = None  # EWMA of seconds per generation
+        self.installed: Set[str] = set()      # From /api/tags, re-read with the model catalog
+        self.loaded: Set[str] = set()         # From /api/ps (likewise) and recent generations
+        self.consecutive_failures = 0
+        self.ejections = 0                    # Consecutive ejections, for backoff
+        self.ejected_until = 0.0
+        self.trial_in_flight = False          # Half-open: one request decides readmission
+        self.requests = 0
+        self.failures = 0
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def ejected(self) -> bool:
+        return time.time() < self.ejected_until
+
+    @property
+    def half_open(self) -> bool:
+        """Ejection period over, waiting for a successful request to readmit"""
+        return self.ejections > 0 and not self.ejected
+
+    def get_client(self) -> httpx.AsyncClient:
+        """Async HTTP client for this host (created lazily inside the event loop)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(
+                    OllamaConfig.TIMEOUT_READ,
+                    connect=OllamaConfig.TIMEOUT_CONNECT,
+                    write=OllamaConfig.TIMEOUT_WRITE
+                ),
+                limits=httpx.Limits(max_connections=OllamaConfig.MAX_CONCURRENT_GENERATIONS * 2)
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.base_url,
+            "state": "ejected" if self.ejected else ("half_open" if self.half_open else "healthy"),
+            "outstanding": self.outstanding,
+            "latency_s": round(self.latency_s, 3) if self.latency_s is not None else None,
+            "installed_models": sorted(self.installed),
+            "loaded_models": sorted(self.loaded),
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected_for_s": round(max(self.ejected_until - time.time(), 0), 1)
+        }
+
+
+class OllamaPool:
+    """Balances generations across Ollama hosts
+
+    Picks the host with the fewest outstanding requests (or lowest expected
+    latency), preferring hosts that have the model installed and loaded.
+    Hosts that keep failing are ejected with exponential backoff; once the
+    ejection expires a single trial request decides whether they come back.
+    """
+
+    def __init__(self, base_urls: List[str], strategy: str = PoolConfig.STRATEGY):
+        self.endpoints = [OllamaEndpoint(url) for url in base_urls]
+        self.strategy = strategy
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        """At least one host is healthy or due for a readmission trial"""
+        return any(not e.ejected for e in self.endpoints)
+
+    def acquire(self, model: str, exclude: Optional[Set[str]] = None) -> Optional[OllamaEndpoint]:
+        """Pick a host for `model` (skipping `exclude` urls) and count the request against it"""
+        model = _normalize(model)
+        exclude = exclude or set()
+        with self._lock:
+            candidates = [
+                e for e in self.endpoints
+                if e.base_url not in exclude and not e.ejected and not (e.half_open and e.trial_in_flight)
+            ]
+            if not candidates:
+                return None
+
+            # Model awareness: only hosts known to have the model, if any are known
+            with_model = [e for e in candidates if model in e.installed]
+            if with_model:
+                candidates = with_model
+
+            endpoint = min(candidates, key=lambda e: self._score(e, model))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            if endpoint.half_open:
+                endpoint.trial_in_flight = True
+            return endpoint
+
+    def _score(self, endpoint: OllamaEndpoint, model: str):
+        cold = model not in endpoint.loaded
+        if self.strategy == "latency":
+            latency = endpoint.latency_s if endpoint.latency_s is not None else PoolConfig.DEFAULT_LATENCY_S
+            return ((endpoint.outstanding + 1) * latency + (PoolConfig.MODEL_LOAD_PENALTY_S if cold else 0),)
+        return (endpoint.outstanding, cold, endpoint.latency_s or 0)
+
+    def release(self, endpoint: OllamaEndpoint, model: str, success: Optional[bool],
+                latency: Optional[float] = None):
+        """Record the outcome: True, False (host failure) or None (cancelled, says nothing)"""
+        with self._lock:
+            endpoint.outstanding -= 1
+            was_trial = endpoint.trial_in_flight
+            endpoint.trial_in_flight = False
+
+            if success is None:
+                return
+
+            if success:
+                endpoint.consecutive_failures = 0
+                endpoint.ejections = 0
+                endpoint.loaded.add(_normalize(model))
+                if latency is not None:
+                    alpha = PoolConfig.LATENCY_EWMA_ALPHA
+                    endpoint.latency_s = latency if endpoint.latency_s is None else (
+                        alpha * latency + (1 - alpha) * endpoint.latency_s
+                    )
+                if was_trial:
+                    print(f"✅ Ollama host readmitted: {endpoint.base_url}")
+                return
+
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if was_trial or endpoint.consecutive_failures >= PoolConfig.EJECT_AFTER_FAILURES:
+                self._eject(endpoint)
+
+    def _eject(self, endpoint: OllamaEndpoint):
+        endpoint.ejections += 1
+        seconds = min(PoolConfig.EJECT_S * 2 ** (endpoint.ejections - 1), PoolConfig.MAX_EJECT_S)
+        endpoint.ejected_until = time.time() + seconds
+        endpoint.consecutive_failures = 0
+        print(f"⛔ Ollama host ejected for {seconds:.0f}s: {endpoint.base_url}")
+
+    def refresh(self) -> int:
+        """Re-read installed and loaded models from every host; returns hosts reachable"""
+        reachable = 0
+        for endpoint in self.endpoints:
+            try:
+                tags = requests.get(f"{endpoint.base_url}/api/tags", timeout=OllamaConfig.TIMEOUT_CONNECT)
+                if tags.status_code != 200:
+                    continue
+                installed = {_normalize(m["name"]) for m in tags.json().get("models", []) if m.get("name")}
+
+                loaded = set()
+                ps = requests.get(f"{endpoint.base_url}/api/ps", timeout=OllamaConfig.TIMEOUT_CONNECT)
+                if ps.status_code == 200:
+                    loaded = {_normalize(m["name"]) for m in ps.json().get("models", []) if m.get("name")}
+
+                with self._lock:
+                    endpoint.installed = installed
+                    endpoint.loaded = loaded
+                    if endpoint.ejections:
+                        # Answered a health check: readmit without waiting for traffic
+                        endpoint.ejections = 0
+                        endpoint.ejected_until = 0.0
+                        print(f"✅ Ollama host readmitted: {endpoint.base_url}")
+                reachable += 1
+            except Exception as e:
+                print(f"⚠️ Cannot reach Ollama host {endpoint.base_url}: {e}")
+                with self._lock:
+                    if not endpoint.ejected:
+                        self._eject(endpoint)
+        return reachable
+
+    def fetch_all(self, path: str) -> List[Dict[str, Any]]:
+        """GET `path` (/api/tags or /api/ps) on every live host; models merged by name
+
+        Each host's own answer also replaces its installed (or loaded) models,
+        so host choice follows models pulled or unloaded since startup.
+        """
+        merged: Dict[str, Dict[str, Any]] = {}
+        for endpoint in self.endpoints:
+            if endpoint.ejected:
+                continue
+            try:
+                response = requests.get(f"{endpoint.base_url}{path}", timeout=OllamaConfig.TIMEOUT_CONNECT)
+                if response.status_code == 200:
+                    models = response.json().get("models", [])
+                    for model in models:
+                        merged.setdefault(model.get("name"), {**model, "hosts": []})["hosts"].append(endpoint.base_url)
+                    if path in _MODEL_SETS:
+                        names = {_normalize(m["name"]) for m in models if m.get("name")}
+                        with self._lock:
+                            setattr(endpoint, _MODEL_SETS[path], names)
+            except Exception as e:
+                print(f"⚠️ Cannot reach Ollama host {endpoint.base_url}: {e}")
+        return list(merged.values())
+
+    async def aclose(self):
+        for endpoint in self.endpoints:
+            await endpoint.aclose()
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "endpoints": [e.to_dict() for e in self.endpoints]
+            }
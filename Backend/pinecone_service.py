@@ -1,16 +1,38 @@
 # backend/pinecone_service.py
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import json
 import hashlib
+import threading
 from datetime import datetime
+from config import SearchConfig, IndexConfig
+from dense_store import DenseRows, DenseView
+from lexical_index import BM25Index
+
+# Metadata set at write time: a document differing only in these is unchanged
+_WRITE_STAMPS = ("stored_at", "added_at", "doc_id")
 
 class PineconeService:
     """Mock Pinecone service for demo - replace with real Pinecone for production"""
     
-    def __init__(self):
-        self.vectors = {}
-        self.metadata_store = {}
+    def __init__(self, vector_dtype: str = IndexConfig.VECTOR_DTYPE,
+                 rescore_factor: int = IndexConfig.RESCORE_FACTOR):
+        self.vectors = {}            # Doc id -> text and metadata
+        self.metadata_store = {}     # Category -> {doc_id: None} (an ordered set)
+        
+        # Contiguous, L2-normalised copy of all embeddings for matrix search,
+        # quantized to vector_dtype; with rescoring, float32 rows memory-mapped
+        # from disk rank the best candidates. Deletes only tombstone rows; a background
+        # compaction drops them once IndexConfig.COMPACT_DEAD_RATIO of the rows are dead
+        self.vector_dtype = vector_dtype
+        self.rescore_factor = rescore_factor
+        self._dense: Optional[DenseRows] = None
+        self._write_lock = threading.RLock()
+        self._compaction: Optional[threading.Thread] = None
+        self.compactions = 0
+        
+        # BM25 over the same documents, for exact terms embeddings blur together
+        self.lexical = BM25Index()
         print("🧠 Mock Pinecone service initialized")
     
     def embed_text(self, text: str, embedder) -> List[float]:
@@ -18,51 +40,248 @@ class PineconeService:
         return embedder.encode(text).tolist()
     
     def store_knowledge(self, text: str, metadata: Dict[str, Any], embedder) -> str:
-        """Store text with metadata"""
-        # Generate ID
+        """Store text with metadata (its id is a hash of the text, so storing the same text
+        and metadata again is a no-op)"""
         doc_id = hashlib.md5(text.encode()).hexdigest()[:16]
+        self.upsert(doc_id, text, metadata, embedder)
+        return doc_id
+    
+    def upsert(self, doc_id: str, text: str, metadata: Dict[str, Any], embedder) -> bool:
+        """Insert or replace a document by id; returns whether it was new
+        
+        An unchanged document (same text and metadata) is left as it is.
+        """
+        if self._unchanged(doc_id, text, metadata):
+            return False
+        # Generate embedding (a float32 array: a list of Python floats is ~8x larger)
+        embedding = np.asarray(embedder.encode(text), dtype=np.float32)
         
-        # Generate embedding
-        embedding = self.embed_text(text, embedder)
-        
-        # Store
-        self.vectors[doc_id] = {
-            "embedding": embedding,
-            "text": text,
-            "metadata": {
-                **metadata,
-                "stored_at": datetime.now().isoformat(),
-                "doc_id": doc_id
+        with self._write_lock:
+            if self._unchanged(doc_id, text, metadata):
+                return False
+            dense = self._dense
+            if dense is None:
+                dense = self._dense = DenseRows(len(embedding), dtype=self.vector_dtype,
+                                                exact=self.rescore_factor > 0)
+            dense.put(doc_id, embedding)
+            
+            previous = self.vectors.get(doc_id)
+            self.vectors[doc_id] = {
+                "text": text,
+                "metadata": {
+                    **metadata,
+                    "stored_at": datetime.now().isoformat(),
+                    "doc_id": doc_id
+                }
             }
-        }
+            
+            # Also index by metadata
+            if previous is not None:
+                self._uncategorize(doc_id, previous["metadata"])
+            self.metadata_store.setdefault(metadata.get("category", "general"), {})[doc_id] = None
+            if previous is None or previous["text"] != text:
+                self.lexical.add(doc_id, text)
         
-        # Also index by metadata
+        if previous is not None:
+            self._maybe_compact()    # The replaced row is now a tombstone
+        return previous is None
+    
+    def _unchanged(self, doc_id: str, text: str, metadata: Dict[str, Any]) -> bool:
+        """Whether `doc_id` is stored with this text and metadata already (write timestamps aside)"""
+        previous = self.vectors.get(doc_id)
+        if previous is None or previous["text"] != text:
+            return False
+        content = lambda meta: {k: v for k, v in meta.items() if k not in _WRITE_STAMPS}
+        return content(previous["metadata"]) == content(metadata)
+    
+    def _uncategorize(self, doc_id: str, metadata: Dict[str, Any]):
+        """Drop a document from its category, and the category once it is empty"""
         category = metadata.get("category", "general")
-        if category not in self.metadata_store:
-            self.metadata_store[category] = []
-        self.metadata_store[category].append(doc_id)
+        docs = self.metadata_store.get(category)
+        if docs is not None:
+            docs.pop(doc_id, None)
+            if not docs:
+                del self.metadata_store[category]
+    
+    def delete(self, doc_id: str) -> bool:
+        """Delete a document by id; returns whether it existed"""
+        with self._write_lock:
+            doc = self.vectors.pop(doc_id, None)
+            if doc is None:
+                return False
+            self._uncategorize(doc_id, doc["metadata"])
+            if self._dense is not None:
+                self._dense.delete(doc_id)
+            self.lexical.delete(doc_id)
         
-        return doc_id
+        self._maybe_compact()
+        return True
+    
+    def delete_where(self, filters: Dict[str, Any]) -> List[str]:
+        """Delete every document whose metadata equals all of `filters`; returns their ids"""
+        if not filters:
+            raise ValueError("delete_where needs at least one filter; use delete_all to clear the index")
+        
+        with self._write_lock:
+            if "category" in filters:
+                candidates = list(self.metadata_store.get(filters["category"], {}))
+            else:
+                candidates = list(self.vectors)
+            matched = [
+                doc_id for doc_id in candidates
+                if all(self.vectors[doc_id]["metadata"].get(key) == value for key, value in filters.items())
+            ]
+            for doc_id in matched:
+                self.delete(doc_id)
+        
+        return matched
     
     def search_similar(self, query_embedding: List[float], top_k: int = 3) -> List[Dict]:
         """Search for similar vectors (cosine similarity)"""
+        return self.search_similar_batch([query_embedding], top_k=top_k)[0]
+    
+    def search_similar_batch(self, query_embeddings, top_k: int = 3) -> List[List[Dict]]:
+        """Search for many queries at once with one matrix-matrix product"""
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        view = self._get_matrix()
+        if view is None:
+            return [[] for _ in range(len(queries))]
+        
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        scores = view.scores(queries)                    # (n_queries, n_docs)
+        live = len(view)
+        if view.dead is not None:
+            scores[:, view.dead] = -np.inf               # Tombstoned rows never rank
+            live -= int(np.count_nonzero(view.dead))
+        
+        rescore = view.quantized and self.rescore_factor > 0
+        k = min(top_k * self.rescore_factor if rescore else top_k, live)
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        
+        all_results = []
+        for query, row, candidates in zip(queries, scores, top):
+            ranked = candidates[np.argsort(-row[candidates])]
+            hits = [(i, float(row[i]), self.vectors.get(view.ids[i])) for i in ranked]
+            hits = [hit for hit in hits if hit[2] is not None]   # Deleted after this search took its view
+            if rescore and hits:
+                exact = view.exact_scores([i for i, _, _ in hits], query)
+                hits = sorted(((i, float(score), doc) for (i, _, doc), score in zip(hits, exact)),
+                              key=lambda hit: hit[1], reverse=True)
+            all_results.append([
+                {"id": view.ids[i], "score": score, "metadata": doc["metadata"], "text": doc["text"]}
+                for i, score, doc in hits[:top_k]
+            ])
+        
+        return all_results
+    
+    def search_lexical(self, query: str, top_k: int = 3) -> List[Dict]:
+        """BM25 search; scores are normalised to [0, 1)"""
         results = []
+        for doc_id, score in self.lexical.search(query, top_k):
+            doc = self.vectors.get(doc_id)
+            if doc is not None:
+                results.append({"id": doc_id, "score": score, "metadata": doc["metadata"], "text": doc["text"]})
+        return results
+    
+    def search_hybrid(self, query: str, query_embedding: List[float], top_k: int = 3) -> List[Dict]:
+        """Cosine similarity plus a BM25 bonus (see SearchConfig)"""
+        return self.search_hybrid_batch([query], [query_embedding], top_k=top_k)[0]
+    
+    def search_hybrid_batch(self, queries: List[str], query_embeddings, top_k: int = 3) -> List[List[Dict]]:
+        """Fuse dense and lexical candidates for many queries
+        
+        Candidates are the best top_k x CANDIDATE_FACTOR of each side. A
+        lexical candidate the dense search did not return gets its cosine
+        score from its stored row (float32 when kept for rescoring), so every
+        result is scored on both sides.
+        """
+        pool = top_k * SearchConfig.CANDIDATE_FACTOR
+        dense_batch = self.search_similar_batch(query_embeddings, top_k=pool)
+        embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1, norms)
         
-        for doc_id, data in self.vectors.items():
-            # Calculate cosine similarity
-            similarity = self._cosine_similarity(query_embedding, data["embedding"])
+        all_results = []
+        for query, embedding, dense in zip(queries, embeddings, dense_batch):
+            candidates = {result["id"]: {**result, "dense_score": result["score"], "lexical_score": 0.0}
+                          for result in dense}
+            # Looked up once: a concurrent delete may remove the document
+            lexical, missing = [], []
+            for doc_id, lexical_score in self.lexical.search(query, pool):
+                doc = self.vectors.get(doc_id)
+                if doc is None:
+                    continue
+                lexical.append((doc_id, lexical_score))
+                if doc_id not in candidates:
+                    missing.append((doc_id, doc))
+            if missing:
+                dense_scores = self._exact_scores([doc_id for doc_id, _ in missing], embedding)
+                for doc_id, doc in missing:
+                    if doc_id in dense_scores:       # Not deleted meanwhile
+                        candidates[doc_id] = {
+                            "id": doc_id,
+                            "metadata": doc["metadata"],
+                            "text": doc["text"],
+                            "dense_score": dense_scores[doc_id]
+                        }
+            for doc_id, lexical_score in lexical:
+                if doc_id in candidates:
+                    candidates[doc_id]["lexical_score"] = lexical_score
             
-            results.append({
-                "id": doc_id,
-                "score": similarity,
-                "metadata": data["metadata"],
-                "text": data["text"]
-            })
+            for result in candidates.values():
+                result["score"] = result["dense_score"] + SearchConfig.LEXICAL_WEIGHT * result["lexical_score"]
+            all_results.append(sorted(candidates.values(), key=lambda r: r["score"], reverse=True)[:top_k])
         
-        # Sort by similarity score
-        results.sort(key=lambda x: x["score"], reverse=True)
+        return all_results
+    
+    def _get_matrix(self) -> Optional[DenseView]:
+        """The normalised (possibly quantized) rows to search, or None when empty"""
+        dense = self._dense
+        if dense is None or not dense.ids:
+            return None
+        return dense.view()
+    
+    def _exact_scores(self, doc_ids: List[str], query: np.ndarray) -> Dict[str, float]:
+        """Cosine of the live documents among `doc_ids` with a normalised query"""
+        dense = self._dense
+        return dense.exact_scores(doc_ids, query) if dense is not None else {}
+    
+    def _dead_rows(self) -> Tuple[int, int]:
+        """(tombstoned rows, all rows) of the dense storage"""
+        dense = self._dense
+        return (dense.dead_count, len(dense.ids)) if dense is not None else (0, 0)
+    
+    def _maybe_compact(self):
+        """Start a background compaction once enough rows are tombstoned"""
+        dead, rows = self._dead_rows()
+        if dead < IndexConfig.COMPACT_MIN_DEAD or dead < rows * IndexConfig.COMPACT_DEAD_RATIO:
+            return
+        with self._write_lock:
+            if self._compaction is not None and self._compaction.is_alive():
+                return
+            self._compaction = threading.Thread(target=self.compact, name="index-compaction", daemon=True)
+            self._compaction.start()
+    
+    def compact(self):
+        """Rebuild dense and lexical storage without the tombstoned rows
         
-        return results[:top_k]
+        Writers wait for the copy; searches keep using the old storage until
+        the new one is swapped in.
+        """
+        with self._write_lock:
+            dense = self._dense
+            if dense is None or not dense.dead_count:
+                return
+            dropped = dense.dead_count
+            lexical = BM25Index(self.lexical.k1, self.lexical.b)
+            for doc_id, doc in self.vectors.items():
+                lexical.add(doc_id, doc["text"])
+            self._dense, self.lexical = dense.compacted(), lexical
+            self.compactions += 1
+        print(f"🧹 Index compacted: dropped {dropped} deleted rows")
     
     def _cosine_similarity(self, a: List[float], b: List[float]) -> float:
         """Calculate cosine similarity between two vectors"""
@@ -72,13 +291,40 @@ class PineconeService:
     
     def get_by_category(self, category: str) -> List[Dict]:
         """Get all documents in a category"""
-        doc_ids = self.metadata_store.get(category, [])
+        doc_ids = list(self.metadata_store.get(category, {}))
         return [self.vectors[doc_id] for doc_id in doc_ids if doc_id in self.vectors]
     
     def delete_all(self):
         """Clear all vectors"""
-        self.vectors.clear()
-        self.metadata_store.clear()
+        with self._write_lock:
+            self.vectors.clear()
+            self.metadata_store.clear()
+            self.lexical.clear()
+            self._dense = None
+    
+    def index_bytes(self) -> int:
+        """Heap held by the vector storage, including spare capacity
+
+        This is every in-process copy of the embeddings: the float32 rows kept
+        for rescoring are in a memory-mapped file (see storage_stats).
+        """
+        dense = self._dense
+        return dense.nbytes() if dense is not None else 0
+    
+    def storage_stats(self) -> Dict[str, Any]:
+        """Vector storage precision and size, per live vector"""
+        dense = self._dense
+        live = len(dense) if dense is not None else 0
+        rescore_bytes = dense.exact_nbytes() if dense is not None else 0
+        return {
+            "dtype": dense.dtype if dense is not None else self.vector_dtype,
+            "rescore_factor": self.rescore_factor,
+            "bytes": self.index_bytes(),
+            "rescore_file_bytes": rescore_bytes,
+            # Heap per live vector: codes, int8 scale, dead flag and id slots, tombstones and spare capacity
+            "bytes_per_vector": round(self.index_bytes() / live, 1) if live else None,
+            "rescore_file_bytes_per_vector": round(rescore_bytes / live, 1) if live else None
+        }
     
     def get_stats(self) -> Dict:
         """Get service statistics"""
@@ -87,7 +333,11 @@ class PineconeService:
             "categories": list(self.metadata_store.keys()),
             "documents_per_category": {
                 cat: len(docs) for cat, docs in self.metadata_store.items()
-            }
+            },
+            "lexical_index": self.lexical.get_stats(),
+            "vector_storage": self.storage_stats(),
+            "tombstones": self._dead_rows()[0],
+            "compactions": self.compactions
         }
 
 # For real Pinecone (uncomment and configure if you have Pinecone API key)
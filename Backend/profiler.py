@@ -0,0 +1,132 @@
+# backend/profiler.py
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, Optional
+from config import ProfilerConfig
+
+# Leaf frames of threads that are parked, not working
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+class SamplingProfiler:
+    """Samples every thread's stack while armed requests are in flight
+
+    Arm it for the next N requests; stacks are aggregated in the folded
+    format ("thread;outer;inner count") read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._remaining = 0          # Requests still to profile
+        self._active = 0             # Profiled requests in flight
+        self._interval_s = ProfilerConfig.DEFAULT_INTERVAL_MS / 1000
+        self._thread: Optional[threading.Thread] = None
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._idle_samples = 0
+        self._profiled_requests = 0
+        self._armed_at: Optional[float] = None
+
+    def arm(self, requests: int, interval_ms: float):
+        """Profile the next `requests` requests, discarding any previous profile"""
+        with self._lock:
+            self._remaining = requests
+            self._interval_s = interval_ms / 1000
+            self._stacks = Counter()
+            self._samples = 0
+            self._idle_samples = 0
+            self._profiled_requests = 0
+            self._armed_at = time.time()
+
+    def request_started(self, path: str) -> bool:
+        """Called for every request; True if this one is profiled"""
+        if not self._remaining or path.startswith(ProfilerConfig.EXCLUDED_PATH_PREFIX):
+            return False
+
+        with self._lock:
+            if not self._remaining:
+                return False
+            self._remaining -= 1
+            self._active += 1
+            self._profiled_requests += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="jarvis-profiler", daemon=True)
+                self._thread.start()
+        return True
+
+    def request_finished(self):
+        with self._lock:
+            self._active -= 1
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                if self._active <= 0:
+                    self._thread = None
+                    return
+                interval = self._interval_s
+
+            names = {t.ident: t.name for t in threading.enumerate()}
+            sampled = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    sampled.append(None)
+                    continue
+
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                sampled.append(";".join(reversed(frames)))
+
+            with self._lock:
+                self._samples += 1
+                for stack in sampled:
+                    if stack is None:
+                        self._idle_samples += 1
+                    else:
+                        self._stacks[stack] += 1
+
+            time.sleep(interval)
+
+    def folded(self) -> str:
+        """Collected stacks in folded (collapsed) format"""
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return "\n".join(f"{stack} {count}" for stack, count in stacks) + ("\n" if stacks else "")
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._armed_at is None:
+                state = "idle"
+            elif self._remaining or self._active:
+                state = "running"
+            else:
+                state = "complete"
+            return {
+                "state": state,
+                "requests_remaining": self._remaining,
+                "requests_in_flight": self._active,
+                "requests_profiled": self._profiled_requests,
+                "samples": self._samples,
+                "idle_thread_samples": self._idle_samples,
+                "interval_ms": round(self._interval_s * 1000, 2),
+                "armed_at": self._armed_at
+            }
+
+
+profiler = SamplingProfiler()
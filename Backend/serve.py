@@ -0,0 +1,139 @@
+# backend/serve.py
+"""Pre-fork server: load models and the index once, then fork the workers
+
+Workers inherit the loaded models copy-on-write and map the same index files
+(see shared_index.py), so N workers cost far less memory than N separate
+`python app.py` processes, and knowledge added through one worker is
+searchable from all of them:
+
+    python serve.py --workers 4
+    JARVIS_WORKERS=4 JARVIS_INDEX_DIR=/var/lib/jarvis/index python serve.py
+
+Conversation sessions (reused Ollama context), metrics and generation slots
+stay per worker: a follow-up served by another worker starts a fresh context.
+
+Needs os.fork (Linux/macOS); elsewhere it serves with a single process.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+import uvicorn
+
+from config import ServerConfig, IndexConfig
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Listening socket created before the fork; every worker accepts on it"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(api, sock: socket.socket, torch_threads: int):
+    """Serve on the inherited socket until SIGTERM/SIGINT"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    # One intra-op thread pool per worker would oversubscribe the CPUs
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(torch_threads)
+
+    server = uvicorn.Server(uvicorn.Config(api.app, log_level="info"))
+    server.run(sockets=[sock])
+
+
+def supervise(api, sock: socket.socket, workers: int, torch_threads: int):
+    """Fork the workers, replace any that die, forward shutdown signals"""
+    children = {}
+    stopping = False
+
+    def spawn(number: int):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(api, sock, torch_threads)
+            finally:
+                os._exit(0)
+        children[pid] = number
+        print(f"👷 Worker {number} started (pid {pid})")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for number in range(workers):
+        spawn(number)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        number = children.pop(pid, None)
+        if number is not None and not stopping:
+            print(f"⚠️ Worker {number} (pid {pid}) exited with status {status}; restarting")
+            time.sleep(1)
+            spawn(number)
+
+    print("👋 All workers stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Jarvis with pre-forked workers")
+    parser.add_argument("--workers", type=int, default=ServerConfig.WORKERS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--index-dir", default=IndexConfig.SHARED_DIR,
+                        help="Shared index directory (default: jarvis-index in the temp dir)")
+    args = parser.parse_args()
+
+    workers = args.workers
+    if workers > 1 and not hasattr(os, "fork"):
+        print("⚠️ os.fork is not available on this platform; serving with one process")
+        workers = 1
+
+    # Workers must share one index, so give it a directory before anything loads
+    if workers > 1:
+        IndexConfig.SHARED_DIR = args.index_dir or os.path.join(tempfile.gettempdir(), "jarvis-index")
+
+    import app as api
+
+    print(f"🚀 Loading models and index before starting {workers} worker(s)...")
+    if not api.preload():
+        print("❌ Initialization failed; not starting workers")
+        sys.exit(1)
+
+    sock = bind_socket(args.host, args.port)
+    print(f"📡 Listening on http://{args.host}:{args.port}")
+
+    # Keep the garbage collector from touching (and so copying) every inherited object
+    gc.collect()
+    gc.freeze()
+
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    if workers == 1:
+        run_worker(api, sock, torch_threads)
+    else:
+        supervise(api, sock, workers, torch_threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# backend/sessions.py
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from config import OllamaConfig, SessionConfig
+
+
+class ConversationSession:
+    """Ollama's context tokens for one conversation with one model"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.tokens = array("i")     # 4 bytes per token instead of a list of ints
+        self.turns = 0
+        self.last_used = time.time()
+
+
+class SessionStore:
+    """Per-conversation Ollama context, bounded by count, size and idle time
+
+    Follow-up questions send the stored `context` tokens back to Ollama so only
+    the new turn is evaluated. Sessions are kept in LRU order: the least
+    recently used one is evicted when the store is full, idle ones expire, and
+    a conversation that outgrows its share of the context window starts over.
+    """
+
+    def __init__(self, max_sessions: int = SessionConfig.MAX_SESSIONS,
+                 idle_timeout_s: float = SessionConfig.IDLE_TIMEOUT_S):
+        self.max_sessions = max_sessions
+        self.idle_timeout_s = idle_timeout_s
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"reused": 0, "started": 0, "evicted_idle": 0, "evicted_lru": 0,
+                      "reset_full": 0, "reset_model": 0}
+
+    @staticmethod
+    def max_tokens(model: str) -> int:
+        """Context tokens a session may carry before it starts over"""
+        return int(OllamaConfig.get_context_window(model) * SessionConfig.MAX_CONTEXT_SHARE)
+
+    def get(self, key: str, model: str) -> Optional[List[int]]:
+        """Context tokens to continue `key` with `model`, or None to start fresh"""
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(key)
+            if session is None or not session.tokens:
+                return None
+
+            if session.model != model:
+                # Context tokens are only meaningful to the model that produced them
+                self.stats["reset_model"] += 1
+                del self._sessions[key]
+                return None
+            if len(session.tokens) > self.max_tokens(model):
+                self.stats["reset_full"] += 1
+                del self._sessions[key]
+                return None
+
+            session.last_used = time.time()
+            self._sessions.move_to_end(key)
+            self.stats["reused"] += 1
+            return session.tokens.tolist()
+
+    def context_tokens(self, key: str, model: str) -> int:
+        """How many context tokens get() would send (0 to start fresh), without touching the session"""
+        with self._lock:
+            session = self._sessions.get(key)
+            if (session is None or session.model != model
+                    or len(session.tokens) > self.max_tokens(model)
+                    or time.time() - session.last_used > self.idle_timeout_s):
+                return 0
+            return len(session.tokens)
+
+    def update(self, key: str, model: str, tokens: List[int]):
+        """Store the context Ollama returned after a turn"""
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None or session.model != model:
+                session = self._sessions[key] = ConversationSession(model)
+                self.stats["started"] += 1
+            session.tokens = array("i", tokens)
+            session.turns += 1
+            session.last_used = time.time()
+            self._sessions.move_to_end(key)
+
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats["evicted_lru"] += 1
+
+    def turns(self, key: str) -> int:
+        with self._lock:
+            session = self._sessions.get(key)
+            return session.turns if session else 0
+
+    def drop(self, key: str) -> bool:
+        """End a conversation"""
+        with self._lock:
+            return self._sessions.pop(key, None) is not None
+
+    def _evict_idle(self):
+        """Drop idle sessions; they sit at the front of the LRU order"""
+        cutoff = time.time() - self.idle_timeout_s
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if session.last_used >= cutoff:
+                break
+            del self._sessions[key]
+            self.stats["evicted_idle"] += 1
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            self._evict_idle()
+            tokens = sum(len(s.tokens) for s in self._sessions.values())
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "context_tokens": tokens,
+                "memory_bytes": tokens * array("i").itemsize,
+                **self.stats
+            }
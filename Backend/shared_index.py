@@ -0,0 +1,356 @@
+# backend/shared_index.py
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Any
+
+import numpy as np
+
+from config import IndexConfig
+from dense_store import DenseView
+from lexical_index import BM25Index
+from pinecone_service import PineconeService
+
+try:
+    import fcntl
+except ImportError:          # Windows: no fork either, so a single process owns the index
+    fcntl = None
+
+# Header fields (int64) at the start of vectors.f32
+_GENERATION, _VERSION, _ROWS, _CAPACITY, _DIM = range(5)
+_HEADER_FIELDS = 8
+_HEADER_BYTES = _HEADER_FIELDS * 8
+
+
+class SharedPineconeService(PineconeService):
+    """PineconeService whose index lives in memory-mapped files shared by every worker
+
+    Layout of `directory`:
+      vectors.f32  header + float32 rows, L2-normalised at write time. Every
+                   worker maps the same file, so the search matrix sits once
+                   in the page cache however many workers there are.
+      docs.jsonl   one {"row", "id", "text", "metadata"} record per write.
+                   Rows are only appended: a record for an id that already
+                   has a row tombstones the old one, and {"row", "id",
+                   "deleted"} records tombstone a row.
+      lock         flock'd exclusively by writers, shared by readers catching up.
+
+    Writers bump the header's version; readers compare it before each read
+    and replay only the new docs.jsonl records, so knowledge added through one
+    worker is searchable from all of them.
+
+    Compaction writes both files anew without the tombstoned rows, renames
+    them into place and bumps the old header's generation: each worker then
+    maps the new files and replays them, searching the old mapping until it
+    does.
+    """
+
+    def __init__(self, directory: str = IndexConfig.SHARED_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._docs_path = os.path.join(directory, "docs.jsonl")
+        self._lock_path = os.path.join(directory, "lock")
+        self._thread_lock = threading.RLock()   # flock is per process; threads need their own
+        # The mapped rows stay float32: one page-cache copy serves every worker,
+        # and they are exact, so there is nothing to rescore
+        super().__init__(vector_dtype="float32", rescore_factor=0)
+
+        with self._file_lock(exclusive=True):
+            if not os.path.exists(self._vectors_path) or os.path.getsize(self._vectors_path) < _HEADER_BYTES:
+                with open(self._vectors_path, "wb") as f:
+                    f.write(b"\0" * _HEADER_BYTES)
+                open(self._docs_path, "w").close()
+        self._map_header()
+
+        self._reset_view()
+        self._sync()
+        print(f"🧠 Shared vector index at {directory} ({len(self.vectors)} documents)")
+
+    def _map_header(self):
+        self._header = np.memmap(self._vectors_path, dtype=np.int64, mode="r+", shape=(_HEADER_FIELDS,))
+        self._inode = os.stat(self._vectors_path).st_ino
+
+    def _reset_view(self):
+        """Forget everything replayed so far (first load, or after delete_all)"""
+        self.vectors = {}
+        self.metadata_store = {}
+        self._ids: List[str] = []        # Row -> doc id
+        self._rows: Dict[str, int] = {}  # Live doc id -> row
+        self._dead: set = set()          # Tombstoned rows
+        self._docs_offset = 0
+        self._generation = -1
+        self._version = -1
+        self._map = None                 # float32 (capacity, dim) memmap
+        self._matrix = None
+        self._rows_cache = None
+        self.lexical = BM25Index()       # Rebuilt per worker from docs.jsonl
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync(self):
+        """Catch up with writes made by any worker since the last read"""
+        if self._header[_VERSION] == self._version and self._header[_GENERATION] == self._generation:
+            return
+        with self._file_lock(exclusive=False):
+            self._catch_up()
+
+    def _catch_up(self):
+        """Replay new docs.jsonl records and remap the matrix if it grew (file lock held)"""
+        if os.stat(self._vectors_path).st_ino != self._inode:
+            self._map_header()           # Compacted by some worker: follow the new files
+        header = self._header
+        if header[_GENERATION] != self._generation:
+            self._reset_view()
+            self._generation = int(header[_GENERATION])
+
+        capacity, dim = int(header[_CAPACITY]), int(header[_DIM])
+        if capacity and (self._map is None or self._map.shape[0] != capacity):
+            self._map = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                  offset=_HEADER_BYTES, shape=(capacity, dim))
+
+        with open(self._docs_path, "rb") as f:
+            f.seek(self._docs_offset)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        self._docs_offset += len(complete)
+
+        changed = False
+        for line in complete.splitlines():
+            record = json.loads(line)
+            row, doc_id = record["row"], record["id"]
+            changed = True
+            if record.get("deleted"):
+                if self._rows.get(doc_id) == row:
+                    del self._rows[doc_id]
+                    doc = self.vectors.pop(doc_id, None)
+                    if doc is not None:
+                        self._uncategorize(doc_id, doc["metadata"])
+                    self.lexical.delete(doc_id)
+                self._dead.add(row)
+                continue
+
+            if row == len(self._ids):
+                self._ids.append(doc_id)
+            replaced = self._rows.get(doc_id)
+            if replaced is not None and replaced != row:
+                self._dead.add(replaced)
+            self._rows[doc_id] = row
+            previous = self.vectors.get(doc_id)
+            if previous is not None:
+                self._uncategorize(doc_id, previous["metadata"])
+            self.metadata_store.setdefault(record["metadata"].get("category", "general"), {})[doc_id] = None
+            self.vectors[doc_id] = {
+                "text": record["text"],
+                "metadata": record["metadata"]
+            }
+            if previous is None or previous["text"] != record["text"]:
+                self.lexical.add(doc_id, record["text"])
+
+        if changed:
+            self._matrix = None
+        self._version = int(header[_VERSION])
+
+    def _ensure_capacity(self, rows: int, dim: int):
+        """Grow vectors.f32 (doubling) so it holds `rows` rows (file lock held)"""
+        header = self._header
+        if header[_DIM] == 0:
+            header[_DIM] = dim
+        elif header[_DIM] != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match the index ({header[_DIM]})")
+
+        capacity = int(header[_CAPACITY])
+        if rows <= capacity:
+            return
+        capacity = max(capacity * 2, IndexConfig.INITIAL_CAPACITY, rows)
+        with open(self._vectors_path, "r+b") as f:
+            f.truncate(_HEADER_BYTES + capacity * dim * 4)
+        header[_CAPACITY] = capacity
+        self._map = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                              offset=_HEADER_BYTES, shape=(capacity, dim))
+
+    def upsert(self, doc_id: str, text: str, metadata: Dict[str, Any], embedder) -> bool:
+        """Insert or replace a document by id; visible to every worker once this returns
+
+        An unchanged document is not written again, so re-seeding the
+        knowledge base on every restart does not grow the files.
+        """
+        self._sync()
+        if self._unchanged(doc_id, text, metadata):
+            return False
+        embedding = np.asarray(embedder.encode(text), dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        record = {
+            "id": doc_id,
+            "text": text,
+            "metadata": {**metadata, "stored_at": datetime.now().isoformat(), "doc_id": doc_id}
+        }
+
+        with self._file_lock(exclusive=True):
+            self._catch_up()
+            if self._unchanged(doc_id, text, metadata):    # Written by another worker meanwhile
+                return False
+            created = doc_id not in self._rows
+            row = len(self._ids)     # Appended even when replacing: a mapped row never changes under a reader
+            self._ensure_capacity(row + 1, len(embedding))
+            self._map[row] = embedding / norm if norm else embedding
+
+            self._append_records([{"row": row, **record}])
+            self._header[_ROWS] = max(int(self._header[_ROWS]), row + 1)
+            self._header[_VERSION] += 1
+            self._catch_up()
+
+        if not created:
+            self._maybe_compact()    # The replaced row is now a tombstone
+        return created
+
+    def _append_records(self, records: List[Dict[str, Any]]):
+        with open(self._docs_path, "ab") as f:
+            f.write(b"".join(json.dumps(record).encode() + b"\n" for record in records))
+
+    def delete(self, doc_id: str) -> bool:
+        return bool(self._delete_ids(lambda: [doc_id] if doc_id in self._rows else []))
+
+    def delete_where(self, filters: Dict[str, Any]) -> List[str]:
+        if not filters:
+            raise ValueError("delete_where needs at least one filter; use delete_all to clear the index")
+        return self._delete_ids(lambda: [
+            doc_id for doc_id, doc in self.vectors.items()
+            if all(doc["metadata"].get(key) == value for key, value in filters.items())
+        ])
+
+    def _delete_ids(self, select) -> List[str]:
+        """Tombstone the documents `select()` picks once caught up (file lock held)"""
+        with self._file_lock(exclusive=True):
+            self._catch_up()
+            doc_ids = select()
+            if doc_ids:
+                self._append_records([{"row": self._rows[d], "id": d, "deleted": True} for d in doc_ids])
+                self._header[_VERSION] += 1
+                self._catch_up()
+        if doc_ids:
+            self._maybe_compact()
+        return doc_ids
+
+    def compact(self):
+        """Rewrite both files without tombstoned rows and hand them to every worker"""
+        with self._file_lock(exclusive=True):
+            self._catch_up()
+            if not self._dead:
+                return
+            dropped = len(self._dead)
+            live = sorted(self._rows.items(), key=lambda item: item[1])
+            dim = int(self._header[_DIM])
+            capacity = max(IndexConfig.INITIAL_CAPACITY, 2 * len(live))
+            generation = int(self._header[_GENERATION]) + 1
+
+            vectors_tmp, docs_tmp = self._vectors_path + ".tmp", self._docs_path + ".tmp"
+            header = np.zeros(_HEADER_FIELDS, dtype=np.int64)
+            header[[_GENERATION, _VERSION, _ROWS, _CAPACITY, _DIM]] = [
+                generation, int(self._header[_VERSION]) + 1, len(live), capacity, dim
+            ]
+            with open(vectors_tmp, "wb") as f:
+                f.write(header.tobytes())
+                f.truncate(_HEADER_BYTES + capacity * dim * 4)
+            rows = np.memmap(vectors_tmp, dtype=np.float32, mode="r+", offset=_HEADER_BYTES, shape=(capacity, dim))
+            rows[:len(live)] = self._map[[row for _, row in live]]
+            rows.flush()
+            del rows
+            with open(docs_tmp, "wb") as f:
+                for new_row, (doc_id, _) in enumerate(live):
+                    doc = self.vectors[doc_id]
+                    f.write(json.dumps({"row": new_row, "id": doc_id, "text": doc["text"],
+                                        "metadata": doc["metadata"]}).encode() + b"\n")
+
+            os.replace(docs_tmp, self._docs_path)
+            os.replace(vectors_tmp, self._vectors_path)
+            # Workers still watch the old header: tell them to move over
+            self._header[_GENERATION] = generation
+            self._header[_VERSION] += 1
+            self._catch_up()
+            self.compactions += 1
+        print(f"🧹 Shared index compacted: dropped {dropped} deleted rows")
+
+    def search_similar_batch(self, query_embeddings, top_k: int = 3) -> List[List[Dict]]:
+        self._sync()
+        return super().search_similar_batch(query_embeddings, top_k=top_k)
+
+    def search_hybrid_batch(self, queries: List[str], query_embeddings, top_k: int = 3) -> List[List[Dict]]:
+        self._sync()
+        return super().search_hybrid_batch(queries, query_embeddings, top_k=top_k)
+
+    def search_lexical(self, query: str, top_k: int = 3) -> List[Dict]:
+        self._sync()
+        return super().search_lexical(query, top_k=top_k)
+
+    def _get_matrix(self):
+        """The mapped rows themselves: already normalised, nothing to copy"""
+        if not self._ids:
+            return None
+        cached = self._matrix
+        if cached is None:
+            n = len(self._ids)
+            dead = None
+            if self._dead:
+                dead = np.zeros(n, dtype=bool)
+                dead[list(self._dead)] = True
+            cached = self._matrix = DenseView(self._map[:n], list(self._ids), dead)
+        return cached
+
+    def _exact_scores(self, doc_ids: List[str], query: np.ndarray) -> Dict[str, float]:
+        rows = {}
+        for doc_id in doc_ids:
+            row = self._rows.get(doc_id)     # None once deleted
+            if row is not None:
+                rows[doc_id] = row
+        if not rows:
+            return {}
+        return dict(zip(rows, (self._map[list(rows.values())] @ query).tolist()))
+
+    def _dead_rows(self):
+        return len(self._dead), len(self._ids)
+
+    def get_by_category(self, category: str) -> List[Dict]:
+        self._sync()
+        return super().get_by_category(category)
+
+    def delete_all(self):
+        """Clear all vectors (in every worker)"""
+        with self._file_lock(exclusive=True):
+            open(self._docs_path, "w").close()
+            self._header[_ROWS] = 0
+            self._header[_GENERATION] += 1
+            self._header[_VERSION] += 1
+            self._catch_up()
+
+    def index_bytes(self) -> int:
+        """Mapped search matrix; shared by all workers, counted once"""
+        self._sync()
+        return len(self._ids) * int(self._header[_DIM]) * 4
+
+    def storage_stats(self) -> Dict[str, Any]:
+        return {
+            "dtype": self.vector_dtype,
+            "rescore_factor": self.rescore_factor,
+            "bytes": self.index_bytes(),
+            "rescore_file_bytes": 0,
+            "bytes_per_vector": round(self.index_bytes() / len(self._rows), 1) if self._rows else None,
+            "rescore_file_bytes_per_vector": None
+        }
+
+    def get_stats(self) -> Dict:
+        self._sync()
+        return {**super().get_stats(), "shared_index": self.directory}
@@ -0,0 +1,135 @@
+# backend/startup.py
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Callable
+from config import StartupConfig
+
+
+class Startup:
+    """Progress of the components initialized in the background
+
+    The server starts listening straight away; models, the knowledge base and
+    the Ollama probe load on a thread. Each component is pending, loading,
+    ready or failed. The service is ready once every critical component is;
+    optional ones (Ollama) may fail and the service falls back without them.
+    """
+
+    def __init__(self, critical: List[str], optional: List[str] = ()):
+        self.critical = list(critical)
+        self.started_at = time.time()
+        self.ready_at = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._settled = threading.Event()
+        self.thread = None
+        self.components: Dict[str, Dict[str, Any]] = {
+            name: {"state": "pending", "critical": name in self.critical}
+            for name in list(critical) + list(optional)
+        }
+
+    @contextmanager
+    def step(self, name: str):
+        """Track one component's initialization; exceptions mark it failed and propagate"""
+        start = time.time()
+        self._update(name, state="loading")
+        print(f"⏳ Initializing {name}...")
+        try:
+            yield
+        except Exception as e:
+            self._update(name, state="failed", error=f"{type(e).__name__}: {e}",
+                         seconds=round(time.time() - start, 2))
+            print(f"❌ {name} failed to initialize: {e}")
+            self._check_progress()
+            raise
+        self._update(name, state="ready", seconds=round(time.time() - start, 2))
+        print(f"✅ {name} ready in {time.time() - start:.1f}s")
+
+        self._check_progress()
+
+    def _check_progress(self):
+        if self.ready and not self._ready.is_set():
+            self.ready_at = time.time()
+            self._ready.set()
+            print(f"🎯 Ready in {self.ready_at - self.started_at:.1f}s")
+        # Settled: nothing left loading, or a critical failure means it never will be
+        failed = self.failed
+        with self._lock:
+            if failed or all(c["state"] in ("ready", "failed") for c in self.components.values()):
+                self._settled.set()
+
+    def note(self, name: str, **fields):
+        """Attach details to a component's status (e.g. whether Ollama answered)"""
+        self._update(name, **fields)
+
+    def _update(self, name: str, **fields):
+        with self._lock:
+            self.components[name].update(fields)
+
+    def run_in_background(self, target: Callable[[], None]) -> threading.Thread:
+        """Run the initialization function on a daemon thread"""
+        def run():
+            try:
+                target()
+            except Exception:
+                pass   # Already recorded by step(); /health/ready reports it
+        self.thread = threading.Thread(target=run, name="startup", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    @property
+    def ready(self) -> bool:
+        if self._ready.is_set():
+            return True
+        with self._lock:
+            return all(self.components[name]["state"] == "ready" for name in self.critical)
+
+    @property
+    def failed(self) -> bool:
+        """A critical component failed: the service will not become ready without a restart"""
+        with self._lock:
+            return any(self.components[name]["state"] == "failed" for name in self.critical)
+
+    def wait(self, timeout: float = None, optional: bool = False) -> bool:
+        """Block until ready, or with `optional` until every component finished
+        (for scripts driving the app in-process)"""
+        return (self._settled if optional else self._ready).wait(timeout)
+
+    def get_status(self) -> Dict[str, Any]:
+        ready, failed = self.ready, self.failed
+        with self._lock:
+            return {
+                "status": "ready" if ready else ("failed" if failed else "starting"),
+                "uptime_s": round(time.time() - self.started_at, 1),
+                "ready_after_s": round(self.ready_at - self.started_at, 2) if self.ready_at else None,
+                "components": {name: dict(info) for name, info in self.components.items()}
+            }
+
+
+class ReadinessGate:
+    """ASGI middleware answering 503 for everything but health, metrics and admin until ready"""
+
+    def __init__(self, app, startup: Startup):
+        self.app = app
+        self.startup = startup
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.startup.ready:
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        if path == "/" or path.startswith(StartupConfig.UNGATED_PATHS):
+            return await self.app(scope, receive, send)
+
+        body = json.dumps({"detail": "Service is starting", **self.startup.get_status()}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(StartupConfig.RETRY_AFTER_S).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,50 @@
+# backend/tests/test_shared_index.py
+import os
+import zlib
+
+import numpy as np
+
+from knowledge_base import KnowledgeBase
+from pinecone_service import PineconeService
+from shared_index import SharedPineconeService, _ROWS
+
+
+class HashingEmbedder:
+    """Deterministic bag-of-words vectors, so tests need no model"""
+
+    def encode(self, text):
+        vector = np.zeros(64, dtype=np.float32)
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode()) % 64] += 1.0
+        return vector
+
+
+def test_restarts_do_not_grow_the_shared_index(tmp_path):
+    directory = str(tmp_path)
+    sizes = []
+    for _ in range(3):          # First start, then two restarts seeding the same documents
+        service = SharedPineconeService(directory)
+        KnowledgeBase(service, HashingEmbedder()).initialize()
+        sizes.append((int(service._header[_ROWS]),
+                      os.path.getsize(os.path.join(directory, "docs.jsonl")),
+                      len(service._dead)))
+
+    assert sizes[1] == sizes[0]
+    assert sizes[2] == sizes[0]
+    assert sizes[0][2] == 0
+
+
+def test_storing_the_same_document_twice_is_a_no_op():
+    service = PineconeService()
+    embedder = HashingEmbedder()
+    doc_id = service.store_knowledge("SOX audit trails", {"category": "compliance"}, embedder)
+    stored_at = service.vectors[doc_id]["metadata"]["stored_at"]
+
+    assert service.store_knowledge("SOX audit trails", {"category": "compliance"}, embedder) == doc_id
+    assert len(service._dense.ids) == 1
+    assert service.vectors[doc_id]["metadata"]["stored_at"] == stored_at
+
+    # Changed metadata is still a replacement
+    assert service.upsert(doc_id, "SOX audit trails", {"category": "risk"}, embedder) is False
+    assert len(service._dense.ids) == 2
+    assert service.get_stats()["categories"] == ["risk"]
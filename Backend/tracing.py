@@ -0,0 +1,175 @@
+# backend/tracing.py
+import functools
+import inspect
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional
+from config import TracingConfig
+
+logger = logging.getLogger(__name__)
+
+# Set per request by TraceMiddleware; copied into tasks and CPU pool threads
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("jarvis_trace", default=None)
+_current_span: ContextVar[Optional[Dict[str, Any]]] = ContextVar("jarvis_span", default=None)
+
+
+class Trace:
+    """Spans recorded while serving one request"""
+
+    def __init__(self, request_id: str, name: str):
+        self.request_id = request_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self.duration_ms: Optional[float] = None
+
+    def add_span(self, name: str, parent: Optional[int]) -> Dict[str, Any]:
+        span = {
+            "id": len(self.spans),
+            "parent": parent,
+            "name": name,
+            "start_ms": round((time.perf_counter() - self.start) * 1000, 2),
+            "duration_ms": None,
+            "attributes": {}
+        }
+        self.spans.append(span)   # list.append is atomic, spans may close on other threads
+        return span
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "spans": list(self.spans)
+        }
+
+
+class _TraceStore:
+    """Most recent finished traces, looked up by request id"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+
+    def add(self, trace: Trace):
+        self._traces[trace.request_id] = trace
+        while len(self._traces) > self.size:
+            self._traces.popitem(last=False)
+
+    def get(self, request_id: str) -> Optional[Trace]:
+        return self._traces.get(request_id)
+
+
+recent_traces = _TraceStore(TracingConfig.RECENT_TRACES)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record a child span of the current one; a no-op outside a traced request
+
+    Yields the span's attribute dict so callers can attach results (model, hits...).
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield {}
+        return
+
+    parent = _current_span.get()
+    record = trace.add_span(name, parent["id"] if parent else None)
+    record["attributes"].update(attributes)
+    token = _current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record["attributes"]
+    except BaseException as e:
+        record["attributes"]["error"] = type(e).__name__
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        _current_span.reset(token)
+
+
+def traced(name: str):
+    """Decorator: run the function (sync or async) inside a span"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def annotate(**attributes):
+    """Attach attributes to the current span (no-op outside a trace)"""
+    record = _current_span.get()
+    if record is not None:
+        record["attributes"].update(attributes)
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+class TraceMiddleware:
+    """ASGI middleware: one trace per HTTP request, id echoed in X-Request-ID
+
+    Plain ASGI (not BaseHTTPMiddleware) so streaming responses and client
+    disconnect detection behave exactly as without it.
+    """
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header = TracingConfig.REQUEST_ID_HEADER.lower().encode()
+        incoming = dict(scope.get("headers") or []).get(header, b"").decode("latin-1")
+        request_id = incoming[:TracingConfig.MAX_REQUEST_ID_LENGTH] or uuid.uuid4().hex
+
+        trace = Trace(request_id, f"{scope['method']} {scope['path']}")
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(None)
+        profiled = self.profiler.request_started(scope["path"]) if self.profiler else False
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(header, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            with span(trace.name):
+                await self.app(scope, receive, send_with_request_id)
+        finally:
+            trace.duration_ms = round((time.perf_counter() - trace.start) * 1000, 2)
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            if profiled:
+                self.profiler.request_finished()
+            recent_traces.add(trace)
+
+            if trace.duration_ms >= TracingConfig.SLOW_REQUEST_MS:
+                slowest = sorted(
+                    (s for s in trace.spans if s["parent"] is not None and s["duration_ms"] is not None),
+                    key=lambda s: s["duration_ms"], reverse=True
+                )[:3]
+                summary = ", ".join(f"{s['name']}={s['duration_ms']:.0f}ms" for s in slowest)
+                logger.warning(f"🐢 Slow request {request_id} {trace.name}: {trace.duration_ms:.0f} ms (slowest: {summary})")
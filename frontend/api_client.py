@@ -0,0 +1,113 @@
+# frontend/api_client.py
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Seconds a read-only response is reused; paths not listed are never cached
+CACHE_TTL_S = {
+    "/dashboard": 5,
+    "/health": 5,
+    "/llm/status": 10,
+    "/stats": 15,
+    "/categories": 60,
+}
+
+
+class JarvisAPI:
+    """Client for the Jarvis backend shared by every Streamlit session and rerun
+
+    One pooled `requests.Session` keeps connections alive between calls.
+    Responses from the read-only endpoints in CACHE_TTL_S are cached for a few
+    seconds; writes invalidate the paths they change. Expired entries that
+    came with an ETag are revalidated with If-None-Match, and a 304 reuses
+    them. Every call made during a script run is logged (see start_run) for
+    the debug panel.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = 10):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._cache: Dict[str, Tuple[float, int, Any, Optional[str]]] = {}  # path -> (expires, status, body, etag)
+        self._lock = threading.Lock()
+        self._run = threading.local()   # Streamlit runs each script run on its own thread
+
+    def start_run(self) -> List[Dict[str, Any]]:
+        """Start logging calls for the current script run; returns the (live) log"""
+        self._run.calls = []
+        return self._run.calls
+
+    def _log(self, method: str, path: str, status, started: float, cached: bool):
+        calls = getattr(self._run, "calls", None)
+        if calls is not None:
+            calls.append({
+                "method": method,
+                "path": path,
+                "status": status,
+                "ms": round((time.time() - started) * 1000, 1),
+                "cached": cached
+            })
+
+    def get(self, path: str, timeout: float = 5, params: Optional[Dict[str, Any]] = None) -> Tuple[int, Any]:
+        """GET `path`; returns (status code, JSON body), from the cache when still fresh"""
+        started = time.time()
+        ttl = CACHE_TTL_S.get(path) if not params else None
+        entry = None
+        if ttl:
+            with self._lock:
+                entry = self._cache.get(path)
+            if entry and entry[0] > started:
+                self._log("GET", path, entry[1], started, cached=True)
+                return entry[1], entry[2]
+
+        headers = {"If-None-Match": entry[3]} if entry and entry[3] else None
+        try:
+            response = self.session.get(f"{self.base_url}{path}", params=params, headers=headers, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            self._log("GET", path, type(e).__name__, started, cached=False)
+            raise
+
+        if response.status_code == 304 and entry:
+            status_code, body = entry[1], entry[2]
+        else:
+            status_code, body = response.status_code, _json(response)
+        if ttl and status_code == 200:
+            with self._lock:
+                etag = response.headers.get("ETag") or (entry[3] if entry else None)
+                self._cache[path] = (time.time() + ttl, status_code, body, etag)
+        self._log("GET", path, response.status_code, started, cached=False)
+        return status_code, body
+
+    def post(self, path: str, json: Dict[str, Any], timeout: float = 10,
+             invalidates: Tuple[str, ...] = ()) -> Tuple[int, Any]:
+        """POST `path`; drops the cached responses of `invalidates` afterwards"""
+        started = time.time()
+        try:
+            response = self.session.post(f"{self.base_url}{path}", json=json, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            self._log("POST", path, type(e).__name__, started, cached=False)
+            raise
+        finally:
+            self.invalidate(*invalidates)
+        self._log("POST", path, response.status_code, started, cached=False)
+        return response.status_code, _json(response)
+
+    def invalidate(self, *paths: str):
+        """Forget cached responses (all of them when no path is given)"""
+        with self._lock:
+            if not paths:
+                self._cache.clear()
+            for path in paths:
+                self._cache.pop(path, None)
+
+
+def _json(response: requests.Response) -> Any:
+    try:
+        return response.json()
+    except ValueError:
+        return {"detail": response.text}
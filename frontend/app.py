@@ -4,10 +4,13 @@ import requests
 import json
 from datetime import datetime
 import time
+import uuid
 import threading
 from queue import Queue
 import sys
 import os
+from api_client import JarvisAPI
+from chat_history import ChatHistory, ChatMessage
 
 # Set page configuration
 st.set_page_config(
@@ -173,22 +176,31 @@ st.markdown("""
 
 # API Configuration
 API_BASE = "http://localhost:8000"
+QUERY_TIMEOUT_S = 30
+QUERY_DEADLINE_MS = 27000  # Leave the backend room to answer before we give up
+
+@st.cache_resource
+def get_api_client():
+    """One pooled, caching API client for every session and rerun"""
+    return JarvisAPI(API_BASE)
+
+api = get_api_client()
+
+# Log this run's backend calls for the debug panel; keep the last run's too
+# (a run that ends in st.rerun() never reaches the panel)
+st.session_state.previous_run_calls = st.session_state.get("run_calls", [])
+st.session_state.run_calls = api.start_run()
 
 # Initialize session state
-if "messages" not in st.session_state:
-    st.session_state.messages = [
-        {
-            "role": "assistant",
-            "content": "## 👋 Welcome to Jarvis Enterprise AI Assistant!\n\nI'm here to help you with **Governance, Risk, and Compliance (GRC)** questions. \n\n💡 **Try asking:**\n- What are board governance best practices?\n- Explain SOX compliance requirements\n- How to conduct risk assessment?\n- Tell me about Diligent's GRC platform\n\nI can access a knowledge base of enterprise information and provide context-aware responses.",
-            "timestamp": datetime.now().isoformat(),
-            "sources": ["Welcome Guide"],
-            "category": "general",
-            "backend": "distilbert",
-            "model": "distilbert-base-uncased",
-            "response_time": 0,
-            "fallback_used": False
-        }
-    ]
+if "chat" not in st.session_state:
+    st.session_state.chat = ChatHistory(
+        ChatMessage(
+            "assistant",
+            "## 👋 Welcome to Jarvis Enterprise AI Assistant!\n\nI'm here to help you with **Governance, Risk, and Compliance (GRC)** questions. \n\n💡 **Try asking:**\n- What are board governance best practices?\n- Explain SOX compliance requirements\n- How to conduct risk assessment?\n- Tell me about Diligent's GRC platform\n\nI can access a knowledge base of enterprise information and provide context-aware responses.",
+            sources=("Welcome Guide",),
+            backend="distilbert"
+        )
+    )
 
 if "knowledge_base" not in st.session_state:
     st.session_state.knowledge_base = []
@@ -211,36 +223,37 @@ if "query_stats" not in st.session_state:
 if "user_name" not in st.session_state:
     st.session_state.user_name = "Enterprise User"
 
+if "conversation_id" not in st.session_state:
+    st.session_state.conversation_id = uuid.uuid4().hex   # Lets the backend reuse context between turns
+
 # Helper functions
-def check_backend_health():
-    """Check if backend is available"""
+def refresh_dashboard():
+    """Health, LLM status and knowledge stats from one (cached, ETag-revalidated) call
+    
+    Returns (healthy, health) and updates llm_status and kb_stats in session state.
+    """
     try:
-        response = requests.get(f"{API_BASE}/health", timeout=2)
-        if response.status_code == 200:
-            return True, response.json()
-        else:
-            return False, {"error": f"Status code: {response.status_code}"}
+        status_code, data = api.get("/dashboard", timeout=3)
+        if status_code != 200:
+            return False, {"error": f"Status code: {status_code}"}
     except requests.exceptions.ConnectionError:
         return False, {"error": "Cannot connect to backend"}
     except Exception as e:
         return False, {"error": str(e)}
-
-def get_llm_status():
-    """Get LLM backend status"""
-    try:
-        response = requests.get(f"{API_BASE}/llm/status", timeout=3)
-        if response.status_code == 200:
-            data = response.json()
-            st.session_state.llm_status = {
-                "current_backend": data["status"]["current_backend"],
-                "ollama_available": data["status"]["ollama_available"],
-                "available_models": data["status"].get("available_ollama_models", []),
-                "stats": data["status"].get("stats", {})
-            }
-            return True
-    except:
-        pass
-    return False
+    
+    if "llm" in data:
+        llm = data["llm"]
+        st.session_state.llm_status = {
+            "current_backend": llm["current_backend"],
+            "ollama_available": llm["ollama_available"],
+            "available_models": llm.get("available_ollama_models", []),
+            "stats": llm.get("stats", {})
+        }
+    st.session_state.kb_stats = data.get("knowledge_base")
+    
+    health = data["health"]
+    # Up but still loading models: reachable, not yet answering queries
+    return health.get("status") == "healthy", health
 
 def switch_backend(backend, model_name=None):
     """Switch between Ollama and DistilBERT"""
@@ -249,12 +262,12 @@ def switch_backend(backend, model_name=None):
         if model_name:
             payload["model_name"] = model_name
             
-        response = requests.post(f"{API_BASE}/llm/switch", 
-                               json=payload, 
-                               timeout=5)
+        status_code, data = api.post("/llm/switch",
+                                     json=payload,
+                                     timeout=5,
+                                     invalidates=("/dashboard", "/llm/status", "/health"))
         
-        if response.status_code == 200:
-            data = response.json()
+        if status_code == 200:
             return data.get("success", False), data.get("message", "")
     except:
         pass
@@ -263,26 +276,26 @@ def switch_backend(backend, model_name=None):
 def add_knowledge_to_base(text, category, tags):
     """Add new knowledge to the system"""
     try:
-        response = requests.post(f"{API_BASE}/knowledge", json={
+        status_code, data = api.post("/knowledge", json={
             "text": text,
             "category": category,
             "tags": tags,
             "source": "web_interface"
-        }, timeout=10)
+        }, timeout=10, invalidates=("/dashboard", "/stats", "/categories"))
         
-        if response.status_code == 200:
+        if status_code == 200:
             return True, "Knowledge added successfully!"
         else:
-            return False, f"Error: {response.json().get('detail', 'Unknown error')}"
+            return False, f"Error: {data.get('detail', 'Unknown error')}"
     except Exception as e:
         return False, f"Connection error: {str(e)}"
 
 def search_knowledge(query, limit=5):
     """Search the knowledge base"""
     try:
-        response = requests.get(f"{API_BASE}/search/{query}?limit={limit}", timeout=5)
-        if response.status_code == 200:
-            return True, response.json()["results"]
+        status_code, data = api.get(f"/search/{query}", params={"limit": limit}, timeout=5)
+        if status_code == 200:
+            return True, data["results"]
         else:
             return False, []
     except:
@@ -291,7 +304,7 @@ def search_knowledge(query, limit=5):
 def submit_feedback(query, response, rating, comment=""):
     """Submit feedback for responses"""
     try:
-        requests.post(f"{API_BASE}/feedback", json={
+        api.post("/feedback", json={
             "query": query,
             "response": response,
             "rating": rating,
@@ -301,8 +314,7 @@ def submit_feedback(query, response, rating, comment=""):
         pass
 
 # Initialize status
-backend_healthy, health_data = check_backend_health()
-get_llm_status()
+backend_healthy, health_data = refresh_dashboard()
 
 # Sidebar
 with st.sidebar:
@@ -363,7 +375,7 @@ with st.sidebar:
                     success, message = switch_backend("ollama", selected_model)
                     if success:
                         st.success(f"Switched to Ollama ({selected_model})")
-                        get_llm_status()
+                        refresh_dashboard()
                     else:
                         st.warning(message)
     
@@ -376,7 +388,7 @@ with st.sidebar:
             success, message = switch_backend("ollama")
             if success:
                 st.success("Switched to Ollama")
-                get_llm_status()
+                refresh_dashboard()
                 st.rerun()
             else:
                 st.warning(message)
@@ -387,7 +399,7 @@ with st.sidebar:
             success, message = switch_backend("distilbert")
             if success:
                 st.info("Switched to DistilBERT")
-                get_llm_status()
+                refresh_dashboard()
                 st.rerun()
     
     # Current status
@@ -464,7 +476,8 @@ with st.sidebar:
         
         # Clear chat button
         if st.button("🗑️ Clear Chat History", type="secondary"):
-            st.session_state.messages = [st.session_state.messages[0]]
+            st.session_state.chat.clear()
+            st.session_state.conversation_id = uuid.uuid4().hex
             st.rerun()
     
     # Footer
@@ -498,101 +511,30 @@ with col1:
     # Chat container
     chat_container = st.container()
     
-    # Display messages
+    # Display messages: only the newest window is rendered on each rerun
+    chat = st.session_state.chat
     with chat_container:
-        for message in st.session_state.messages:
-            if message["role"] == "user":
-                # User message
-                st.markdown(f"""
-                <div class="chat-message user-message">
-                    <div style="display: flex; align-items: center; margin-bottom: 0.5rem;">
-                        <div style="width: 32px; height: 32px; border-radius: 50%; background: white; display: flex; align-items: center; justify-content: center; margin-right: 0.75rem;">
-                            <span style="color: #667eea; font-weight: bold;">{st.session_state.user_name[0].upper()}</span>
-                        </div>
-                        <div>
-                            <strong>{st.session_state.user_name}</strong>
-                            <div style="font-size: 0.8rem; opacity: 0.9;">
-                                {datetime.fromisoformat(message['timestamp']).strftime('%I:%M %p')}
-                            </div>
-                        </div>
-                    </div>
-                    <div style="margin-left: 3rem;">
-                        {message['content']}
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                # Assistant message
-                backend_badge = ""
-                if message.get("backend") == "ollama":
-                    backend_badge = '<span class="status-chip status-ollama">Ollama</span>'
-                elif message.get("backend") == "distilbert":
-                    backend_badge = '<span class="status-chip status-distilbert">DistilBERT</span>'
-                
-                fallback_indicator = ""
-                if message.get("fallback_used"):
-                    fallback_indicator = '⚠️ <span style="font-size: 0.8rem; color: #F59E0B;">(Fallback used)</span>'
-                
-                st.markdown(f"""
-                <div class="chat-message assistant-message">
-                    <div style="display: flex; align-items: center; margin-bottom: 0.5rem;">
-                        <div style="width: 32px; height: 32px; border-radius: 50%; background: linear-gradient(135deg, #10B981 0%, #059669 100%); display: flex; align-items: center; justify-content: center; margin-right: 0.75rem;">
-                            <span style="color: white; font-weight: bold;">J</span>
-                        </div>
-                        <div style="flex: 1;">
-                            <strong>Jarvis Assistant</strong>
-                            <div style="font-size: 0.8rem; color: #6B7280;">
-                                {datetime.fromisoformat(message['timestamp']).strftime('%I:%M %p')} • 
-                                {backend_badge} {fallback_indicator}
-                            </div>
-                        </div>
-                        <div style="font-size: 0.8rem; color: #6B7280;">
-                            {message.get('response_time', 0):.2f}s
-                        </div>
-                    </div>
-                    
-                    <div style="margin-left: 3rem; margin-bottom: 1rem;">
-                        {message['content']}
-                    </div>
-                """, unsafe_allow_html=True)
-                
-                # Sources if available
-                if message.get("sources"):
-                    st.markdown("""
-                    <div style="margin-left: 3rem; margin-top: 0.5rem;">
-                        <div style="font-size: 0.85rem; color: #6B7280; margin-bottom: 0.25rem;">
-                            <strong>📚 Sources:</strong>
-                        </div>
-                    """, unsafe_allow_html=True)
-                    
-                    for source in message["sources"]:
-                        st.markdown(f'<span class="source-chip">{source}</span>', unsafe_allow_html=True)
-                    
-                    st.markdown("</div>", unsafe_allow_html=True)
-                
-                # Feedback buttons (only for assistant messages that aren't the welcome)
-                if message != st.session_state.messages[0]:
-                    col_f1, col_f2, col_f3 = st.columns([1, 1, 8])
-                    with col_f1:
-                        if st.button("👍", key=f"like_{hash(str(message))}", 
-                                   help="This response was helpful"):
-                            submit_feedback(
-                                st.session_state.messages[-2]["content"] if len(st.session_state.messages) > 1 else "",
-                                message["content"],
-                                5
-                            )
-                            st.toast("Thanks for your feedback! 👍")
-                    with col_f2:
-                        if st.button("👎", key=f"dislike_{hash(str(message))}", 
-                                   help="This response needs improvement"):
-                            submit_feedback(
-                                st.session_state.messages[-2]["content"] if len(st.session_state.messages) > 1 else "",
-                                message["content"],
-                                1
-                            )
-                            st.toast("Thanks for your feedback! We'll improve. 👎")
-                
-                st.markdown("</div>", unsafe_allow_html=True)
+        if chat.hidden:
+            if st.button(f"⬆️ Show earlier messages ({chat.hidden} hidden)", key="show_earlier"):
+                chat.show_earlier()
+                st.rerun()
+        
+        for index, message in chat.visible():
+            st.markdown(message.html(st.session_state.user_name), unsafe_allow_html=True)
+            
+            # Feedback buttons (only for assistant messages that aren't the welcome)
+            if message.role == "assistant" and index > 0:
+                col_f1, col_f2, col_f3 = st.columns([1, 1, 8])
+                with col_f1:
+                    if st.button("👍", key=f"like_{index}",
+                               help="This response was helpful"):
+                        submit_feedback(chat.question_before(index), message.content, 5)
+                        st.toast("Thanks for your feedback! 👍")
+                with col_f2:
+                    if st.button("👎", key=f"dislike_{index}",
+                               help="This response needs improvement"):
+                        submit_feedback(chat.question_before(index), message.content, 1)
+                        st.toast("Thanks for your feedback! We'll improve. 👎")
 
 with col2:
     # Right sidebar - Insights & Analytics
@@ -620,20 +562,16 @@ with col2:
     st.markdown("---")
     st.markdown("**🧠 Recent Knowledge:**")
     
-    try:
-        response = requests.get(f"{API_BASE}/stats", timeout=3)
-        if response.status_code == 200:
-            stats = response.json()
-            if "knowledge_base" in stats:
-                kb_stats = stats["knowledge_base"]
-                st.metric("Total Documents", kb_stats.get("total_documents", 0))
-                
-                # Categories breakdown
-                if "documents_per_category" in kb_stats:
-                    with st.expander("By Category"):
-                        for category, count in kb_stats["documents_per_category"].items():
-                            st.caption(f"{category}: {count}")
-    except:
+    kb_stats = st.session_state.get("kb_stats")
+    if kb_stats:
+        st.metric("Total Documents", kb_stats.get("total_documents", 0))
+        
+        # Categories breakdown
+        if "documents_per_category" in kb_stats:
+            with st.expander("By Category"):
+                for category, count in kb_stats["documents_per_category"].items():
+                    st.caption(f"{category}: {count}")
+    else:
         st.info("Knowledge stats unavailable")
     
     # Tips panel
@@ -680,11 +618,7 @@ with input_col2:
 # Handle send
 if send_button and user_input:
     # Add user message
-    st.session_state.messages.append({
-        "role": "user",
-        "content": user_input,
-        "timestamp": datetime.now().isoformat()
-    })
+    st.session_state.chat.add_user(user_input)
     
     # Clear input
     st.session_state.user_input = ""
@@ -703,15 +637,16 @@ if send_button and user_input:
     try:
         # Call API
         start_time = time.time()
-        response = requests.post(f"{API_BASE}/query", json={
+        status_code, data = api.post("/query", json={
             "message": user_input,
-            "user_id": st.session_state.user_name
-        }, timeout=30)
+            "user_id": st.session_state.user_name,
+            "deadline_ms": QUERY_DEADLINE_MS,
+            "conversation_id": st.session_state.conversation_id
+        }, timeout=QUERY_TIMEOUT_S, invalidates=("/dashboard", "/llm/status", "/stats"))
         
         response_time = time.time() - start_time
         
-        if response.status_code == 200:
-            data = response.json()
+        if status_code == 200:
             
             # Update query statistics
             st.session_state.query_stats["total"] += 1
@@ -730,26 +665,14 @@ if send_button and user_input:
             st.session_state.query_stats["avg_response_time"] = new_avg
             
             # Add assistant response
-            assistant_message = {
-                "role": "assistant",
-                "content": data["response"],
-                "timestamp": data["timestamp"],
-                "sources": data["sources"],
-                "category": category,
-                "backend": backend,
-                "model": data["model"],
-                "response_time": data.get("response_time", 0),
-                "fallback_used": data.get("fallback_used", False)
-            }
-            
-            st.session_state.messages.append(assistant_message)
+            st.session_state.chat.add_assistant(data)
             
             # Clear placeholder and rerun to show new message
             response_placeholder.empty()
             st.rerun()
             
         else:
-            response_placeholder.error(f"Error: {response.status_code} - {response.text}")
+            response_placeholder.error(f"Error: {status_code} - {data.get('detail', data)}")
             
     except requests.exceptions.ConnectionError:
         response_placeholder.error("Cannot connect to Jarvis backend. Please ensure it's running on http://localhost:8000")
@@ -774,8 +697,8 @@ with footer_col2:
 with footer_col3:
     # Refresh status button
     if st.button("🔄 Refresh Status", key="refresh_status"):
-        backend_healthy, health_data = check_backend_health()
-        get_llm_status()
+        api.invalidate()
+        backend_healthy, health_data = refresh_dashboard()
         st.rerun()
 
 # Auto-refresh status every 30 seconds
@@ -784,12 +707,18 @@ if "last_status_check" not in st.session_state:
 
 current_time = time.time()
 if current_time - st.session_state.last_status_check > 30:  # 30 seconds
-    backend_healthy, health_data = check_backend_health()
-    get_llm_status()
+    backend_healthy, health_data = refresh_dashboard()
     st.session_state.last_status_check = current_time
 
 # Display connection warning if backend is down
-if not backend_healthy:
+if health_data.get("status") in ("starting", "failed"):
+    components = health_data.get("startup", {}).get("components", {})
+    progress = ", ".join(f"{name}: {info.get('state')}" for name, info in components.items())
+    if health_data["status"] == "starting":
+        st.info(f"⏳ **Backend is starting** ({progress}). Questions will be answered once it is ready.")
+    else:
+        st.error(f"❌ **Backend failed to start** ({progress}). Check the backend logs.")
+elif not backend_healthy:
     st.warning("""
     ⚠️ **Backend Connection Issue**
     
@@ -802,9 +731,19 @@ if not backend_healthy:
     """)
 
 # Display welcome message for new users
-if len(st.session_state.messages) == 1:
+if len(st.session_state.chat) == 1:
     st.balloons()
     st.success("✨ Welcome to Jarvis Enterprise AI Assistant! Start by asking a question about governance, risk, or compliance.")
 
 # Keyboard shortcut hint
-st.caption("💡 **Tip**: Press Enter to send, Shift+Enter for new line")
\ No newline at end of file
+st.caption("💡 **Tip**: Press Enter to send, Shift+Enter for new line")
+# Debug panel: backend calls made by this script run (and the one before it)
+with st.sidebar:
+    run_calls = st.session_state.run_calls
+    network_calls = sum(1 for call in run_calls if not call["cached"])
+    with st.expander(f"🐞 Backend calls this run: {network_calls} sent, {len(run_calls) - network_calls} cached"):
+        if run_calls:
+            st.dataframe(run_calls, use_container_width=True, hide_index=True)
+        if st.session_state.previous_run_calls:
+            st.caption("Previous run")
+            st.dataframe(st.session_state.previous_run_calls, use_container_width=True, hide_index=True)
@@ -0,0 +1,180 @@
+# frontend/chat_history.py
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Messages rendered on each rerun; "Show earlier messages" adds this many more
+PAGE_SIZE = 20
+
+
+class ChatMessage:
+    """One chat message; __slots__ and a float timestamp keep long histories small"""
+
+    __slots__ = ("role", "content", "created", "sources", "category", "backend",
+                 "response_time", "fallback_used", "_html")
+
+    def __init__(self, role: str, content: str, created: Optional[float] = None,
+                 sources: Tuple[str, ...] = (), category: str = "general",
+                 backend: Optional[str] = None, response_time: float = 0.0,
+                 fallback_used: bool = False):
+        self.role = role
+        self.content = content
+        self.created = created if created is not None else datetime.now().timestamp()
+        self.sources = tuple(sources)
+        self.category = category
+        self.backend = backend
+        self.response_time = response_time
+        self.fallback_used = fallback_used
+        self._html: Optional[Tuple[str, str]] = None   # (user name it was rendered for, HTML)
+
+    @property
+    def time_label(self) -> str:
+        return datetime.fromtimestamp(self.created).strftime('%I:%M %p')
+
+    def html(self, user_name: str) -> str:
+        """The message as an HTML block, reused on every rerun while it stays in the window"""
+        if self._html is None or self._html[0] != user_name:
+            render = _render_user if self.role == "user" else _render_assistant
+            self._html = (user_name, render(self, user_name))
+        return self._html[1]
+
+
+class ChatHistory:
+    """All messages of a chat, rendered a window at a time
+
+    Only the newest `window` messages are drawn on a rerun, so render cost
+    stays flat however long the conversation gets; older ones are drawn on
+    demand (show_earlier) until the next message arrives. Only messages in
+    the window keep their rendered HTML, so the rest are held once.
+    """
+
+    def __init__(self, welcome: ChatMessage, page_size: int = PAGE_SIZE):
+        self.page_size = page_size
+        self.messages: List[ChatMessage] = [welcome]
+        self.window = page_size
+        self._cached_from = 0    # Messages before this index hold no rendered HTML
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def add_user(self, content: str) -> ChatMessage:
+        message = ChatMessage("user", content)
+        self._append(message)
+        return message
+
+    def add_assistant(self, data: Dict[str, Any]) -> ChatMessage:
+        """Add an answer from the /query response"""
+        message = ChatMessage(
+            "assistant",
+            data["response"],
+            created=datetime.fromisoformat(data["timestamp"]).timestamp() if data.get("timestamp") else None,
+            sources=data.get("sources", ()),
+            category=data.get("category", "general"),
+            backend=data.get("backend"),
+            response_time=data.get("response_time", 0),
+            fallback_used=data.get("fallback_used", False)
+        )
+        self._append(message)
+        return message
+
+    def _append(self, message: ChatMessage):
+        """Add a message and go back to showing the newest page"""
+        self.messages.append(message)
+        self.window = self.page_size
+
+    def clear(self):
+        """Back to just the welcome message"""
+        self.messages = self.messages[:1]
+        self.window = self.page_size
+        self._cached_from = 0
+
+    @property
+    def hidden(self) -> int:
+        """Messages older than the rendered window"""
+        return max(len(self.messages) - self.window, 0)
+
+    def show_earlier(self):
+        self.window += self.page_size
+
+    def visible(self) -> Iterator[Tuple[int, ChatMessage]]:
+        """(index, message) for the rendered window, oldest first"""
+        start = self.hidden
+        for index in range(self._cached_from, start):
+            self.messages[index]._html = None    # Left the window
+        self._cached_from = start
+        for index in range(start, len(self.messages)):
+            yield index, self.messages[index]
+
+    def question_before(self, index: int) -> str:
+        """The user message an answer at `index` replied to"""
+        for i in range(index - 1, -1, -1):
+            if self.messages[i].role == "user":
+                return self.messages[i].content
+        return ""
+
+
+def _render_user(message: ChatMessage, user_name: str) -> str:
+    return f"""
+                <div class="chat-message user-message">
+                    <div style="display: flex; align-items: center; margin-bottom: 0.5rem;">
+                        <div style="width: 32px; height: 32px; border-radius: 50%; background: white; display: flex; align-items: center; justify-content: center; margin-right: 0.75rem;">
+                            <span style="color: #667eea; font-weight: bold;">{user_name[0].upper()}</span>
+                        </div>
+                        <div>
+                            <strong>{user_name}</strong>
+                            <div style="font-size: 0.8rem; opacity: 0.9;">
+                                {message.time_label}
+                            </div>
+                        </div>
+                    </div>
+                    <div style="margin-left: 3rem;">
+                        {message.content}
+                    </div>
+                </div>
+                """
+
+
+def _render_assistant(message: ChatMessage, user_name: str) -> str:
+    backend_badge = ""
+    if message.backend == "ollama":
+        backend_badge = '<span class="status-chip status-ollama">Ollama</span>'
+    elif message.backend == "distilbert":
+        backend_badge = '<span class="status-chip status-distilbert">DistilBERT</span>'
+
+    fallback_indicator = ""
+    if message.fallback_used:
+        fallback_indicator = '⚠️ <span style="font-size: 0.8rem; color: #F59E0B;">(Fallback used)</span>'
+
+    sources = ""
+    if message.sources:
+        chips = "".join(f'<span class="source-chip">{source}</span>' for source in message.sources)
+        sources = f"""
+                    <div style="margin-left: 3rem; margin-top: 0.5rem;">
+                        <div style="font-size: 0.85rem; color: #6B7280; margin-bottom: 0.25rem;">
+                            <strong>📚 Sources:</strong>
+                        </div>
+                        {chips}
+                    </div>"""
+
+    return f"""
+                <div class="chat-message assistant-message">
+                    <div style="display: flex; align-items: center; margin-bottom: 0.5rem;">
+                        <div style="width: 32px; height: 32px; border-radius: 50%; background: linear-gradient(135deg, #10B981 0%, #059669 100%); display: flex; align-items: center; justify-content: center; margin-right: 0.75rem;">
+                            <span style="color: white; font-weight: bold;">J</span>
+                        </div>
+                        <div style="flex: 1;">
+                            <strong>Jarvis Assistant</strong>
+                            <div style="font-size: 0.8rem; color: #6B7280;">
+                                {message.time_label} •
+                                {backend_badge} {fallback_indicator}
+                            </div>
+                        </div>
+                        <div style="font-size: 0.8rem; color: #6B7280;">
+                            {message.response_time:.2f}s
+                        </div>
+                    </div>
+
+                    <div style="margin-left: 3rem; margin-bottom: 1rem;">
+                        {message.content}
+                    </div>{sources}
+                </div>
+                """